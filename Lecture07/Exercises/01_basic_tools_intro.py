@@ -26,12 +26,15 @@
 # - Keep the MODEL name configurable via an env var (MODEL).
 # - This script is intentionally verbose with comments for teaching.
 
-import os, json, math
-from typing import List, Dict, Any
+import os, math
+from typing import List
+from tool_executor import run_tool_calls
+from tool_registry import ToolRegistry
+from usage_meter import MeteredClient
 try:
     # Newer OpenAI SDK (recommended)
     from openai import OpenAI
-    client = OpenAI()
+    client = MeteredClient(OpenAI())  # token usage per call (usage_meter.py)
 except Exception:
     # Fallback for older SDKs: pip install openai==1.x is recommended.
     raise SystemExit("Please install the new OpenAI SDK: pip install openai")
@@ -39,14 +42,20 @@ except Exception:
 MODEL = os.getenv("MODEL", "gpt-4o-mini")  # use a fast, inexpensive model by default
 
 # -------------------------
-# 1) Define Python functions that will be exposed as tools
+# 1) Define Python functions and register them as tools
 # -------------------------
+# @registry.tool builds each tool's JSON schema from the type hints and the
+# docstring (see tool_registry.py), so the schema always matches the function.
+registry = ToolRegistry()
+
+@registry.tool
 def add(a: float, b: float) -> float:
-    """Return a + b."""
+    """Add two numbers and return the sum."""
     return a + b
 
-def stats(numbers: list) -> dict:
-    """Return simple statistics for a list of numbers."""
+@registry.tool
+def stats(numbers: List[float]) -> dict:
+    """Compute count, mean, and stdev for a list of numbers."""
     if not numbers:
         return {"count": 0, "mean": None, "stdev": None}
     mean = sum(numbers) / len(numbers)
@@ -58,42 +67,10 @@ def stats(numbers: list) -> dict:
     return {"count": len(numbers), "mean": mean, "stdev": stdev}
 
 # -------------------------
-# 2) Register tools for the model
+# 2) The tools payload for the model
 # -------------------------
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "add",
-            "description": "Add two numbers and return the sum.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "a": {"type": "number"},
-                    "b": {"type": "number"}
-                },
-                "required": ["a", "b"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "stats",
-            "description": "Compute count, mean, and stdev for a list of numbers.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "numbers": {
-                        "type": "array",
-                        "items": {"type": "number"}
-                    }
-                },
-                "required": ["numbers"]
-            }
-        }
-    }
-]
+# registry.tools (passed to create() below) is built once, on first use;
+# print(registry.tools_json) to see what the model receives.
 
 # -------------------------
 # 3) Chat loop (single turn) demonstrating tool use
@@ -109,34 +86,18 @@ first = client.chat.completions.create(
         {"role": "system", "content": "You are a helpful assistant."},
         {"role": "user", "content": user_prompt}
     ],
-    tools=tools,
+    tools=registry.tools,
     tool_choice="auto"  # let the model decide
 )
 
 # The model might produce one or more tool_calls in 'message'
 msg = first.choices[0].message
-tool_results_messages = []
 
 if msg.tool_calls:
-    # Execute each tool call in the order given
-    for call in msg.tool_calls:
-        name = call.function.name
-        args = json.loads(call.function.arguments or "{}")
-
-        if name == "add":
-            result = add(**args)
-        elif name == "stats":
-            result = stats(**args)
-        else:
-            result = {"error": f"Unknown tool: {name}"}
-
-        # Append a 'tool' message back to the model with the result
-        tool_results_messages.append({
-            "role": "tool",
-            "tool_call_id": call.id,
-            "name": name,
-            "content": json.dumps(result)
-        })
+    # Execute all tool calls concurrently (dispatch is a dict lookup in the registry);
+    # results come back in the order given, so each 'tool' message still matches
+    # its tool_call_id.
+    tool_results_messages = run_tool_calls(msg.tool_calls, registry.call)
 
     # Send a follow-up message containing the tool results so the model can finalize an answer
     final = client.chat.completions.create(
@@ -7,7 +7,8 @@
 # - Use the Function Calling (tools) pattern end-to-end.
 #
 # WHAT IT DOES
-# - Defines a tool get_weather(lat, lon) that calls Open-Meteo's forecast API.
+# - Uses the tool get_weather(lat, lon) from weather_tool.py, which calls
+#   Open-Meteo's forecast API (get_weather_batch covers several cities in one call).
 # - The model decides when to call the tool. You then execute it and return
 #   a friendly, formatted weather summary.
 #
@@ -20,51 +21,23 @@
 #   python 02_weather_tool_open_meteo.py
 #
 # TIP
-# - Try different cities by changing the user prompt. You can also add a separate
-#   geocoding step (e.g., Open-Meteo geocoding) if you want to convert city names
-#   to lat/lon automatically.
+# - Try different cities by changing the user prompt. The model may pass the
+#   city name instead of lat/lon (get_weather(place=...)); it is resolved by
+#   the offline gazetteer in gazetteer.py.
 
-import os, json, requests
+import os, json
 from openai import OpenAI
+from tool_registry import ToolRegistry
+from result_compactor import compact_json
+from usage_meter import MeteredClient
 
 MODEL = os.getenv("MODEL", "gpt-4o-mini")
-client = OpenAI()
+client = MeteredClient(OpenAI())  # token usage per call (usage_meter.py)
 
-def get_weather(lat: float, lon: float) -> dict:
-    """Call Open-Meteo API for current weather and a short forecast."""
-    url = (
-        "https://api.open-meteo.com/v1/forecast"
-        f"?latitude={lat}&longitude={lon}&current_weather=true&hourly=temperature_2m"
-    )
-    r = requests.get(url, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    # Return only what we need to keep the tool's response compact
-    return {
-        "latitude": data.get("latitude"),
-        "longitude": data.get("longitude"),
-        "timezone": data.get("timezone"),
-        "current_weather": data.get("current_weather", {}),
-        "sample_hourly": data.get("hourly", {}).get("temperature_2m", [])[:6]  # first 6 hrs
-    }
-
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_weather",
-            "description": "Get current weather and short forecast for a coordinate.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "lat": {"type": "number", "description": "Latitude"},
-                    "lon": {"type": "number", "description": "Longitude"}
-                },
-                "required": ["lat", "lon"]
-            }
-        }
-    }
-]
+# get_weather(lat, lon) and get_weather_batch(locations) live in weather_tool.py;
+# their schemas come from the functions' type hints and docstrings. The module
+# is imported on first use.
+registry = ToolRegistry().lazy("weather_tool", "get_weather", "get_weather_batch")
 
 user_prompt = (
     "What's the weather right now in San Francisco, CA (37.7749, -122.4194)?"
@@ -78,7 +51,7 @@ first = client.chat.completions.create(
         {"role": "system", "content": "You are a helpful weather assistant."},
         {"role": "user", "content": user_prompt}
     ],
-    tools=tools,
+    tools=registry.tools,
     tool_choice="auto"
 )
 
@@ -88,12 +61,12 @@ tool_messages = []
 if msg.tool_calls:
     for call in msg.tool_calls:
         args = json.loads(call.function.arguments or "{}")
-        result = get_weather(**args)
+        result = registry.call(call.function.name, args)
         tool_messages.append({
             "role": "tool",
             "tool_call_id": call.id,
             "name": call.function.name,
-            "content": json.dumps(result)
+            "content": compact_json(call.function.name, result)  # keep the follow-up prompt small
         })
 
     final = client.chat.completions.create(
@@ -8,7 +8,8 @@
 #
 # WHAT IT DOES
 # - Uses the public HN Search API by Algolia (no key required).
-# - Tool: search_hn(query, hits=5) -> returns a list of {title, url, points}.
+# - Tool: search_hn(query, hits=5) -> returns a list of {title, url, points}
+#   (defined in hn_tool.py).
 #
 # REQUIREMENTS
 # - Internet connection, OPENAI_API_KEY
@@ -17,46 +18,18 @@
 # RUN
 #   python 03_news_tool_hn.py
 
-import os, json, requests
+import os, json
 from openai import OpenAI
+from tool_registry import ToolRegistry
+from result_compactor import compact_json
+from usage_meter import MeteredClient
 
 MODEL = os.getenv("MODEL", "gpt-4o-mini")
-client = OpenAI()
+client = MeteredClient(OpenAI())  # token usage per call (usage_meter.py)
 
-def search_hn(query: str, hits: int = 5) -> list:
-    """Search Hacker News stories and return a compact list of results."""
-    url = "https://hn.algolia.com/api/v1/search"
-    params = {"query": query, "tags": "story", "hitsPerPage": hits}
-    r = requests.get(url, params=params, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    results = []
-    for h in data.get("hits", []):
-        results.append({
-            "title": h.get("title"),
-            "url": h.get("url"),
-            "points": h.get("points"),
-            "author": h.get("author"),
-        })
-    return results
-
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "search_hn",
-            "description": "Search Hacker News for recent stories.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string"},
-                    "hits": {"type": "integer", "default": 5, "minimum": 1, "maximum": 30}
-                },
-                "required": ["query"]
-            }
-        }
-    }
-]
+# search_hn(query, hits) lives in hn_tool.py; the registry builds its schema
+# from the type hints and docstring.
+registry = ToolRegistry().lazy("hn_tool", "search_hn")
 
 user_prompt = (
     "Find interesting recent stories about 'AI in education' and summarize the top links."
@@ -69,7 +42,7 @@ first = client.chat.completions.create(
         {"role": "system", "content": "You are a helpful news curator."},
         {"role": "user", "content": user_prompt}
     ],
-    tools=tools,
+    tools=registry.tools,
     tool_choice="auto"
 )
 
@@ -79,12 +52,12 @@ tool_messages = []
 if msg.tool_calls:
     for call in msg.tool_calls:
         args = json.loads(call.function.arguments or "{}")
-        results = search_hn(**args)
+        results = registry.call(call.function.name, args)
         tool_messages.append({
             "role": "tool",
             "tool_call_id": call.id,
             "name": call.function.name,
-            "content": json.dumps(results)
+            "content": compact_json(call.function.name, results)  # keep the follow-up prompt small
         })
 
     final = client.chat.completions.create(
@@ -8,7 +8,11 @@
 #
 # WHAT IT DOES
 # - Prompts the model to return a fixed schema for a "WeatherReport".
-# - Tries to parse JSON; if invalid, asks the model to correct itself.
+# - Streams the answer and validates it while it arrives (schema_validation.py);
+#   the stream is stopped as soon as the JSON can no longer match the schema.
+# - If the JSON is invalid, first tries cheap local repairs (json_repair.py:
+#   code fences, prose, single quotes, trailing commas, numbers as strings);
+#   only if those fail does it ask the model to correct itself.
 #
 # REQUIREMENTS
 # - pip install openai jsonschema
@@ -19,10 +23,15 @@
 
 import os, json
 from openai import OpenAI
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError
+from schema_validation import IncrementalValidator, StreamValidationError
+from json_repair import repair_json, repair_stats
+from response_cache import CachedClient
+from usage_meter import MeteredClient
 
 MODEL = os.getenv("MODEL", "gpt-4o-mini")
-client = OpenAI()
+# Same prompt at temperature=0 -> the cached response is reused (see response_cache.py)
+client = CachedClient(MeteredClient(OpenAI()))
 
 schema = {
     "type": "object",
@@ -49,9 +58,12 @@ user = (
     " a current temperature in Celsius, and 5 hourly temps."
 )
 
-def ask_for_json():
-    resp = client.chat.completions.create(
+def ask_for_json(checker: IncrementalValidator) -> str:
+    """Stream the answer into `checker`, which raises as soon as it can't be valid."""
+    stream = client.chat.completions.create(
         model=MODEL,
+        temperature=0,
+        stream=True,
         messages=[
             {"role": "system", "content": system},
             {"role": "user", "content": user},
@@ -59,27 +71,54 @@ def ask_for_json():
             {"role": "user", "content": json.dumps(schema)}
         ]
     )
-    return resp.choices[0].message.content
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                checker.feed(chunk.choices[0].delta.content or "")
+    finally:
+        # Stops the generation early if the checker raised (no tokens wasted)
+        stream.close()
+    return checker.text
 
-raw = ask_for_json()
+# The schema is compiled once (schema_validation.py); the streamed answer is
+# checked while it arrives. strict=False: problems json_repair.py can fix
+# locally (fences, prose, quotes, commas, numbers as strings) don't stop the
+# stream; anything else (e.g. an unknown key) stops it right away.
+checker = IncrementalValidator(schema, strict=False)
+raw = ""
+data = None
 try:
-    data = json.loads(raw)
-    validate(instance=data, schema=schema)
+    raw = ask_for_json(checker)
+    data = checker.finish()
     print("\nValid JSON received:\n", json.dumps(data, indent=2))
 except (json.JSONDecodeError, ValidationError) as e:
-    print("First attempt invalid, asking the model to fix it...\nReason:", e)
+    raw = raw or checker.text
+    reason = e
+    if not isinstance(e, StreamValidationError):
+        # Cheap local fixes first; only ask the model again if they don't work
+        try:
+            data, repairs = repair_json(raw, schema)
+            print(f"\nRepaired locally ({', '.join(repairs)}), no second request needed:\n",
+                  json.dumps(data, indent=2))
+        except (json.JSONDecodeError, ValidationError) as repair_error:
+            reason = repair_error
+
+if data is None:
+    print("First attempt invalid, asking the model to fix it...\nReason:", reason)
     fix_prompt = (
         "Your previous output was invalid. Return ONLY valid JSON that matches this schema:"
         f"\n{json.dumps(schema)}\nPrevious output:\n{raw}"
     )
     resp = client.chat.completions.create(
         model=MODEL,
+        temperature=0,
         messages=[
             {"role": "system", "content": system},
             {"role": "user", "content": fix_prompt}
         ]
     )
     corrected = resp.choices[0].message.content
-    data = json.loads(corrected)
-    validate(instance=data, schema=schema)
+    data, _ = repair_json(corrected, schema)
     print("\nCorrected valid JSON:\n", json.dumps(data, indent=2))
+
+print("\nLocal repair stats:", repair_stats())
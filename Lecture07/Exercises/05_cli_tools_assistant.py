@@ -9,121 +9,250 @@
 # - Provides a small command-line interface:
 #   > python 05_cli_tools_assistant.py "What's the weather in Seattle and a brief wiki about the city?"
 # - Tools:
-#   1) get_weather(lat, lon) via Open‑Meteo
-#   2) wiki_summary(title) via Wikipedia REST API (no key)
+#   1) get_weather(place or lat/lon) via Open‑Meteo     (weather_tool.py)
+#      get_weather_batch(locations): several cities in one request
+#   2) wiki_summary(title) via Wikipedia REST API (no key) (wiki_tool.py)
+#   3) resolve_place(name): city -> coordinates, offline    (place_tool.py)
 #
 # REQUIREMENTS
 # - pip install openai requests
 # - OPENAI_API_KEY in env
 #
+# OPTIONS
+#   --stream   Stream the first model call (stream=True) and start each tool as
+#              soon as its arguments are complete (see streaming_tools.py).
+#   --batch [FILE]
+#              Answer many questions in ONE process: one question per line from
+#              FILE (or stdin if FILE is omitted or "-"). Each question's full
+#              tool loop runs on AsyncOpenAI, up to --concurrency at a time, so
+#              N questions take about as long as the slowest few, not N times
+#              the average. Prints one JSON line per question:
+#                {"index": 0, "question": "...", "answer": "...", "seconds": 1.9}
+#              in input order, or as they finish with --order completed.
+#
+#   > python 05_cli_tools_assistant.py --batch questions.txt --concurrency 16 > answers.jsonl
+#   --profile  Print where the time went: the first model call, each tool and
+#              its HTTP requests, JSON encoding/decoding, the final call
+#              (tracing.py). --trace FILE writes the spans as JSONL, or as
+#              OpenTelemetry OTLP/JSON with --trace-format otlp.
+#   --breakers Print the state of the per-tool circuit breakers at the end.
+#              (They are always on: while Open-Meteo or Wikipedia is down, the
+#              tool answers at once with its last result for the same
+#              arguments, marked stale, or {"error": "unavailable"}; see
+#              circuit_breaker.py. Their state is kept in CACHE_DIR, so this
+#              works across runs of the CLI too.)
+#   --usage    Print the tokens, estimated cost, time to first token and
+#              output tokens/sec of the model calls (usage_meter.py).
+#
 # TIP
-# - If you only know the city name, ask the model to choose reasonable lat/lon.
+# - City names need no geocoding call: get_weather(place="Portland, ME") looks
+#   the name up in the offline gazetteer index (gazetteer.py, microseconds).
 
-import os, sys, json, requests
-from openai import OpenAI
+import os, sys, json, time, asyncio, argparse
+from typing import Any, Dict, Iterable, List
+from openai import OpenAI, AsyncOpenAI
+from tool_executor import run_tool_calls
+from tool_registry import ToolRegistry
+from circuit_breaker import ToolBreakers
+from streaming_tools import stream_tool_calls
+from response_cache import CachedClient
+from sqlite_cache import SQLiteCache
+from usage_meter import MeteredClient, default_meter
+import tracing
 
 MODEL = os.getenv("MODEL", "gpt-4o-mini")
-client = OpenAI()
-
-def get_weather(lat: float, lon: float) -> dict:
-    url = ("https://api.open-meteo.com/v1/forecast"
-           f"?latitude={lat}&longitude={lon}&current_weather=true&hourly=temperature_2m")
-    r = requests.get(url, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    return {
-        "timezone": data.get("timezone"),
-        "current_weather": data.get("current_weather", {}),
-        "hourly_next3": data.get("hourly", {}).get("temperature_2m", [])[:3]
-    }
-
-def wiki_summary(title: str) -> dict:
-    # Wikipedia summary via REST API
-    # Docs: https://en.wikipedia.org/api/rest_v1/#/Page%20content/get_page_summary__title_
-    api = f"https://en.wikipedia.org/api/rest_v1/page/summary/{title}"
-    r = requests.get(api, timeout=15, headers={"accept": "application/json"})
-    if r.status_code == 404:
-        return {"title": title, "summary": None, "url": None}
-    r.raise_for_status()
-    d = r.json()
-    return {
-        "title": d.get("title"),
-        "summary": d.get("extract"),
-        "url": d.get("content_urls", {}).get("desktop", {}).get("page")
-    }
-
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_weather",
-            "description": "Get current weather and short forecast for a coordinate.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "lat": {"type": "number"},
-                    "lon": {"type": "number"}
-                },
-                "required": ["lat", "lon"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "wiki_summary",
-            "description": "Get a concise encyclopedia summary for a topic title.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "title": {"type": "string"}
-                },
-                "required": ["title"]
-            }
-        }
-    }
-]
-
-user_text = sys.argv[1] if len(sys.argv) > 1 else (        "What's the weather in Seattle (47.6062, -122.3321)? Also give me a 2-sentence wiki summary."    )
-
-first = client.chat.completions.create(
-    model=MODEL,
-    messages=[
-        {"role": "system", "content": "You are a concise CLI assistant."},
+# The answers are sampled (default temperature), so they are not cached unless
+# CHAT_CACHE=1 opts in; None leaves it to response_cache (temperature=0 only)
+CACHE = True if os.getenv("CHAT_CACHE") == "1" else None
+SYSTEM = "You are a concise CLI assistant."
+DEFAULT_QUESTION = "What's the weather in Seattle (47.6062, -122.3321)? Also give me a 2-sentence wiki summary."
+# With CHAT_CACHE=1 repeated identical requests come from a local cache (for a day);
+# the calls that do reach the API are metered (tokens, latency)
+client = CachedClient(MeteredClient(OpenAI()))
+
+# Tools live in weather_tool.py, wiki_tool.py and place_tool.py; schemas come from their
+# type hints and docstrings, dispatch is a dict lookup. Every call goes through
+# a per-tool circuit breaker, so an upstream outage fails fast. Their state and
+# the last good results are kept on disk: each run is a new process.
+breakers = ToolBreakers(store=SQLiteCache("tool_breakers", max_entries=int(os.getenv("TOOL_BREAKER_KEEP", "2000"))))
+registry = ToolRegistry(breakers=breakers)
+registry.lazy("weather_tool", "get_weather", "get_weather_batch")
+registry.lazy("wiki_tool", "wiki_summary")
+registry.lazy("place_tool", "resolve_place")
+# The tool modules are imported when create() first reads registry.tools
+
+
+def answer(user_text: str) -> str:
+    """One question: model call -> tools (in parallel) -> final model call."""
+    messages = [
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": user_text}
+    ]
+    with tracing.span("phase.first_call"):
+        first = client.chat.completions.create(
+            model=MODEL,
+            cache=CACHE,
+            messages=messages,
+            tools=registry.tools,
+            tool_choice="auto"
+        )
+    msg = first.choices[0].message
+    if not msg.tool_calls:
+        return msg.content
+
+    # Weather and wiki lookups run in parallel (see tool_executor.py)
+    with tracing.span("phase.tools", calls=len(msg.tool_calls)):
+        tool_msgs = run_tool_calls(msg.tool_calls, registry.call)
+    with tracing.span("phase.final_call"):
+        final = client.chat.completions.create(
+            model=MODEL,
+            cache=CACHE,
+            messages=[*messages, msg, *tool_msgs]
+        )
+    return final.choices[0].message.content
+
+
+def answer_streaming(user_text: str) -> str:
+    """Same flow, but each tool starts as soon as its arguments have streamed in."""
+    messages = [
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": user_text}
+    ]
+    # Tools start while the first call is still streaming, so the two phases overlap
+    with tracing.span("phase.first_call_and_tools"):
+        stream = client.chat.completions.create(
+            model=MODEL,
+            cache=CACHE,
+            messages=messages,
+            tools=registry.tools,
+            tool_choice="auto",
+            stream=True
+        )
+        turn = stream_tool_calls(stream, registry.call)
+    if not turn.tool_calls:
+        return turn.content
+
+    with tracing.span("phase.final_call"):
+        final = client.chat.completions.create(
+            model=MODEL,
+            cache=CACHE,
+            messages=[*messages, turn.assistant_message, *turn.tool_messages]
+        )
+    return final.choices[0].message.content
+
+
+async def answer_async(aclient: CachedClient, user_text: str) -> str:
+    """answer() on the async client, so many questions can run at once."""
+    messages = [
+        {"role": "system", "content": SYSTEM},
         {"role": "user", "content": user_text}
-    ],
-    tools=tools,
-    tool_choice="auto"
-)
-
-msg = first.choices[0].message
-tool_msgs = []
-
-if msg.tool_calls:
-    for call in msg.tool_calls:
-        args = json.loads(call.function.arguments or "{}")
-        if call.function.name == "get_weather":
-            out = get_weather(**args)
-        elif call.function.name == "wiki_summary":
-            out = wiki_summary(**args)
+    ]
+    with tracing.span("phase.first_call"):
+        first = await aclient.chat.completions.create(
+            model=MODEL,
+            cache=CACHE,
+            messages=messages,
+            tools=registry.tools,
+            tool_choice="auto"
+        )
+    msg = first.choices[0].message
+    if not msg.tool_calls:
+        return msg.content
+
+    # The tools use blocking HTTP; run them in a worker thread
+    with tracing.span("phase.tools", calls=len(msg.tool_calls)):
+        tool_msgs = await asyncio.to_thread(run_tool_calls, msg.tool_calls, registry.call)
+    with tracing.span("phase.final_call"):
+        final = await aclient.chat.completions.create(
+            model=MODEL,
+            cache=CACHE,
+            messages=[*messages, msg, *tool_msgs]
+        )
+    return final.choices[0].message.content
+
+
+async def answer_batch(questions: List[str], concurrency: int = 8, ordered: bool = True, out=sys.stdout) -> None:
+    """Answer all questions concurrently and write one JSON line per question."""
+    aclient = CachedClient(MeteredClient(AsyncOpenAI()))
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(index: int, question: str) -> Dict[str, Any]:
+        async with limit:
+            start = time.perf_counter()
+            record: Dict[str, Any] = {"index": index, "question": question}
+            try:
+                with tracing.span("answer", index=index):
+                    record["answer"] = await answer_async(aclient, question)
+            except Exception as e:  # one failed question must not stop the batch
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["seconds"] = round(time.perf_counter() - start, 2)
+            return record
+
+    def emit(record: Dict[str, Any]) -> None:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    tasks = [asyncio.create_task(one(i, q)) for i, q in enumerate(questions)]
+    waiting: Dict[int, Dict[str, Any]] = {}
+    next_index = 0
+    try:
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            if not ordered:
+                emit(record)
+                continue
+            # Input order: hold results back until all earlier ones are written
+            waiting[record["index"]] = record
+            while next_index in waiting:
+                emit(waiting.pop(next_index))
+                next_index += 1
+    finally:
+        await aclient.close()  # before the event loop goes away
+
+
+def read_questions(lines: Iterable[str]) -> List[str]:
+    return [line.strip() for line in lines if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mini CLI assistant with weather + wiki tools.")
+    parser.add_argument("question", nargs="?", default=DEFAULT_QUESTION)
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the first model call and start tools while it is still generating")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="answer one question per line from FILE (default: stdin), print JSONL")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions answered at once in --batch mode")
+    parser.add_argument("--order", choices=["input", "completed"], default="input",
+                        help="--batch output order")
+    parser.add_argument("--profile", action="store_true", help="print where the time went (per phase)")
+    parser.add_argument("--trace", metavar="FILE", help="write the tracing spans to FILE")
+    parser.add_argument("--trace-format", choices=["jsonl", "otlp"], default="jsonl",
+                        help="jsonl: one span per line; otlp: OpenTelemetry OTLP/JSON")
+    parser.add_argument("--usage", action="store_true", help="print token usage, cost and throughput")
+    parser.add_argument("--breakers", action="store_true", help="print the tools' circuit breaker states")
+    cli = parser.parse_args()
+    if cli.profile or cli.trace:
+        tracing.enable()
+    if cli.batch:
+        if cli.batch == "-":
+            questions = read_questions(sys.stdin)
         else:
-            out = {"error": f"Unknown tool {call.function.name}"}
-        tool_msgs.append({
-            "role": "tool",
-            "tool_call_id": call.id,
-            "name": call.function.name,
-            "content": json.dumps(out)
-        })
-
-    final = client.chat.completions.create(
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": "You are a concise CLI assistant."},
-            {"role": "user", "content": user_text},
-            msg,
-            *tool_msgs
-        ]
-    )
-    print(final.choices[0].message.content)
-else:
-    print(msg.content)
+            with open(cli.batch, encoding="utf-8") as f:
+                questions = read_questions(f)
+        started = time.perf_counter()
+        asyncio.run(answer_batch(questions, cli.concurrency, ordered=cli.order == "input"))
+        print(f"{len(questions)} questions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    else:
+        with tracing.span("answer", stream=cli.stream):
+            text = answer_streaming(cli.question) if cli.stream else answer(cli.question)
+        print(text)
+
+    if cli.profile:
+        tracing.print_profile(tree=not cli.batch)
+    if cli.trace:
+        export = tracing.export_otlp if cli.trace_format == "otlp" else tracing.export_jsonl
+        export(cli.trace)
+    if cli.usage:
+        default_meter.report()
+    if cli.breakers:
+        print(json.dumps(breakers.stats(), indent=2), file=sys.stderr)
@@ -8,7 +8,7 @@
 # 3) Ask the model a question that should trigger the tool.
 # 4) Print a clean, human-friendly answer.
 #
-# EXAMPLE BELOW (Wikipedia). For a dictionary, see note at bottom.
+# EXAMPLE BELOW (Wikipedia, see wiki_tool.py). For a dictionary, see note at bottom.
 #
 # RUN
 #   python 06_homework_wikipedia_template.py
@@ -17,41 +17,18 @@
 # - Add error handling for 404s or missing fields.
 # - Add a second tool and let the model decide which one to call.
 
-import os, json, requests
+import os, json
 from openai import OpenAI
+from tool_registry import ToolRegistry
+from result_compactor import compact_json
+from usage_meter import MeteredClient
 
 MODEL = os.getenv("MODEL", "gpt-4o-mini")
-client = OpenAI()
+client = MeteredClient(OpenAI())  # token usage per call (usage_meter.py)
 
-def wiki_summary(title: str) -> dict:
-    api = f"https://en.wikipedia.org/api/rest_v1/page/summary/{title}"
-    r = requests.get(api, timeout=15, headers={"accept": "application/json"})
-    if r.status_code == 404:
-        return {"title": title, "summary": None, "url": None}
-    r.raise_for_status()
-    d = r.json()
-    return {
-        "title": d.get("title"),
-        "summary": d.get("extract"),
-        "url": d.get("content_urls", {}).get("desktop", {}).get("page")
-    }
-
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "wiki_summary",
-            "description": "Get a concise encyclopedia summary for a topic title.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "title": {"type": "string"}
-                },
-                "required": ["title"]
-            }
-        }
-    }
-]
+# wiki_summary(title) lives in wiki_tool.py (shared with 05_cli_tools_assistant.py).
+# Its schema is generated from the function's type hints and docstring.
+registry = ToolRegistry().lazy("wiki_tool", "wiki_summary")
 
 user_prompt = "Give me a brief encyclopedia summary of 'reinforcement learning' in 2 sentences."
 
@@ -61,7 +38,7 @@ first = client.chat.completions.create(
         {"role": "system", "content": "You are a helpful research assistant."},
         {"role": "user", "content": user_prompt}
     ],
-    tools=tools,
+    tools=registry.tools,
     tool_choice="auto"
 )
 
@@ -70,12 +47,12 @@ tool_messages = []
 if msg.tool_calls:
     for call in msg.tool_calls:
         args = json.loads(call.function.arguments or "{}")
-        result = wiki_summary(**args)
+        result = registry.call(call.function.name, args)
         tool_messages.append({
             "role": "tool",
             "tool_call_id": call.id,
             "name": call.function.name,
-            "content": json.dumps(result)
+            "content": compact_json(call.function.name, result)  # keep the follow-up prompt small
         })
     final = client.chat.completions.create(
         model=MODEL,
@@ -93,8 +70,10 @@ else:
 
 # DICTIONARY OPTION (idea)
 # Instead of wiki_summary, implement:
+#   @registry.tool
 #   def define_word(term: str) -> dict:
+#       """Look up the meaning of an English word."""
 #       url = f"https://api.dictionaryapi.dev/api/v2/entries/en/{term}"
 #       ... parse meanings and examples ...
-# Then register it as a tool named "define_word" and ask the model
+# The decorator registers it as a tool named "define_word"; then ask the model
 # to "Define '<term>' and provide one example sentence."
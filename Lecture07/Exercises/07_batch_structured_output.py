@@ -0,0 +1,267 @@
+# Lesson 7 – Exercise 7
+# Title: Batch Structured Outputs (async, rate-limited, resumable)
+#
+# GOAL
+# - Generate MANY schema-validated records (the WeatherReport of exercise 04),
+#   not just one. One request at a time, throughput is capped by the
+#   round-trip time; with N requests in flight it is capped by the account's
+#   rate limits instead, which is what we want.
+#
+# WHAT IT DOES
+# - Reads requests from a JSONL file, one per line:
+#     {"id": "austin", "location": "Austin, TX"}
+#     {"id": "q2", "prompt": "Create a WeatherReport JSON for ..."}
+#   ("id" defaults to the line number; "location" fills the exercise 04 prompt)
+# - Runs them on AsyncOpenAI with at most --concurrency requests in flight.
+# - Paces them to --rpm requests/min and --tpm tokens/min (rate_limiter.py)
+#   and retries 429/5xx/connection errors with jittered backoff.
+# - Validates each answer against the schema, after local repair
+#   (json_repair.py), and streams the results as they complete:
+#     --out      {"id": ..., "data": {...}, "repairs": [...]}
+#     --rejects  {"id": ..., "error": "...", "raw": "...", "retryable": false}
+#   One bad item never stops the batch: a malformed input line, an answer
+#   that fails validation or an unexpected error is written to --rejects.
+# - RESUME: the output and reject files are the checkpoint. Run the same
+#   command again after a crash or Ctrl-C and the ids already written are
+#   skipped, except rejects marked "retryable": true (rate limits, 5xx and
+#   connection errors that outlasted the retries, unexpected errors); those
+#   are tried again.
+# - Ends with the token usage and estimated cost of the run (usage_meter.py).
+#
+# REQUIREMENTS
+# - pip install openai jsonschema
+# - OPENAI_API_KEY in env
+#
+# RUN
+#   python 07_batch_structured_output.py prompts.jsonl --out reports.jsonl \
+#       --rejects rejects.jsonl --concurrency 32 --rpm 500 --tpm 200000
+
+import os, sys, json, time, asyncio, argparse
+from typing import Any, Dict, Iterator, List, Set
+
+import openai
+from openai import AsyncOpenAI
+from jsonschema import ValidationError
+from json_repair import repair_json, repair_stats
+from rate_limiter import RateLimiter, with_retries, DEFAULT_RPM, DEFAULT_TPM
+from result_compactor import estimate_tokens
+from usage_meter import MeteredClient, default_meter
+
+MODEL = os.getenv("MODEL", "gpt-4o-mini")
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", "400"))
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "location": {"type": "string"},
+        "summary": {"type": "string"},
+        "temp_c": {"type": "number"},
+        "hourly_c": {
+            "type": "array",
+            "items": {"type": "number"}
+        }
+    },
+    "required": ["location", "summary", "temp_c", "hourly_c"],
+    "additionalProperties": False
+}
+
+SYSTEM = (
+    "You are a formatter that outputs ONLY JSON and nothing else.\n"
+    "If you are unsure, make a best effort.\n"
+    "Do not wrap in markdown. Do not include comments."
+)
+TEMPLATE = (
+    "Create a WeatherReport JSON for '{location}' with a short textual summary,"
+    " a current temperature in Celsius, and 5 hourly temps."
+)
+
+
+def build_messages(item: Dict[str, Any]) -> List[Dict[str, str]]:
+    prompt = item.get("prompt") or TEMPLATE.format(location=item["location"])
+    return [
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": prompt},
+        {"role": "user", "content": "Schema:"},
+        {"role": "user", "content": json.dumps(SCHEMA)},
+    ]
+
+
+# ---- checkpoint ----
+def _trim_partial_line(path: str) -> None:
+    """Drop a last line that was cut off mid-write, so appending stays valid JSONL."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def load_done(*paths: str) -> Set[Any]:
+    """Ids with a final result: valid records and permanent rejects."""
+    done: Set[Any] = set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        _trim_partial_line(path)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if not record.get("retryable"):
+                        done.add(record["id"])
+                except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                    pass
+    return done
+
+
+def _check_request(item: Any) -> str:
+    """Why a parsed input line is not a usable request ("" if it is)."""
+    if not isinstance(item, dict):
+        return "not a JSON object"
+    if not isinstance(item["id"], (str, int)):
+        return "\"id\" must be a string or a number"
+    if not (item.get("prompt") or item.get("location")):
+        return "needs \"location\" or \"prompt\""
+    return ""
+
+
+def read_requests(path: str, done: Set[Any]) -> Iterator[Dict[str, Any]]:
+    """Requests not done yet; a bad line becomes {"id": ..., "invalid": reason}."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                item = {"id": number, "invalid": f"bad JSON: {e}"}
+            else:
+                if isinstance(item, dict):
+                    item.setdefault("id", number)
+                problem = _check_request(item)
+                if problem:
+                    usable_id = isinstance(item, dict) and isinstance(item["id"], (str, int))
+                    item = {"id": item["id"] if usable_id else number, "invalid": problem}
+            if item["id"] not in done:
+                yield item
+
+
+# ---- runner ----
+class BatchRunner:
+    def __init__(self, client: AsyncOpenAI, limiter: RateLimiter, out, rejects, concurrency: int) -> None:
+        self.client = client
+        self.limiter = limiter
+        self.out = out
+        self.rejects = rejects
+        self.concurrency = concurrency
+        self.stats = {"done": 0, "rejected": 0, "retries": 0, "tokens": 0}
+        self.started = time.perf_counter()
+
+    def _write(self, f, record: Dict[str, Any]) -> None:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()  # a crash loses at most the line being written
+
+    async def _call(self, messages: List[Dict[str, str]]):
+        reserved = await self.limiter.acquire(estimate_tokens(messages) + MAX_TOKENS)
+        resp = await self.client.chat.completions.create(
+            model=MODEL,
+            temperature=0,
+            max_tokens=MAX_TOKENS,
+            messages=messages,
+        )
+        used = resp.usage.total_tokens if resp.usage else None
+        self.limiter.settle(reserved, used)
+        self.stats["tokens"] += used or 0
+        return resp
+
+    def _reject(self, item_id: Any, error: str, raw: Any = None, retryable: bool = False) -> None:
+        self.stats["rejected"] += 1
+        self._write(self.rejects, {"id": item_id, "error": error, "raw": raw, "retryable": retryable})
+
+    async def _generate(self, item: Dict[str, Any]) -> None:
+        messages = build_messages(item)
+        try:
+            resp = await with_retries(lambda: self._call(messages), stats=self.stats)
+        except openai.BadRequestError as e:
+            # the request itself is wrong; sending it again will not help
+            self._reject(item["id"], f"{type(e).__name__}: {e}")
+            return
+        except openai.OpenAIError as e:
+            # rate limit, 5xx or connection error after all retries: try again on resume
+            self._reject(item["id"], f"{type(e).__name__}: {e}", retryable=True)
+            return
+        raw = resp.choices[0].message.content or ""
+        try:
+            data, repairs = repair_json(raw, SCHEMA)
+        except (json.JSONDecodeError, ValidationError) as e:
+            self._reject(item["id"], str(e).splitlines()[0], raw)
+            return
+        self.stats["done"] += 1
+        self._write(self.out, {"id": item["id"], "data": data, "repairs": repairs})
+
+    async def _process(self, item: Dict[str, Any]) -> None:
+        if "invalid" in item:
+            self._reject(item["id"], f"bad input line: {item['invalid']}")
+            return
+        try:
+            await self._generate(item)
+        except Exception as e:
+            # e.g. a response without choices: one item must not stop the batch
+            self._reject(item["id"], f"{type(e).__name__}: {e}", retryable=True)
+
+    async def _worker(self, queue: "asyncio.Queue") -> None:
+        while (item := await queue.get()) is not None:
+            await self._process(item)
+            finished = self.stats["done"] + self.stats["rejected"]
+            if finished % 50 == 0:
+                self.report(file=sys.stderr)
+
+    async def run(self, items: Iterator[Dict[str, Any]]) -> None:
+        # A small queue keeps memory flat, however long the input file is
+        queue: "asyncio.Queue" = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        for item in items:
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    def report(self, file=sys.stdout) -> None:
+        elapsed = time.perf_counter() - self.started
+        finished = self.stats["done"] + self.stats["rejected"]
+        print(
+            f"{self.stats['done']} valid, {self.stats['rejected']} rejected, "
+            f"{self.stats['retries']} retries, {self.stats['tokens']} tokens in {elapsed:.1f}s "
+            f"({finished / elapsed if elapsed else 0:.1f} records/s)",
+            file=file,
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate schema-validated records from a JSONL file of requests.")
+    parser.add_argument("input", help="JSONL file, one request per line")
+    parser.add_argument("--out", default="reports.jsonl", help="valid records (JSONL)")
+    parser.add_argument("--rejects", default="rejects.jsonl", help="invalid records (JSONL)")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="requests per minute")
+    parser.add_argument("--tpm", type=float, default=DEFAULT_TPM, help="tokens per minute")
+    args = parser.parse_args()
+
+    done = load_done(args.out, args.rejects)
+    if done:
+        print(f"Resuming: {len(done)} ids already written, skipping them.", file=sys.stderr)
+
+    # max_retries=0: retries are done by with_retries(), which re-acquires the rate limiter
+    client = MeteredClient(AsyncOpenAI(max_retries=0))
+    with open(args.out, "a", encoding="utf-8") as out, open(args.rejects, "a", encoding="utf-8") as rejects:
+        runner = BatchRunner(client, RateLimiter(args.rpm, args.tpm), out, rejects, args.concurrency)
+        try:
+            await runner.run(read_requests(args.input, done))
+        finally:
+            await client.close()
+    runner.report()
+    print("Local repair stats:", repair_stats())
+    default_meter.report(file=sys.stdout)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
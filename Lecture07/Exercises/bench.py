@@ -0,0 +1,340 @@
+# Lesson 7 – Benchmark: the Exercises' Request Flows, Offline
+#
+# GOAL
+# - Measure every performance change to these flows the same way, on a
+#   laptop, without an API key: each flow runs against fake_services.py
+#   (OpenAI + Open-Meteo + Wikipedia + HN stand-ins with fixed latencies).
+#
+# WHAT IT REPORTS (per flow)
+# - p50 / p95 / p99 / mean latency of one run of the flow
+# - throughput: items per second (a question, a record, a chat turn)
+# - allocations: peak KiB traced by tracemalloc during one run, and KiB still
+#   allocated afterwards (measured in separate runs, so tracing doesn't slow
+#   down the timed ones)
+# - errors, and how many requests each fake service received
+#
+# FLOWS
+#   01_tools, 02_weather, 03_hn, 04_structured, 06_wiki   the scripts, run in-process
+#   05_answer, 05_stream      answer() / answer_streaming() of the CLI assistant
+#   05_batch                  answer_batch() over --batch-size questions
+#   07_batch                  the structured-output batch runner over --batch-size records
+#   08_chat                   one Lecture 8 study-assistant turn (near-duplicate
+#                             cache lookup + streamed answer)
+#
+# CACHES
+# - By default every cache (tool caches, response cache, answer cache) is
+#   cleared before each run, so the full flow is measured. --warm keeps them,
+#   which measures the cached path instead.
+#
+# RUN
+#   python bench.py                                   # all flows
+#   python bench.py 05_answer 05_batch -n 30 --latency-ms 300 --seed 1
+#   python bench.py --concurrency 8 --json results.json
+# The fake server runs in its own process (so it doesn't share our GIL); any
+# fake_services.py option (--latency-ms, --tokens-per-sec, --error-rate, ...)
+# can be passed here.
+
+import os, sys, io, json, time, runpy, shutil, asyncio, argparse, tempfile, tracemalloc, subprocess
+import contextlib, importlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fake_services import add_config_arguments, config_argv
+
+HERE = Path(__file__).resolve().parent
+LECTURE08 = HERE.parents[1] / "Lecture08" / "Exercises"
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+# ---- fake services in a child process ----
+class FakeServer:
+    def __init__(self, args: argparse.Namespace) -> None:
+        cmd = [sys.executable, str(HERE / "fake_services.py"), "--port", "0", *config_argv(args)]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        line = self.proc.stdout.readline().split()
+        if not line or line[0] != "READY":
+            self.proc.kill()
+            raise RuntimeError("fake_services.py did not start")
+        self.url = line[1]
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "OPENAI_BASE_URL": self.url + "/v1",
+            "OPENAI_API_KEY": "fake",
+            "OPEN_METEO_BASE_URL": self.url,
+            "WIKIPEDIA_BASE_URL": self.url,
+            "HN_BASE_URL": self.url,
+        }
+
+    def counts(self) -> Dict[str, int]:
+        import http_pool
+        return http_pool.read_json(http_pool.get(self.url + "/_stats"))
+
+    def close(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+
+
+# ---- flows ----
+class Flow:
+    """One exercise's request flow: setup() once, then run(i) per measured run."""
+
+    items = 1  # items (questions, records, turns) handled by one run
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+
+    def setup(self) -> None:
+        pass
+
+    def run(self, i: int) -> None:
+        raise NotImplementedError
+
+
+class ScriptFlow(Flow):
+    """Run an exercise script top to bottom (in this process, output discarded)."""
+
+    def __init__(self, args: argparse.Namespace, script: str) -> None:
+        super().__init__(args)
+        self.script = str(HERE / script)
+
+    def run(self, i: int) -> None:
+        runpy.run_path(self.script, run_name="__main__")
+
+
+class AssistantFlow(Flow):
+    def __init__(self, args: argparse.Namespace, mode: str) -> None:
+        super().__init__(args)
+        self.mode = mode
+        self.items = args.batch_size if mode == "batch" else 1
+
+    def setup(self) -> None:
+        self.module = importlib.import_module("05_cli_tools_assistant")
+
+    def run(self, i: int) -> None:
+        question = f"What's the weather in Seattle? (run {i})"
+        if self.mode == "answer":
+            self.module.answer(question)
+        elif self.mode == "stream":
+            self.module.answer_streaming(question)
+        else:
+            questions = [f"{question} #{k}" for k in range(self.items)]
+            asyncio.run(self.module.answer_batch(questions, self.args.batch_concurrency, out=io.StringIO()))
+
+
+class StructuredBatchFlow(Flow):
+    def __init__(self, args: argparse.Namespace) -> None:
+        super().__init__(args)
+        self.items = args.batch_size
+
+    def setup(self) -> None:
+        self.module = importlib.import_module("07_batch_structured_output")
+        from rate_limiter import RateLimiter
+        self.RateLimiter = RateLimiter
+
+    def run(self, i: int) -> None:
+        from openai import AsyncOpenAI
+        items = [{"id": f"{i}-{k}", "location": f"City {i}-{k}"} for k in range(self.items)]
+
+        async def go() -> None:
+            client = AsyncOpenAI(max_retries=0)
+            runner = self.module.BatchRunner(
+                client, self.RateLimiter(1e6, 1e9),
+                io.StringIO(), io.StringIO(), self.args.batch_concurrency,
+            )
+            try:
+                await runner.run(iter(items))
+            finally:
+                await client.close()
+
+        asyncio.run(go())
+
+
+class StudyChatFlow(Flow):
+    """A Lecture 8 study-assistant turn: answer-cache lookup, then a streamed answer."""
+
+    def setup(self) -> None:
+        sys.path.insert(0, str(LECTURE08))
+        from openai import OpenAI
+        from near_duplicate_cache import NearDuplicateCache
+        self.client = OpenAI()
+        self.NearDuplicateCache = NearDuplicateCache
+        self.cache = NearDuplicateCache()
+
+    def run(self, i: int) -> None:
+        system = "You are a helpful study assistant."
+        prompt = f"Explain Newton's laws of motion, part {i % 5}"
+        scope = ("gpt-4o-mini", system)
+        if self.cache.lookup(prompt, scope=scope) is not None:
+            return
+        stream = self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            temperature=0.7,
+            stream=True,
+            messages=[{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+        )
+        answer = "".join(c.choices[0].delta.content or "" for c in stream if c.choices)
+        self.cache.add(prompt, answer, scope=scope)
+
+    def reset(self) -> None:
+        self.cache = self.NearDuplicateCache()
+
+
+def make_flows(args: argparse.Namespace) -> Dict[str, Flow]:
+    return {
+        "01_tools": ScriptFlow(args, "01_basic_tools_intro.py"),
+        "02_weather": ScriptFlow(args, "02_weather_tool_open_meteo.py"),
+        "03_hn": ScriptFlow(args, "03_news_tool_hn.py"),
+        "04_structured": ScriptFlow(args, "04_structured_output_validation.py"),
+        "05_answer": AssistantFlow(args, "answer"),
+        "05_stream": AssistantFlow(args, "stream"),
+        "05_batch": AssistantFlow(args, "batch"),
+        "06_wiki": ScriptFlow(args, "06_homework_wikipedia_template.py"),
+        "07_batch": StructuredBatchFlow(args),
+        "08_chat": StudyChatFlow(args),
+    }
+
+
+def reset_caches(flow: Flow) -> None:
+    """Empty every cache the flows use, so a run measures the full flow."""
+    for name, attr in (("weather_tool", "weather_cache"), ("hn_tool", "hn_cache"), ("wiki_tool", "wiki_cache")):
+        module = sys.modules.get(name)
+        if module is not None:
+            getattr(module, attr).clear()
+    if "response_cache" in sys.modules:
+        from sqlite_cache import SQLiteCache
+        responses = SQLiteCache("chat_completions")
+        responses.clear()
+        responses.close()
+    if isinstance(flow, StudyChatFlow):
+        flow.reset()
+
+
+# ---- measuring ----
+def _run_once(flow: Flow, i: int) -> Optional[float]:
+    start = time.perf_counter()
+    try:
+        flow.run(i)
+    except Exception as e:
+        print(f"  run {i} failed: {type(e).__name__}: {e}", file=sys.__stderr__)
+        return None
+    return time.perf_counter() - start
+
+
+def measure(flow: Flow, args: argparse.Namespace) -> Dict[str, Any]:
+    flow.setup()
+    for i in range(args.warmup):
+        if not args.warm:
+            reset_caches(flow)
+        _run_once(flow, -1 - i)
+
+    def one(i: int) -> Optional[float]:
+        if not args.warm and args.concurrency == 1:
+            reset_caches(flow)
+        return _run_once(flow, i)
+
+    started = time.perf_counter()
+    if args.concurrency == 1:
+        times = [one(i) for i in range(args.iterations)]
+    else:
+        if not args.warm:
+            reset_caches(flow)
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            times = list(pool.map(one, range(args.iterations)))
+    wall = time.perf_counter() - started
+    ok = [t for t in times if t is not None]
+
+    # Allocations, in separate (untimed) runs
+    peaks, retained = [], []
+    tracemalloc.start()
+    for i in range(args.alloc_runs):
+        if not args.warm:
+            reset_caches(flow)
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _run_once(flow, 10_000 + i)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    tracemalloc.stop()
+
+    ms = [t * 1000 for t in ok] or [float("nan")]
+    return {
+        "runs": len(times),
+        "errors": len(times) - len(ok),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "mean_ms": sum(ms) / len(ms),
+        "items_per_s": len(ok) * flow.items / wall if wall else 0.0,
+        "alloc_peak_kib": max(peaks) / 1024 if peaks else None,
+        "alloc_retained_kib": sum(retained) / len(retained) / 1024 if retained else None,
+    }
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'flow':<14} {'runs':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'items/s':>9} {'peak KiB':>9} {'kept KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        peak = f"{r['alloc_peak_kib']:9.0f}" if r["alloc_peak_kib"] is not None else f"{'-':>9}"
+        kept = f"{r['alloc_retained_kib']:9.1f}" if r["alloc_retained_kib"] is not None else f"{'-':>9}"
+        print(f"{name:<14} {r['runs']:>5} {r['errors']:>4} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} "
+              f"{r['p99_ms']:9.1f} {r['mean_ms']:9.1f} {r['items_per_s']:9.2f} {peak} {kept}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the exercises' request flows against fake_services.py.")
+    parser.add_argument("flows", nargs="*", help="flows to run (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="measured runs per flow")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=1, help="runs in flight at once")
+    parser.add_argument("--batch-size", type=int, default=20, help="questions/records per 05_batch/07_batch run")
+    parser.add_argument("--batch-concurrency", type=int, default=8)
+    parser.add_argument("--alloc-runs", type=int, default=3, help="extra runs traced with tracemalloc")
+    parser.add_argument("--warm", action="store_true", help="keep caches between runs")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    flows = make_flows(args)
+    names = args.flows or list(flows)
+    unknown = [n for n in names if n not in flows]
+    if unknown:
+        parser.error(f"unknown flows {unknown}; choose from {list(flows)}")
+
+    server = FakeServer(args)
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+    # Before any tool module is imported: they read these at import time
+    os.environ.update(server.env(), CACHE_DIR=cache_dir)
+    sys.path.insert(0, str(HERE))
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # the scripts print their answers
+            for name in names:
+                print(f"running {name} ...", file=sys.stderr)
+                results[name] = measure(flows[name], args)
+                sys.stdout.seek(0)
+                sys.stdout.truncate()
+        counts = server.counts()
+    finally:
+        server.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print_table(results)
+    print("\nrequests served by the fakes:", counts)
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k not in ("flows", "json")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results, "requests": counts}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# Lesson 7 – Helper: Circuit Breakers for Tools
+#
+# GOAL
+# - When Open-Meteo or Wikipedia is down, every get_weather / wiki_summary
+#   call still waits for its timeout (and retries) before failing. In a batch
+#   of 100 questions that is 100 slow failures. A circuit breaker notices the
+#   outage and fails FAST instead, so the assistant keeps answering.
+#
+# HOW IT WORKS (one breaker per tool)
+# - CLOSED: calls go through. Failures are counted; after
+#   `failure_threshold` failures within `window` seconds the breaker OPENS.
+# - OPEN: calls are not made at all. For `open_for` seconds the tool answers
+#   immediately with a fallback (below).
+# - HALF-OPEN: after `open_for`, up to `half_open_calls` trial calls go
+#   through. A success closes the breaker; a failure opens it again.
+# - Only errors that mean the service is in trouble count as failures:
+#   timeouts, connection errors and HTTP 5xx (is_outage). A TypeError or an
+#   HTTP 4xx comes from the arguments the model sent, says nothing about the
+#   upstream service and is raised as usual (the executor turns it into an
+#   {"error": ...} result) without being counted.
+#
+# FALLBACK (when the breaker is open or the call fails)
+# - The last good result for the same arguments, marked "stale": true
+#   (ToolBreakers keeps the last `keep_results` results per tool), or
+# - {"error": "unavailable", "tool": ..., "reason": ..., "retry_in_s": ...}
+#   which the model can relay ("the weather service is unavailable").
+#
+# ACROSS PROCESSES
+# - By itself a ToolBreakers lives in memory, which only helps a long-running
+#   process (--batch, the Streamlit apps). The CLI answers one question per
+#   process and makes a few tool calls, so it would never reach 5 failures
+#   and would never have a last good result. Pass store=SQLiteCache(...)
+#   (05_cli_tools_assistant.py does): the breaker states and the last good
+#   results are then saved there, the next run starts with an open breaker
+#   during an outage and still has a stale result to fall back on.
+#   Processes running at the same time simply overwrite each other's state.
+#
+# CONFIGURATION (environment variables or ToolBreakers(...))
+#   TOOL_BREAKER_FAILURES  failures that open the breaker  (default 5)
+#   TOOL_BREAKER_WINDOW    ... within this many seconds    (default 60)
+#   TOOL_BREAKER_OPEN      seconds before a trial call     (default 30)
+#
+# USAGE
+#   breakers = ToolBreakers()                                  # in memory
+#   breakers = ToolBreakers(store=SQLiteCache("tool_breakers"))  # survives restarts
+#   registry = ToolRegistry(breakers=breakers)   # registry.call() goes through them
+#   print(breakers.stats())  # {tool: {"state", "trips", "short_circuited", ...}}
+
+import os, json, time, threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from sqlite_cache import SQLiteCache
+import tracing
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def is_outage(error: BaseException) -> bool:
+    """Does this error say the upstream service is down (not that the request was bad)?"""
+    import requests  # the tools have imported it already
+
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status >= 500
+    return isinstance(error, (requests.Timeout, requests.ConnectionError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial -> closed again."""
+
+    def __init__(
+        self,
+        failure_threshold: int = int(os.getenv("TOOL_BREAKER_FAILURES", "5")),
+        window: float = float(os.getenv("TOOL_BREAKER_WINDOW", "60")),
+        open_for: float = float(os.getenv("TOOL_BREAKER_OPEN", "30")),
+        half_open_calls: int = 1,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.open_for = open_for
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._failures: Deque[float] = deque()
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "trips": 0, "short_circuited": 0}
+        self.last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        """May a call go through now? (Counts it as a trial when half-open.)"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_for:
+                self.state, self._trials = HALF_OPEN, 0
+            if self.state == CLOSED or (self.state == HALF_OPEN and self._trials < self.half_open_calls):
+                if self.state == HALF_OPEN:
+                    self._trials += 1
+                self._stats["calls"] += 1
+                return True
+            self._stats["short_circuited"] += 1
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._failures.clear()
+
+    def failure(self, error: BaseException) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._stats["failures"] += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            if self.state == HALF_OPEN or len(self._failures) >= self.failure_threshold:
+                if self.state != OPEN:
+                    self._stats["trips"] += 1
+                self.state, self._opened_at = OPEN, now
+
+    def release(self) -> None:
+        """The call neither succeeded nor failed (bad arguments): free its trial slot."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def retry_in(self) -> float:
+        """Seconds until the next trial call (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_for - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, state=self.state, recent_failures=len(self._failures),
+                        last_error=self.last_error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State, recent failures and opening time as wall-clock times (for saving)."""
+        offset = time.time() - time.monotonic()
+        with self._lock:
+            return {"state": self.state, "failures": [t + offset for t in self._failures],
+                    "opened_at": self._opened_at + offset, "last_error": self.last_error}
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Continue from a snapshot() taken by an earlier process."""
+        offset = time.time() - time.monotonic()
+        with self._lock:
+            # a trial that was running when the process ended is simply made again
+            self.state = OPEN if data.get("state") == HALF_OPEN else data.get("state", CLOSED)
+            now = time.monotonic()
+            self._failures = deque(t - offset for t in data.get("failures", []) if now - (t - offset) <= self.window)
+            self._opened_at = data.get("opened_at", offset) - offset
+            self.last_error = data.get("last_error")
+
+
+class ToolBreakers:
+    """One CircuitBreaker per tool, plus the last good result per call for stale fallbacks.
+
+    With a `store`, both are also kept there and picked up by the next process.
+    """
+
+    def __init__(self, keep_results: int = 256, store: Optional[SQLiteCache] = None, **breaker_kwargs: Any) -> None:
+        self.keep_results = keep_results
+        self.store = store
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._last_good: Dict[str, "OrderedDict[str, Tuple[Any, float]]"] = {}
+        self._fallbacks = {"stale": 0, "unavailable": 0}
+        self._lock = threading.Lock()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                breaker = self._breakers[name] = CircuitBreaker(**self._breaker_kwargs)
+                self._last_good[name] = OrderedDict()
+                if self.store is not None:
+                    saved, _, _ = self.store.get(f"state:{name}")
+                    if saved:
+                        breaker.restore(saved)
+            return self._breakers[name]
+
+    def _save_state(self, name: str, breaker: CircuitBreaker) -> None:
+        if self.store is not None:
+            self.store.set(f"state:{name}", breaker.snapshot())
+
+    def _remember(self, name: str, key: str, result: Any) -> None:
+        with self._lock:
+            results = self._last_good[name]
+            results[key] = (result, time.time())
+            results.move_to_end(key)
+            while len(results) > self.keep_results:
+                results.popitem(last=False)
+        if self.store is not None:
+            try:
+                self.store.set(f"result:{name}:{key}", {"result": result, "stored_at": time.time()})
+            except (TypeError, ValueError):  # not JSON: kept in memory only
+                pass
+
+    def _fallback(self, name: str, key: str, reason: str) -> Any:
+        with self._lock:
+            entry = self._last_good[name].get(key)
+        if entry is None and self.store is not None:
+            saved, _, _ = self.store.get(f"result:{name}:{key}")
+            if saved:
+                entry = (saved["result"], saved["stored_at"])
+        with self._lock:
+            self._fallbacks["stale" if entry else "unavailable"] += 1
+        tracing.current().set("fallback", "stale" if entry else "unavailable")
+        if entry is not None:
+            result, stored_at = entry
+            age = round(time.time() - stored_at)
+            if isinstance(result, dict):
+                return {**result, "stale": True, "stale_age_s": age}
+            return {"stale": True, "stale_age_s": age, "result": result}
+        return {"error": "unavailable", "tool": name, "reason": reason,
+                "retry_in_s": round(self.breaker(name).retry_in(), 1)}
+
+    def call(self, name: str, fn: Callable[..., Any], args: Dict[str, Any]) -> Any:
+        """fn(**args) behind the tool's breaker; a fallback instead of an exception."""
+        breaker = self.breaker(name)
+        key = json.dumps(args, sort_keys=True, default=str)
+        tracing.current().set("breaker", breaker.state)
+        if not breaker.allow():
+            return self._fallback(name, key, "circuit open")
+        was = breaker.state
+        try:
+            result = fn(**args)
+        except Exception as e:
+            if not is_outage(e):
+                # bad arguments (TypeError, HTTP 4xx): the model's mistake, not an outage
+                breaker.release()
+                raise
+            breaker.failure(e)
+            self._save_state(name, breaker)
+            return self._fallback(name, key, f"{type(e).__name__}: {e}")
+        breaker.success()
+        if was != CLOSED:  # a trial call closed it again
+            self._save_state(name, breaker)
+        self._remember(name, key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """{tool: breaker stats} plus "fallbacks": {"stale", "unavailable"}."""
+        with self._lock:
+            breakers = dict(self._breakers)
+            out: Dict[str, Any] = {"fallbacks": dict(self._fallbacks)}
+        for name, breaker in breakers.items():
+            out[name] = breaker.stats()
+        return out
@@ -0,0 +1,469 @@
+# Lesson 7 – Helper: Offline Stand-ins for OpenAI, Open-Meteo, Wikipedia and HN
+#
+# GOAL
+# - Run (and benchmark) the exercises without an API key or network access.
+#   One local HTTP server answers like the real services, with latency and
+#   failures you choose, so every run is reproducible on a laptop.
+#
+# WHAT IT SERVES
+# - POST /v1/chat/completions   OpenAI-compatible, stream=True or not
+#     * latency: time to first token is lognormal around --latency-ms
+#       (--latency-sigma sets the spread); then --tokens-per-sec, streamed in
+#       chunks of --chunk-tokens tokens
+#     * tool calls: when the request offers tools and the model hasn't seen
+#       tool results yet, it calls up to --max-tool-calls of them, with
+#       arguments generated from each tool's JSON schema
+#     * structured output: if a message holds a JSON Schema (exercise 04/07),
+#       the answer is an instance of that schema
+#     * scripted answers: --script rules.json, a list of
+#         {"match": "regex on the last user message",
+#          "tool_calls": [{"name": "get_weather", "arguments": {...}}],
+#          "content": "fixed answer text"}
+#       (first match wins; otherwise the behaviour above)
+#     * errors: --error-rate of requests fail with --error-status (429 has a
+#       Retry-After header)
+# - GET /v1/forecast                       Open-Meteo forecast (one or many coordinates)
+# - GET /api/rest_v1/page/summary/<title>  Wikipedia summary, with ETag / 304
+# - GET /api/v1/search                     HN Algolia search
+#     all with --tool-latency-ms latency and --tool-error-rate 500s
+# - GET /_stats                            request counts per route
+#
+# REPRODUCIBLE RUNS (--seed)
+# - The server handles requests on many threads at once, so one shared
+#   random generator would hand out its numbers in whatever order the
+#   threads reach it. With --seed, each request gets its own generator,
+#   seeded from (seed, request, how many identical requests came before).
+#   The request is the GET path with its query, or the POST path and body.
+#   Two runs of the same flow then see the same latencies, errors, answers
+#   and tool-call ids, however the requests interleave.
+#
+# RUN
+#   python fake_services.py --port 8788 --latency-ms 300 --tokens-per-sec 80
+#   # then, in another shell, use the printed environment variables:
+#   export OPENAI_BASE_URL=http://127.0.0.1:8788/v1 OPENAI_API_KEY=fake \
+#          OPEN_METEO_BASE_URL=http://127.0.0.1:8788 WIKIPEDIA_BASE_URL=... HN_BASE_URL=...
+#   python 05_cli_tools_assistant.py "Weather in Seattle?"
+#
+# IN PYTHON
+#   services = start(FakeConfig(latency_ms=50))
+#   os.environ.update(services.env())
+#   ...
+#   services.close()
+
+import re, sys, json, math, time, uuid, random, hashlib, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+SAMPLE_VALUES: Dict[str, Any] = {
+    "lat": 47.61, "latitude": 47.61, "lon": -122.33, "longitude": -122.33,
+    "title": "Seattle", "query": "python", "location": "Seattle, WA", "name": "Seattle",
+    "place": "Seattle, WA",
+}
+WORDS = (
+    "the forecast shows mild temperatures with light wind and a chance of rain later "
+    "today while the city remains a major hub for technology and trade on the coast"
+).split()
+
+
+class FakeConfig:
+    """Behaviour of the fake services (see the header for what each setting does)."""
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        latency_sigma: float = 0.5,
+        tokens_per_sec: float = 80.0,
+        chunk_tokens: int = 4,
+        completion_tokens: int = 60,
+        max_tool_calls: int = 3,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        tool_latency_ms: float = 40.0,
+        tool_error_rate: float = 0.0,
+        script: Optional[List[Dict[str, Any]]] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.completion_tokens = completion_tokens
+        self.max_tool_calls = max_tool_calls
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tool_latency_ms = tool_latency_ms
+        self.tool_error_rate = tool_error_rate
+        self.script = script or []
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def request_rng(self, key: str) -> random.Random:
+        """The random generator for one request (see REPRODUCIBLE RUNS); shared without a seed."""
+        if self.seed is None:
+            return self.rng
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+        digest = hashlib.sha256(f"{self.seed}\0{key}\0{n}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def delay(self, median_ms: float, rng: Optional[random.Random] = None) -> float:
+        """A lognormal delay in seconds with the given median."""
+        if median_ms <= 0:
+            return 0.0
+        return median_ms / 1000.0 * math.exp((rng or self.rng).normalvariate(0, self.latency_sigma))
+
+
+# ---- content generation ----
+def sample_instance(schema: Dict[str, Any], name: str = "", index: int = 0) -> Any:
+    """A small value that matches `schema` (property names pick nicer samples)."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    kind = kind[0] if isinstance(kind, list) else kind
+    if kind == "object" or "properties" in schema:
+        return {k: sample_instance(v, k, index) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 0), min(3, schema.get("maxItems", 3)))
+        return [sample_instance(schema.get("items", {}), name, i) for i in range(count)]
+    if kind in ("number", "integer"):
+        value = SAMPLE_VALUES.get(name)
+        value = (value if isinstance(value, (int, float)) else 3) + index * 0.5
+        value = min(max(value, schema.get("minimum", value)), schema.get("maximum", value))
+        return int(value) if kind == "integer" else value
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    value = SAMPLE_VALUES.get(name, "sample")
+    return value if isinstance(value, str) else "sample"
+
+
+def _find_schema(messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str) and content.lstrip().startswith("{"):
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict) and "properties" in data:
+                return data
+    return None
+
+
+def _words(count: int, rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(max(1, count)))
+
+
+def _plan(body: Dict[str, Any], config: FakeConfig, rng: random.Random):
+    """-> (content or None, tool calls or None) for this request."""
+    messages = body.get("messages", [])
+    last_user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    needs_tools = bool(body.get("tools")) and body.get("tool_choice") != "none" \
+        and not any(m.get("role") == "tool" for m in messages)
+    for rule in config.script:
+        if re.search(rule.get("match", ""), str(last_user)):
+            calls = rule.get("tool_calls") if needs_tools else None
+            return (None, calls) if calls else (rule.get("content", ""), None)
+    if needs_tools:
+        calls = []
+        for t in body["tools"][: config.max_tool_calls]:
+            fn = t.get("function", {})
+            calls.append({"name": fn.get("name"), "arguments": sample_instance(fn.get("parameters", {}))})
+        return None, calls
+    schema = _find_schema(messages)
+    if schema is not None:
+        return json.dumps(sample_instance(schema)), None
+    return _words(config.completion_tokens, rng), None
+
+
+def _tokens(text: str) -> List[str]:
+    """Split text into ~4-character pieces (about one token each)."""
+    return [text[i:i + 4] for i in range(0, len(text), 4)] or [""]
+
+
+# ---- HTTP handler ----
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+    server: "_Server"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, route: str) -> None:
+        with self.server.lock:
+            self.server.counts[route] = self.server.counts.get(route, 0) + 1
+
+    # ---- stubs ----
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        config = self.server.config
+        if url.path == "/_stats":
+            with self.server.lock:
+                return self._send_json(200, dict(self.server.counts))
+        if url.path == "/v1/forecast":
+            route = "open_meteo"
+        elif url.path.startswith("/api/rest_v1/page/summary/"):
+            route = "wikipedia"
+        elif url.path == "/api/v1/search":
+            route = "hn"
+        else:
+            return self._send_json(404, {"error": "not found"})
+        self._count(route)
+        rng = config.request_rng(self.path)
+        time.sleep(config.delay(config.tool_latency_ms, rng))
+        if rng.random() < config.tool_error_rate:
+            return self._send_json(500, {"error": "injected failure"})
+        if route == "open_meteo":
+            self._forecast(query)
+        elif route == "wikipedia":
+            self._wiki(unquote(url.path.rsplit("/", 1)[1]))
+        else:
+            self._search(query)
+
+    def _forecast(self, query: Dict[str, str]) -> None:
+        lats = [float(x) for x in query.get("latitude", "0").split(",")]
+        lons = [float(x) for x in query.get("longitude", "0").split(",")]
+        hours = int(query.get("forecast_hours", 24))
+        items = []
+        for lat, lon in zip(lats, lons):
+            base = round(15 + (lat % 10) - (lon % 5), 1)
+            items.append({
+                "latitude": lat,
+                "longitude": lon,
+                "timezone": "GMT",
+                "current_weather": {"temperature": base, "windspeed": 8.5, "weathercode": 3, "time": "2024-01-01T12:00"},
+                "hourly": {
+                    "time": [f"2024-01-01T{h % 24:02d}:00" for h in range(hours)],
+                    "temperature_2m": [round(base + math.sin(h / 4), 1) for h in range(hours)],
+                },
+            })
+        self._send_json(200, items if len(items) > 1 else items[0])
+
+    def _wiki(self, title: str) -> None:
+        if title.lower().startswith("missing"):
+            return self._send_json(404, {"type": "not_found", "title": title})
+        etag = '"' + hashlib.md5(title.encode("utf-8")).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send_json(304, None, {"ETag": etag})
+        extract = f"{title.replace('_', ' ')} is a topic. " + _words(120, random.Random(title))
+        self._send_json(200, {
+            "title": title.replace("_", " "),
+            "extract": extract,
+            "content_urls": {"desktop": {"page": f"https://en.wikipedia.org/wiki/{title}"}},
+        }, {"ETag": etag})
+
+    def _search(self, query: Dict[str, str]) -> None:
+        n = int(query.get("hitsPerPage", 20))
+        q = query.get("query", "")
+        hits = [{
+            "objectID": str(i),
+            "title": f"{q.title()} story {i}: " + _words(8, random.Random(q + str(i))),
+            "url": f"https://example.com/{i}",
+            "points": 500 - i * 7,
+            "author": f"user{i}",
+            "num_comments": 40 - i,
+        } for i in range(n)]
+        self._send_json(200, {"hits": hits, "nbHits": n, "query": q})
+
+    # ---- chat completions ----
+    def do_POST(self) -> None:
+        if urlparse(self.path).path.rstrip("/") != "/v1/chat/completions":
+            return self._send_json(404, {"error": {"message": "not found"}})
+        raw = self.rfile.read(int(self.headers.get("content-length", 0)))
+        body = json.loads(raw or b"{}")
+        self._count("chat_completions")
+        config = self.server.config
+        rng = config.request_rng(self.path + "\0" + hashlib.sha256(raw).hexdigest())
+        if rng.random() < config.error_rate:
+            status = config.error_status
+            headers = {"retry-after": "0.2"} if status == 429 else {}
+            message = "Rate limit reached (injected)" if status == 429 else "Server error (injected)"
+            return self._send_json(status, {"error": {"message": message, "type": "fake_error"}}, headers)
+
+        content, calls = _plan(body, config, rng)
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        tool_calls = [{
+            "id": "call_" + "%012x" % rng.getrandbits(48),
+            "type": "function",
+            "function": {"name": c["name"], "arguments": json.dumps(c.get("arguments", {}))},
+        } for c in (calls or [])]
+        pieces = _tokens(content) if content is not None else _tokens("".join(t["function"]["arguments"] for t in tool_calls))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                 "total_tokens": prompt_tokens + len(pieces)}
+        finish = "tool_calls" if tool_calls else "stop"
+        time.sleep(config.delay(config.latency_ms, rng))  # time to first token
+        if body.get("stream"):
+            self._stream(body, content, tool_calls, finish, usage)
+            return
+        time.sleep(len(pieces) / config.tokens_per_sec)
+        message: Dict[str, Any] = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        self._send_json(200, {
+            "id": "chatcmpl-" + uuid.uuid4().hex[:12],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+            "usage": usage,
+        })
+
+    def _stream(self, body, content, tool_calls, finish, usage) -> None:
+        config = self.server.config
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        ident, created, model = "chatcmpl-" + uuid.uuid4().hex[:12], int(time.time()), body.get("model", "fake")
+
+        def send(delta: Dict[str, Any], finish_reason: Optional[str] = None, extra: Optional[Dict] = None) -> None:
+            chunk = {"id": ident, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **(extra or {})}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        step = config.chunk_tokens
+        pause = step / config.tokens_per_sec
+        try:
+            send({"role": "assistant", "content": "" if content is not None else None})
+            if content is not None:
+                pieces = _tokens(content)
+                for i in range(0, len(pieces), step):
+                    send({"content": "".join(pieces[i:i + step])})
+                    time.sleep(pause)
+            for index, call in enumerate(tool_calls):
+                send({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                      "function": {"name": call["function"]["name"], "arguments": ""}}]})
+                pieces = _tokens(call["function"]["arguments"])
+                for i in range(0, len(pieces), step):
+                    send({"tool_calls": [{"index": index, "function": {"arguments": "".join(pieces[i:i + step])}}]})
+                    time.sleep(pause)
+            send({}, finish)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk = {"id": ident, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client closed the stream early (e.g. a validator aborted it)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: FakeConfig) -> None:
+        super().__init__(address, _Handler)
+        self.config = config
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+
+class FakeServices:
+    """A running fake server (see start())."""
+
+    def __init__(self, server: _Server) -> None:
+        self._server = server
+        host, port = server.server_address[:2]
+        self.url = f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point the OpenAI SDK and the tools here."""
+        return {
+            "OPENAI_BASE_URL": self.url + "/v1",
+            "OPENAI_API_KEY": "fake",
+            "OPEN_METEO_BASE_URL": self.url,
+            "WIKIPEDIA_BASE_URL": self.url,
+            "HN_BASE_URL": self.url,
+        }
+
+    def counts(self) -> Dict[str, int]:
+        with self._server.lock:
+            return dict(self._server.counts)
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start(config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 0) -> FakeServices:
+    """Start the fake services in a background thread (port 0 = any free port)."""
+    server = _Server((host, port), config or FakeConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return FakeServices(server)
+
+
+# ---- command line ----
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    d = FakeConfig()
+    parser.add_argument("--latency-ms", type=float, default=d.latency_ms, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=d.latency_sigma, help="lognormal spread of latencies")
+    parser.add_argument("--tokens-per-sec", type=float, default=d.tokens_per_sec)
+    parser.add_argument("--chunk-tokens", type=int, default=d.chunk_tokens, help="tokens per streamed chunk")
+    parser.add_argument("--completion-tokens", type=int, default=d.completion_tokens, help="length of plain answers")
+    parser.add_argument("--max-tool-calls", type=int, default=d.max_tool_calls)
+    parser.add_argument("--error-rate", type=float, default=d.error_rate, help="fraction of chat requests that fail")
+    parser.add_argument("--error-status", type=int, default=d.error_status)
+    parser.add_argument("--tool-latency-ms", type=float, default=d.tool_latency_ms, help="median latency of the API stubs")
+    parser.add_argument("--tool-error-rate", type=float, default=d.tool_error_rate)
+    parser.add_argument("--script", help="JSON file with scripted answers")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible latencies/errors")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    script = None
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+    return FakeConfig(
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, tokens_per_sec=args.tokens_per_sec,
+        chunk_tokens=args.chunk_tokens, completion_tokens=args.completion_tokens,
+        max_tool_calls=args.max_tool_calls, error_rate=args.error_rate, error_status=args.error_status,
+        tool_latency_ms=args.tool_latency_ms, tool_error_rate=args.tool_error_rate,
+        script=script, seed=args.seed,
+    )
+
+
+def config_argv(args: argparse.Namespace) -> List[str]:
+    """The command-line flags for the settings in `args` (to start a server process)."""
+    argv = []
+    for name in ("latency_ms", "latency_sigma", "tokens_per_sec", "chunk_tokens", "completion_tokens",
+                 "max_tool_calls", "error_rate", "error_status", "tool_latency_ms", "tool_error_rate",
+                 "script", "seed"):
+        value = getattr(args, name, None)
+        if value is not None:
+            argv += ["--" + name.replace("_", "-"), str(value)]
+    return argv
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI / Open-Meteo / Wikipedia / HN stand-ins.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788, help="0 = any free port")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    services = start(config_from_args(args), args.host, args.port)
+    # First line: the address (bench.py reads it); then shell exports for humans
+    print("READY", services.url, flush=True)
+    print("export " + " ".join(f"{k}={v}" for k, v in services.env().items()), file=sys.stderr, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        services.close()
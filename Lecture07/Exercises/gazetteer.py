@@ -0,0 +1,406 @@
+# Lesson 7 – Helper: Offline Gazetteer (place name -> coordinates)
+#
+# GOAL
+# - get_weather needs lat/lon. Letting the model guess coordinates for
+#   "Portland" or "Springfield" is a coin toss, and every wrong guess costs
+#   another turn. A local gazetteer answers "Springfield, IL" -> 39.80,-89.64
+#   without a model guess or a network call.
+#
+# THE INDEX (one binary file, memory-mapped, built once)
+# - places   fixed-size records (lat, lon, population, country, admin1, name),
+#            stored in KD-TREE ORDER: the record in the middle of any range is
+#            that subtree's root, so the tree needs no pointers at all
+# - xyz      each place as a unit vector (float32 x3) for the nearest-neighbour
+#            search; straight-line distance between unit vectors grows with
+#            the great-circle distance, and there is no trouble at +-180 degrees
+# - names    a SORTED table of normalized names ("sao paulo", "muenchen", ...)
+#            -> place; exact and prefix lookups are binary searches
+# - Opening it is an mmap (milliseconds); a lookup touches a few pages
+#   (microseconds). Nothing is parsed into Python objects up front.
+#
+# LOOKUPS
+# - lookup("Portland, ME")  exact name, else prefix ("San Fr"), else fuzzy
+#   (edit distance <= 2 among names with the same first two letters,
+#   "Sao Paolo"); ", XX" narrows by country or state
+#   (code or name); ties go to the most populous place.
+#   A qualifier is never ignored: when it is not a known state, province or
+#   country (name or 2-3 letter code), or no candidate is in it, the lookup
+#   returns "none". "London, Ontario" must not turn into London, GB, because
+#   get_weather would then report another city's weather without a word.
+# - nearest(lat, lon, k)    reverse lookup with the KD-tree.
+#
+# DATA
+# - Default: gazetteer_cities.tsv (next to this file, ~270 large cities):
+#     name <TAB> alternate names (comma-separated) <TAB> country <TAB> admin1 <TAB> lat <TAB> lon <TAB> population
+# - GAZETTEER_FILE can point to a bigger file in the same format, or to a
+#   GeoNames dump (https://download.geonames.org/export/dump/cities15000.zip,
+#   ~30k places), which is detected by its 19 columns.
+# - The index is written to CACHE_DIR (default ~/.cache/practical_ai) and
+#   rebuilt when the source file is newer.
+#
+# USAGE
+#   import gazetteer
+#   gazetteer.resolve("Springfield, IL")   # -> {"name": ..., "lat": ..., "lon": ..., ...} or None
+#   gazetteer.default().nearest(47.6, -122.3)
+#   python gazetteer.py "Portland, ME" "Sao Paolo"     # try it (--build to rebuild)
+
+import os, sys, math, mmap, time, struct, threading, unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SOURCE = Path(os.getenv("GAZETTEER_FILE", Path(__file__).with_name("gazetteer_cities.tsv")))
+CACHE_DIR = Path(os.getenv("CACHE_DIR", Path.home() / ".cache" / "practical_ai"))
+
+MAGIC = b"GAZ1"
+# magic, places, names, then the offsets of: places, xyz, names, name bytes, display names
+HEADER = struct.Struct("<4sII5I")
+# lat, lon, population, display-name offset, display-name length, country, admin1
+PLACE = struct.Struct("<ffIIH2s6s")
+XYZ = struct.Struct("<fff")
+# name-bytes offset, length, place number
+NAME = struct.Struct("<IHI")
+MAX_ALTERNATES = 8  # GeoNames lists dozens of spellings per city; keep the index small
+EARTH_RADIUS_KM = 6371.0
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD", "massachusetts": "MA",
+    "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO", "montana": "MT",
+    "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM",
+    "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
+    "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "district of columbia": "DC",
+}
+# Provinces and states elsewhere, as the default data file codes them
+REGIONS = {
+    "alberta": "AB", "british columbia": "BC", "manitoba": "MB", "new brunswick": "NB",
+    "newfoundland": "NL", "nova scotia": "NS", "ontario": "ON", "prince edward island": "PE",
+    "quebec": "QC", "saskatchewan": "SK",
+    "new south wales": "NSW", "victoria": "VIC", "queensland": "QLD", "south australia": "SA",
+    "western australia": "WA", "tasmania": "TAS", "northern territory": "NT",
+    "australian capital territory": "ACT",
+}
+COUNTRIES = {
+    "usa": "US", "united states": "US", "america": "US", "canada": "CA", "mexico": "MX",
+    "brazil": "BR", "argentina": "AR", "chile": "CL", "colombia": "CO", "peru": "PE",
+    "uk": "GB", "united kingdom": "GB", "britain": "GB", "great britain": "GB", "england": "GB",
+    "scotland": "GB", "wales": "GB", "ireland": "IE", "france": "FR", "germany": "DE",
+    "netherlands": "NL", "holland": "NL", "belgium": "BE", "switzerland": "CH", "austria": "AT",
+    "spain": "ES", "portugal": "PT", "italy": "IT", "greece": "GR", "denmark": "DK",
+    "norway": "NO", "sweden": "SE", "finland": "FI", "iceland": "IS", "poland": "PL",
+    "czechia": "CZ", "czech republic": "CZ", "hungary": "HU", "romania": "RO", "bulgaria": "BG",
+    "serbia": "RS", "croatia": "HR", "ukraine": "UA", "russia": "RU", "turkey": "TR",
+    "israel": "IL", "egypt": "EG", "morocco": "MA", "nigeria": "NG", "kenya": "KE",
+    "south africa": "ZA", "japan": "JP", "south korea": "KR", "korea": "KR", "china": "CN",
+    "taiwan": "TW", "india": "IN", "pakistan": "PK", "thailand": "TH", "vietnam": "VN",
+    "indonesia": "ID", "philippines": "PH", "malaysia": "MY", "australia": "AU",
+    "new zealand": "NZ", "uae": "AE", "united arab emirates": "AE", "saudi arabia": "SA",
+}
+
+
+def normalize(text: str) -> str:
+    """'São Paulo' -> 'sao paulo', 'St. Louis' -> 'st louis' (the form names are indexed under)."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = "".join(c if c.isalnum() else " " for c in text)
+    return " ".join(text.split())
+
+
+def qualifier_code(qualifier: str) -> Optional[str]:
+    """'Illinois' -> 'IL', 'france' -> 'FR', 'me' -> 'ME'; None when it is not recognised."""
+    key = normalize(qualifier)
+    code = US_STATES.get(key) or REGIONS.get(key) or COUNTRIES.get(key)
+    if code:
+        return code
+    compact = key.replace(" ", "")  # "D.C." -> "d c" -> "DC"
+    if 2 <= len(compact) <= 3 and compact.isalpha():
+        return compact.upper()
+    return None
+
+
+def _xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    la, lo = math.radians(lat), math.radians(lon)
+    return (math.cos(la) * math.cos(lo), math.cos(la) * math.sin(lo), math.sin(la))
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+# ---- building the index ----
+def _read_source(path: Path) -> List[Tuple[str, List[str], str, str, float, float, int]]:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            c = line.rstrip("\n").split("\t")
+            if len(c) >= 19:  # GeoNames: name, asciiname, alternatenames, lat, lon, ..., country, ..., admin1, ..., population
+                alts = [c[2]] + c[3].split(",")
+                rows.append((c[1], alts, c[8], c[10], float(c[4]), float(c[5]), int(c[14] or 0)))
+            else:
+                alts = [a for a in c[1].split(",") if a]
+                rows.append((c[0], alts, c[2], c[3], float(c[4]), float(c[5]), int(c[6] or 0)))
+    return rows
+
+
+def _kd_order(points: List[Tuple[float, float, float]]) -> List[int]:
+    """Permutation that stores a balanced KD-tree implicitly (root of [lo, hi) at (lo + hi) // 2)."""
+    order = [0] * len(points)
+    stack = [(0, list(range(len(points))), 0)]
+    while stack:
+        lo, items, depth = stack.pop()
+        if not items:
+            continue
+        axis = depth % 3
+        items.sort(key=lambda i: points[i][axis])
+        mid = len(items) // 2
+        order[lo + mid] = items[mid]
+        stack.append((lo, items[:mid], depth + 1))
+        stack.append((lo + mid + 1, items[mid + 1:], depth + 1))
+    return order
+
+
+def build(source: Path = SOURCE, target: Optional[Path] = None) -> Path:
+    """Compile a source file into the binary index; returns its path."""
+    target = target or CACHE_DIR / f"gazetteer-{source.stem}.idx"
+    rows = _read_source(source)
+    points = [_xyz(r[4], r[5]) for r in rows]
+    order = _kd_order(points)
+
+    places, xyz, display = bytearray(), bytearray(), bytearray()
+    names: List[Tuple[bytes, int, int]] = []  # (normalized name, -population, place number)
+    for number, i in enumerate(order):
+        name, alts, country, admin1, lat, lon, population = rows[i]
+        label = name.encode("utf-8")[:65535]
+        places += PLACE.pack(lat, lon, population, len(display), len(label),
+                             country.encode("ascii", "ignore")[:2], admin1.encode("ascii", "ignore")[:6])
+        display += label
+        xyz += XYZ.pack(*points[i])
+        keys = {normalize(name)}
+        for alt in alts:
+            if len(keys) > MAX_ALTERNATES:
+                break
+            key = normalize(alt)
+            if key and key.isascii() and len(key) <= 40:
+                keys.add(key)
+        names.extend((k.encode("utf-8"), -population, number) for k in keys if k)
+    names.sort()
+
+    table, blob = bytearray(), bytearray()
+    for key, _, number in names:
+        table += NAME.pack(len(blob), len(key), number)
+        blob += key
+
+    offsets, pos = [], HEADER.size
+    for section in (places, xyz, table, blob, display):
+        offsets.append(pos)
+        pos += len(section)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(order), len(names), *offsets))
+        for section in (places, xyz, table, blob, display):
+            f.write(section)
+    os.replace(tmp, target)  # readers never see a half-written index
+    return target
+
+
+# ---- reading it ----
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (limit + 1) once it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class Gazetteer:
+    """A memory-mapped gazetteer index (see build())."""
+
+    def __init__(self, path: os.PathLike) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.size, self.name_count, self._places, self._xyz, self._names,
+         self._blob, self._display) = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a gazetteer index")
+
+    def __len__(self) -> int:
+        return self.size
+
+    def place(self, number: int) -> Dict[str, Any]:
+        lat, lon, population, off, length, country, admin1 = PLACE.unpack_from(self._mm, self._places + number * PLACE.size)
+        return {
+            "name": self._mm[self._display + off:self._display + off + length].decode("utf-8"),
+            "admin1": admin1.rstrip(b"\0").decode("ascii"),
+            "country": country.rstrip(b"\0").decode("ascii"),
+            "lat": round(lat, 4),
+            "lon": round(lon, 4),
+            "population": population,
+        }
+
+    # -- the sorted name table --
+    def _name(self, i: int) -> Tuple[bytes, int]:
+        off, length, number = NAME.unpack_from(self._mm, self._names + i * NAME.size)
+        return self._mm[self._blob + off:self._blob + off + length], number
+
+    def _bisect(self, key: bytes) -> int:
+        """First name-table position whose name is >= key."""
+        lo, hi = 0, self.name_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _exact(self, key: str) -> List[int]:
+        want, found = key.encode("utf-8"), []
+        i = self._bisect(want)
+        while i < self.name_count:
+            name, number = self._name(i)
+            if name != want:
+                break
+            found.append(number)  # equal names are sorted most populous first
+            i += 1
+        return found
+
+    def _prefix(self, key: str, scan: int = 200) -> List[int]:
+        want = key.encode("utf-8")
+        i, found = self._bisect(want), []
+        while i < self.name_count and len(found) < scan:
+            name, number = self._name(i)
+            if not name.startswith(want):
+                break
+            found.append(number)
+            i += 1
+        return found
+
+    def _fuzzy(self, key: str) -> List[int]:
+        # Only names that start with the same two letters (typos rarely hit
+        # those) and have a length within the limit, checked before decoding
+        limit = 1 if len(key) <= 5 else 2
+        first = key[:2].encode("utf-8")
+        size = len(key.encode("utf-8"))
+        i, best = self._bisect(first), []
+        unpack, names, blob, mm = NAME.unpack_from, self._names, self._blob, self._mm
+        while i < self.name_count:
+            off, length, number = unpack(mm, names + i * NAME.size)
+            i += 1
+            if abs(length - size) > limit:
+                continue
+            name = mm[blob + off:blob + off + length]
+            if not name.startswith(first):
+                break
+            d = _edit_distance(key, name.decode("utf-8"), limit)
+            if d <= limit:
+                best.append((d, number))
+        best.sort(key=lambda dn: dn[0])
+        return [number for d, number in best if d == best[0][0]] if best else []
+
+    def lookup(self, query: str, limit: int = 5) -> Tuple[str, List[Dict[str, Any]]]:
+        """-> (how it matched: "exact" | "prefix" | "fuzzy" | "none", best places first)."""
+        name, *qualifiers = query.split(",")
+        key = normalize(name)
+        codes = [qualifier_code(q) for q in qualifiers if normalize(q)]
+        if not key or None in codes:
+            return "none", []
+        how, numbers = "exact", self._exact(key)
+        if not numbers and len(key) >= 3:
+            how, numbers = "prefix", self._prefix(key)
+        if not numbers and len(key) >= 4:
+            how, numbers = "fuzzy", self._fuzzy(key)
+        places = [self.place(n) for n in dict.fromkeys(numbers)]
+        # "Springfield, IL, USA": every qualifier must fit
+        places = [p for p in places if all(c in (p["country"], p["admin1"]) for c in codes)]
+        places.sort(key=lambda p: -p["population"])
+        return (how if places else "none"), places[:limit]
+
+    # -- the KD-tree --
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Dict[str, Any]]:
+        """The k places closest to (lat, lon), nearest first, with distance_km."""
+        target = _xyz(lat, lon)
+        best: List[Tuple[float, int]] = []  # (squared chord, place), sorted, at most k
+
+        def visit(lo: int, hi: int, depth: int) -> None:
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            p = XYZ.unpack_from(self._mm, self._xyz + mid * XYZ.size)
+            d2 = (p[0] - target[0]) ** 2 + (p[1] - target[1]) ** 2 + (p[2] - target[2]) ** 2
+            if len(best) < k or d2 < best[-1][0]:
+                best.append((d2, mid))
+                best.sort()
+                del best[k:]
+            diff = target[depth % 3] - p[depth % 3]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            visit(near[0], near[1], depth + 1)
+            # The other side can only help if the splitting plane is closer than the k-th best
+            if len(best) < k or diff * diff < best[-1][0]:
+                visit(far[0], far[1], depth + 1)
+
+        visit(0, self.size, 0)
+        return [dict(self.place(n), distance_km=round(_chord_to_km(math.sqrt(d2)), 1)) for d2, n in best]
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def label(place: Dict[str, Any]) -> str:
+    """'Portland, ME, US'"""
+    return ", ".join(part for part in (place["name"], place["admin1"], place["country"]) if part)
+
+
+_default: Optional[Gazetteer] = None
+_lock = threading.Lock()
+
+
+def default() -> Gazetteer:
+    """The shared index for SOURCE, (re)built first if it is missing or older than the source."""
+    global _default
+    if _default is None:
+        with _lock:
+            if _default is None:
+                path = CACHE_DIR / f"gazetteer-{SOURCE.stem}.idx"
+                if not path.exists() or path.stat().st_mtime < SOURCE.stat().st_mtime:
+                    build(SOURCE, path)
+                _default = Gazetteer(path)
+    return _default
+
+
+def resolve(query: str) -> Optional[Dict[str, Any]]:
+    """The best match for a place name, or None."""
+    _, places = default().lookup(query, limit=1)
+    return places[0] if places else None
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--build"]:
+        args = args[1:]
+        started = time.perf_counter()
+        path = build()
+        print(f"built {path} in {(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+    started = time.perf_counter()
+    g = default()
+    print(f"{len(g)} places, {g.name_count} names, opened in {(time.perf_counter() - started) * 1000:.2f} ms",
+          file=sys.stderr)
+    for query in args or ["Springfield, IL", "San Fran", "Pittsburg", "Muenchen", "London, Ontario"]:
+        started = time.perf_counter()
+        how, places = g.lookup(query, limit=3)
+        took = (time.perf_counter() - started) * 1e6
+        print(f"{query!r}: {how} in {took:.0f} µs ->", "; ".join(f"{label(p)} ({p['lat']}, {p['lon']})" for p in places))
@@ -0,0 +1,77 @@
+# Lesson 7 – Shared Tool: search_hn (HN Search API by Algolia, no API key)
+#
+# Used by 03_news_tool_hn.py.
+# Register it in a script with:
+#   registry.lazy("hn_tool", "search_hn")
+#
+# CACHING UNDER LOAD
+# - Queries are normalized ("AI in Education " == "ai in education").
+# - We always fetch at least HN_MIN_FETCH hits (default 10), so a request for
+#   5 hits and one for 8 hits can share the same upstream result.
+# - Concurrent callers with the same (query, fetch size) share ONE in-flight
+#   request (single-flight, see tool_cache.py).
+# - Results are cached for HN_CACHE_TTL seconds (default 120); a request for
+#   fewer hits is served by slicing a cached larger result.
+# - hn_cache.stats() / hn_flight.stats() show how many requests were saved.
+#
+# PROJECTION
+# - Only ATTRIBUTES are requested from Algolia (attributesToRetrieve), instead
+#   of full hit objects of which we would keep four fields.
+
+import os
+import http_pool
+from typing import Annotated
+from tool_registry import tool
+from tool_cache import SingleFlight, TTLCache
+
+# HN_BASE_URL points the tool at another server, e.g. fake_services.py
+SEARCH_URL = os.getenv("HN_BASE_URL", "https://hn.algolia.com").rstrip("/") + "/api/v1/search"
+MIN_FETCH = int(os.getenv("HN_MIN_FETCH", "10"))
+# Projection: the fields this tool returns
+ATTRIBUTES = ["title", "url", "points", "author"]
+
+hn_cache = TTLCache(maxsize=int(os.getenv("HN_CACHE_SIZE", "256")), ttl=float(os.getenv("HN_CACHE_TTL", "120")))
+hn_flight = SingleFlight()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _fetch(query: str, hits: int) -> list:
+    params = {
+        "query": query,
+        "tags": "story",
+        "hitsPerPage": hits,
+        "attributesToRetrieve": ",".join(ATTRIBUTES),
+    }
+    r = http_pool.get(SEARCH_URL, params=params)
+    r.raise_for_status()
+    data = http_pool.read_json(r)
+    return [{a: h.get(a) for a in ATTRIBUTES} for h in data.get("hits", [])]
+
+
+def _fetch_and_cache(query: str, hits: int) -> list:
+    results = _fetch(query, hits)
+    cached = hn_cache.peek(query)
+    # Never replace a larger cached result set with a smaller one
+    if cached is None or hits >= cached[0] or not hn_cache.is_fresh(query):
+        hn_cache.set(query, (hits, results))
+    return results
+
+
+@tool
+def search_hn(query: str, hits: Annotated[int, {"minimum": 1, "maximum": 30}] = 5) -> list:
+    """Search Hacker News for recent stories.
+
+    Args:
+        query: Search terms
+        hits: Number of stories to return
+    """
+    q = normalize_query(query)
+    cached = hn_cache.get(q)
+    if cached is not None and cached[0] >= hits:
+        return cached[1][:hits]
+    fetch_n = max(hits, MIN_FETCH)
+    results = hn_flight.do((q, fetch_n), lambda: _fetch_and_cache(q, fetch_n))
+    return results[:hits]
@@ -0,0 +1,353 @@
+# Lesson 7 – Helper: Pooled HTTP Sessions for Tools
+#
+# GOAL
+# - requests.get(...) opens a brand-new TCP+TLS connection on every call.
+#   When the assistant answers many questions in a row, those handshakes to
+#   api.open-meteo.com, en.wikipedia.org and hn.algolia.com add up.
+# - One shared requests.Session keeps connections alive and reuses them.
+#
+# WHAT IT PROVIDES
+# - A per-host connection pool (keep-alive) with configurable pool sizes,
+#   a default timeout and a retry policy for idempotent GETs (429/5xx and
+#   timeouts, exponential backoff with jitter).
+# - ADAPTIVE TIMEOUTS: the latencies of the last requests to each host are
+#   kept; once there are enough of them the timeout is HTTP_TIMEOUT_FACTOR x
+#   that host's p99 (between HTTP_TIMEOUT_MIN and HTTP_TIMEOUT), so a stuck
+#   request is abandoned and retried after ~1s instead of 15s.
+# - The latencies are kept in a sorted window, so a percentile is a list
+#   index, not a sort on every request.
+# - The CLI makes only a few requests per process, far fewer than the
+#   MIN_SAMPLES (20) a percentile needs. So the latencies are saved in
+#   CACHE_DIR (sqlite_cache.py, table http_latency) when the process exits
+#   and loaded the next time a host is used: after a few runs the CLI
+#   starts with adaptive timeouts and hedging too. Saved latencies expire
+#   after HTTP_LATENCY_TTL seconds; HTTP_LATENCY_PERSIST=0 keeps them in
+#   memory only (then a short-lived process always uses HTTP_TIMEOUT).
+# - HEDGED REQUESTS: if a GET has not answered after the host's p95, the same
+#   GET is sent a second time and whichever response arrives first is used.
+#   Each request to a host earns HTTP_HEDGE_BUDGET of a hedge (5% -> at most
+#   about 1 hedge per 20 requests), so hedging cannot multiply the load.
+# - get(...) for normal code, aget(...) for asyncio code (runs the same
+#   pooled request in a worker thread).
+# - stats() -> {host: {"requests", "connections", "reused"}} so you can check
+#   that connections are actually being reused.
+# - latency_stats() -> {host: {"p50_ms", "p95_ms", "p99_ms", "timeout_s",
+#   "hedges", "hedge_wins", "timeouts", ...}}
+# - read_json(response) parses the body with orjson when it is installed
+#   (pip install orjson) and falls back to the standard json module.
+#
+# CONFIGURATION (environment variables or configure(...))
+#   HTTP_POOL_HOSTS    number of hosts to keep pools for   (default 10)
+#   HTTP_POOL_MAXSIZE  connections kept per host           (default 10)
+#   HTTP_TIMEOUT       default (and longest) timeout, s    (default 15)
+#   HTTP_TIMEOUT_MIN   shortest adaptive timeout, s        (default 1)
+#   HTTP_TIMEOUT_FACTOR adaptive timeout = factor x p99    (default 3)
+#   HTTP_RETRIES       retries for failed GETs             (default 2)
+#   HTTP_BACKOFF       backoff factor between retries      (default 0.3)
+#   HTTP_HEDGE_BUDGET  hedges per request, 0 disables      (default 0.05)
+#   HTTP_LATENCY_PERSIST  save latencies across runs, 0/1  (default 1)
+#   HTTP_LATENCY_TTL   seconds saved latencies are used    (default 86400)
+#
+# USAGE
+#   import http_pool
+#   r = http_pool.get("https://api.open-meteo.com/v1/forecast", params={...})
+#   print(http_pool.stats())
+
+import os, time, atexit, asyncio, threading
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+import tracing
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlite_cache import SQLiteCache
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # optional speed-up
+    import json
+    _loads = json.loads
+
+
+# Percentiles (and so adaptive timeouts and hedging) need this many samples
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+LATENCY_TTL = float(os.getenv("HTTP_LATENCY_TTL", "86400"))
+
+
+class HostLatency:
+    """Recent latencies of one host (in arrival order and sorted), plus its hedge budget and counters."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, seed: Iterable[float] = ()) -> None:
+        self.window = window
+        self.samples: Deque[float] = deque()
+        self._sorted: List[float] = []
+        self.seeded = 0
+        self.added = 0  # samples measured by this process
+        self.hedge_credit = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.lock = threading.Lock()
+        for seconds in seed:
+            self.add(seconds)
+        self.seeded, self.added = len(self.samples), 0
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            if len(self.samples) >= self.window:
+                oldest = self.samples.popleft()
+                del self._sorted[bisect_left(self._sorted, oldest)]
+            self.samples.append(seconds)
+            insort(self._sorted, seconds)
+            self.added += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q in [0, 1]; None until there are MIN_SAMPLES samples."""
+        with self.lock:
+            n = len(self._sorted)
+            if n < MIN_SAMPLES:
+                return None
+            return self._sorted[min(n - 1, int(q * n))]
+
+    def earn_hedge(self, amount: float) -> None:
+        with self.lock:
+            self.hedge_credit = min(2.0, self.hedge_credit + amount)  # small burst at most
+
+    def spend_hedge(self) -> bool:
+        with self.lock:
+            if self.hedge_credit < 1:
+                return False
+            self.hedge_credit -= 1
+            self.hedges += 1
+            return True
+
+
+class HttpPool:
+    """A keep-alive requests.Session with per-host pools, timeouts and retries."""
+
+    def __init__(
+        self,
+        pool_connections: int = int(os.getenv("HTTP_POOL_HOSTS", "10")),
+        pool_maxsize: int = int(os.getenv("HTTP_POOL_MAXSIZE", "10")),
+        timeout: float = float(os.getenv("HTTP_TIMEOUT", "15")),
+        retries: int = int(os.getenv("HTTP_RETRIES", "2")),
+        backoff_factor: float = float(os.getenv("HTTP_BACKOFF", "0.3")),
+        min_timeout: float = float(os.getenv("HTTP_TIMEOUT_MIN", "1")),
+        timeout_factor: float = float(os.getenv("HTTP_TIMEOUT_FACTOR", "3")),
+        hedge_budget: float = float(os.getenv("HTTP_HEDGE_BUDGET", "0.05")),
+        persist: bool = os.getenv("HTTP_LATENCY_PERSIST", "1") != "0",
+    ) -> None:
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self.hedge_budget = hedge_budget
+        retry_kwargs = dict(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # hand the last response back to the caller
+        )
+        try:
+            # Jitter keeps clients that failed together from retrying in lockstep
+            retry = Retry(backoff_jitter=backoff_factor, **retry_kwargs)
+        except TypeError:  # urllib3 < 2 has no jitter
+            retry = Retry(**retry_kwargs)
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._hosts: Dict[str, HostLatency] = {}
+        self._hosts_lock = threading.Lock()
+        self._store: Optional[SQLiteCache] = SQLiteCache("http_latency") if persist else None
+        # Hedged GETs run here; the caller waits for whichever finishes first
+        self._hedge_pool = ThreadPoolExecutor(max_workers=2 * pool_maxsize, thread_name_prefix="http-hedge")
+
+    def host(self, netloc: str) -> HostLatency:
+        with self._hosts_lock:
+            if netloc not in self._hosts:
+                seed = None
+                if self._store is not None:
+                    seed, _, fresh = self._store.get(netloc)
+                    seed = seed if fresh else None
+                self._hosts[netloc] = HostLatency(seed=seed or ())
+            return self._hosts[netloc]
+
+    def save_latencies(self) -> None:
+        """Store each host's latency window for the next process."""
+        if self._store is None:
+            return
+        with self._hosts_lock:
+            hosts = dict(self._hosts)
+        for netloc, latency in hosts.items():
+            with latency.lock:
+                if not latency.added:
+                    continue  # nothing new since it was loaded
+                samples = [round(t, 4) for t in latency.samples]
+            self._store.set(netloc, samples, ttl=LATENCY_TTL)
+
+    def timeout_for(self, latency: HostLatency) -> float:
+        """timeout_factor x p99, within [min_timeout, timeout]; the default until there is data."""
+        p99 = latency.percentile(0.99)
+        if p99 is None:
+            return self.timeout
+        return max(self.min_timeout, min(self.timeout, self.timeout_factor * p99))
+
+    def _attempt(self, latency: HostLatency, url: str, kwargs: Dict[str, Any]) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            r = self.session.get(url, **kwargs)
+        except requests.Timeout:
+            with latency.lock:
+                latency.timeouts += 1
+            raise
+        retries = getattr(r.raw, "retries", None)
+        if r.status_code < 500 and not (retries is not None and retries.history):
+            latency.add(time.perf_counter() - start)  # retried requests would skew the percentiles
+        return r
+
+    def _hedged(self, latency: HostLatency, url: str, kwargs: Dict[str, Any], after: float, span) -> requests.Response:
+        first = self._hedge_pool.submit(self._attempt, latency, url, kwargs)
+        done, _ = wait([first], timeout=after)
+        if done or not latency.spend_hedge():
+            return first.result()
+        span.set("hedged", True)
+        second = self._hedge_pool.submit(self._attempt, latency, url, kwargs)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    # The slower request is left to finish; its connection returns to the pool
+                    if f is second:
+                        with latency.lock:
+                            latency.hedge_wins += 1
+                        span.set("winner", "hedge")
+                    return f.result()
+                error = error or f.exception()
+        raise error
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        netloc = urlsplit(url).netloc
+        latency = self.host(netloc)
+        kwargs.setdefault("timeout", self.timeout_for(latency))
+        latency.earn_hedge(self.hedge_budget)
+        p95 = latency.percentile(0.95) if self.hedge_budget > 0 else None
+        with tracing.span("http.get", host=netloc, timeout=kwargs["timeout"]) as span:
+            if p95 is None:
+                r = self._attempt(latency, url, kwargs)
+            else:
+                r = self._hedged(latency, url, kwargs, p95, span)
+            span.set("status", r.status_code)
+            span.set("bytes", len(r.content))
+            retries = getattr(r.raw, "retries", None)
+            if retries is not None and retries.history:
+                span.set("retries", len(retries.history))
+            return r
+
+    async def aget(self, url: str, **kwargs: Any) -> requests.Response:
+        """Async-friendly get(): same pooled connections, run in a worker thread."""
+        return await asyncio.to_thread(self.get, url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Requests vs. new connections per host (reused = requests - connections)."""
+        out: Dict[str, Dict[str, int]] = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+            entry = out.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+            entry["reused"] = max(0, entry["requests"] - entry["connections"])
+        return out
+
+    def latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per host: latency percentiles, the current timeout and hedging counters."""
+        with self._hosts_lock:
+            hosts = dict(self._hosts)
+        out: Dict[str, Dict[str, Any]] = {}
+        for netloc, latency in hosts.items():
+            ms = {q: latency.percentile(q) for q in (0.5, 0.95, 0.99)}
+            out[netloc] = {
+                "samples": len(latency.samples),
+                "seeded": latency.seeded,
+                "p50_ms": None if ms[0.5] is None else round(ms[0.5] * 1000, 1),
+                "p95_ms": None if ms[0.95] is None else round(ms[0.95] * 1000, 1),
+                "p99_ms": None if ms[0.99] is None else round(ms[0.99] * 1000, 1),
+                "timeout_s": round(self.timeout_for(latency), 3),
+                "hedges": latency.hedges,
+                "hedge_wins": latency.hedge_wins,
+                "timeouts": latency.timeouts,
+            }
+        return out
+
+    def close(self) -> None:
+        self.save_latencies()
+        self._hedge_pool.shutdown(wait=False)
+        self.session.close()
+
+
+_default: Optional[HttpPool] = None
+_lock = threading.Lock()
+
+
+def pool() -> HttpPool:
+    """The process-wide pool shared by all tools (created on first use)."""
+    global _default
+    if _default is None:
+        with _lock:
+            if _default is None:
+                _default = HttpPool()
+    return _default
+
+
+@atexit.register
+def _save_on_exit() -> None:
+    if _default is not None:
+        _default.save_latencies()
+
+
+def configure(**kwargs: Any) -> HttpPool:
+    """Replace the shared pool, e.g. configure(pool_maxsize=20, retries=0)."""
+    global _default
+    with _lock:
+        if _default is not None:
+            _default.close()
+        _default = HttpPool(**kwargs)
+    return _default
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return pool().get(url, **kwargs)
+
+
+async def aget(url: str, **kwargs: Any) -> requests.Response:
+    return await pool().aget(url, **kwargs)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return pool().stats()
+
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+    return pool().latency_stats()
+
+
+def read_json(response: requests.Response) -> Any:
+    """Parse a JSON response body with the fastest decoder available."""
+    with tracing.span("json.decode", what="http body", bytes=len(response.content)):
+        return _loads(response.content)
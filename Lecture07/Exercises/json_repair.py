@@ -0,0 +1,178 @@
+# Lesson 7 – Helper: Local JSON Repair (before asking the model again)
+#
+# GOAL
+# - When the model's JSON doesn't parse or validate, 04_structured_output_validation.py
+#   used to ALWAYS send a second request ("your previous output was invalid").
+#   That doubles latency and cost, while most problems are trivial to fix in
+#   Python. repair_json() tries those fixes first; only if it fails do we need
+#   the model round-trip.
+#
+# REPAIRS (tried in this order, each only while the text still doesn't parse)
+# - "code_fence":      ```json ... ```  -> the text inside the fence
+# - "extra_prose":     "Here is the JSON: {...} Hope this helps" -> {...}
+# - "single_quotes":   {'a': 'b'} -> {"a": "b"}
+# - "trailing_commas": [1, 2,] / {"a": 1,} -> [1, 2] / {"a": 1}
+# - "numeric_strings": "12.5" where the schema wants a number -> 12.5
+# - "boolean_strings": "true" where the schema wants a boolean -> true
+# The result is then validated against the schema (schema_validation.py).
+#
+# MEASURING
+# - repair_json() returns the names of the repairs it applied.
+# - repair_stats() -> {"attempts", "repaired", "failed", <repair name>: count}
+#   "repaired" is the number of model round-trips saved.
+#
+# USAGE
+#   try:
+#       data, repairs = repair_json(raw, schema)
+#   except (json.JSONDecodeError, ValidationError):
+#       ...fall back to asking the model...
+
+import re
+import json
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from schema_validation import validate
+
+_FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_NUMBER = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+
+_stats: Counter = Counter()
+
+
+def _parses(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+# ---- text repairs ----
+def _strip_fence(text: str, schema: Dict[str, Any]) -> str:
+    m = _FENCE.search(text)
+    return m.group(1).strip() if m else text
+
+
+def _extract_value(text: str, schema: Dict[str, Any]) -> str:
+    """Cut the JSON value out of surrounding prose."""
+    openers = "[" if schema.get("type") == "array" else "{" if schema.get("type") == "object" else "{["
+    starts = [i for i in (text.find(c) for c in openers) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    return text[start:end + 1] if end > start else text
+
+
+def _single_quotes(text: str, schema: Dict[str, Any]) -> str:
+    out: List[str] = []
+    quote: Optional[str] = None
+    escape = False
+    for ch in text:
+        if quote is None:
+            if ch in "\"'":
+                quote = ch
+                ch = '"'
+        elif escape:
+            escape = False
+            if quote == "'" and ch == "'":
+                out[-1] = ""  # \' -> '
+        elif ch == "\\":
+            escape = True
+        elif ch == quote:
+            quote = None
+            ch = '"'
+        elif quote == "'" and ch == '"':
+            ch = '\\"'
+        out.append(ch)
+    return "".join(out)
+
+
+def _trailing_commas(text: str, schema: Dict[str, Any]) -> str:
+    out: List[str] = []
+    in_string = escape = False
+    pending = None  # index in `out` of a comma that may turn out to be trailing
+    for ch in text:
+        if in_string:
+            if ch == '"' and not escape:
+                in_string = False
+            escape = not escape and ch == "\\"
+        elif ch == '"':
+            in_string = True
+        elif ch in "}]" and pending is not None:
+            out[pending] = ""
+        if not ch.isspace():
+            pending = len(out) if (ch == "," and not in_string) else None
+        out.append(ch)
+    return "".join(out)
+
+
+TEXT_REPAIRS: List[Tuple[str, Callable[[str, Dict[str, Any]], str]]] = [
+    ("code_fence", _strip_fence),
+    ("extra_prose", _extract_value),
+    ("single_quotes", _single_quotes),
+    ("trailing_commas", _trailing_commas),
+]
+
+
+# ---- schema-driven repairs ----
+def _coerce(value: Any, schema: Dict[str, Any], applied: List[str]) -> Any:
+    types = schema.get("type")
+    types = types if isinstance(types, list) else [types] if types else []
+    if isinstance(value, str) and "string" not in types:
+        s = value.strip()
+        if "integer" in types and re.fullmatch(r"-?\d+", s):
+            applied.append("numeric_strings")
+            return int(s)
+        if "number" in types and _NUMBER.fullmatch(s):
+            applied.append("numeric_strings")
+            return float(s) if any(c in s for c in ".eE") else int(s)
+        if "boolean" in types and s.lower() in ("true", "false"):
+            applied.append("boolean_strings")
+            return s.lower() == "true"
+        return value
+    if isinstance(value, dict):
+        props = schema.get("properties", {})
+        extra = schema.get("additionalProperties")
+        extra = extra if isinstance(extra, dict) else {}
+        return {k: _coerce(v, props.get(k, extra), applied) for k, v in value.items()}
+    if isinstance(value, list):
+        items = schema.get("items")
+        items = items if isinstance(items, dict) else {}
+        return [_coerce(v, items, applied) for v in value]
+    return value
+
+
+# ---- public API ----
+def repair_json(text: str, schema: Dict[str, Any]) -> Tuple[Any, List[str]]:
+    """Parse `text` as JSON matching `schema`, fixing common problems locally.
+
+    Returns (data, names of the repairs applied). Raises json.JSONDecodeError or
+    jsonschema.ValidationError if the text can't be repaired.
+    """
+    _stats["attempts"] += 1
+    applied: List[str] = []
+    try:
+        text = text.strip()
+        for name, fix in TEXT_REPAIRS:
+            if _parses(text):
+                break
+            fixed = fix(text, schema)
+            if fixed != text:
+                applied.append(name)
+                text = fixed
+        data = json.loads(text)
+        data = _coerce(data, schema, applied)
+        validate(data, schema)
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    applied = list(dict.fromkeys(applied))
+    if applied:
+        _stats["repaired"] += 1
+        _stats.update(applied)
+    return data, applied
+
+
+def repair_stats() -> Dict[str, int]:
+    return {"attempts": 0, "repaired": 0, "failed": 0, **_stats}
@@ -0,0 +1,36 @@
+# Lesson 7 – Shared Tool: resolve_place (offline gazetteer, no network)
+#
+# Used by 05_cli_tools_assistant.py.
+# Register it in a script with:
+#   registry.lazy("place_tool", "resolve_place")
+#
+# - Looks a place name up in the local gazetteer index (gazetteer.py): exact
+#   name, then prefix, then a fuzzy match for typos. "Portland, ME" or
+#   "Paris, France" narrow the choice by state or country; a qualifier that
+#   is unknown or fits none of the candidates gives "Unknown place", never a
+#   city somewhere else.
+# - get_weather / get_weather_batch accept a place name themselves and resolve
+#   it the same way, so for weather questions the model does not need this
+#   tool (or a guess) at all. resolve_place is for "where is ..." questions
+#   and for picking between several places with the same name.
+
+from typing import Annotated
+import gazetteer
+from tool_registry import tool
+
+
+@tool
+def resolve_place(
+    name: str,
+    limit: Annotated[int, {"minimum": 1, "maximum": 10}] = 3,
+) -> dict:
+    """Find the coordinates of a city by name (offline, most populous match first).
+
+    Args:
+        name: City name, optionally with state or country, e.g. "Springfield, IL" or "Paris, France"
+        limit: Maximum number of candidate places to return
+    """
+    how, places = gazetteer.default().lookup(name, limit=limit)
+    if not places:
+        return {"query": name, "error": "Unknown place"}
+    return {"query": name, "match": how, "places": [dict(p, label=gazetteer.label(p)) for p in places]}
@@ -0,0 +1,118 @@
+# Lesson 7 – Helper: Rate Limits and Retries for Concurrent API Calls (asyncio)
+#
+# GOAL
+# - Running many chat.completions.create calls at once is only faster until
+#   you hit the account's rate limits: requests per minute (RPM) AND tokens
+#   per minute (TPM). Past that point you just collect 429 errors.
+# - Pace the calls to the limits instead, and retry the ones that still fail
+#   (429, 5xx, dropped connections) with jittered exponential backoff.
+#
+# WHAT IT PROVIDES
+# - TokenBucket(per_minute): `await bucket.acquire(n)` waits until n units are
+#   available. The bucket refills continuously at per_minute / 60 per second
+#   and holds at most 6 seconds' worth (the largest burst).
+# - RateLimiter(rpm, tpm): one bucket for requests, one for tokens.
+#     reserved = await limiter.acquire(estimated_tokens)
+#     ... call the API ...
+#     limiter.settle(reserved, resp.usage.total_tokens)   # correct the estimate
+# - with_retries(make_call, ...): awaits make_call(), retrying retryable
+#   errors. The wait is random in [0, base * 2**attempt] ("full jitter", so
+#   concurrent callers don't retry in lockstep), or the server's Retry-After.
+#
+# CONFIGURATION (environment variables)
+#   OPENAI_RPM   requests per minute   (default 500)
+#   OPENAI_TPM   tokens per minute     (default 200000)
+
+import os, time, random, asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import openai
+
+DEFAULT_RPM = float(os.getenv("OPENAI_RPM", "500"))
+DEFAULT_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+
+
+class TokenBucket:
+    """Async token bucket: up to `per_minute` units per minute, bursts up to `capacity`."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        # Default burst: 6 seconds' worth. Providers enforce limits over short
+        # windows, so a full minute's worth at once would still get 429s.
+        self.capacity = capacity or max(1.0, per_minute / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()  # waiters are served first come, first served
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+        return amount
+
+    def give_back(self, amount: float) -> None:
+        """Return unused units (a negative amount charges extra)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits together."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        await self.requests.acquire(1)
+        return await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, reserved: float, used: Optional[int]) -> None:
+        if used is not None:
+            self.tokens.give_back(reserved - used)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True  # APITimeoutError is an APIConnectionError
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After header), if any."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def with_retries(
+    make_call: Callable[[], Awaitable[Any]],
+    retries: int = 5,
+    stats: Optional[Dict[str, int]] = None,
+) -> Any:
+    """Await make_call(), retrying 429/5xx/connection errors with jittered backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return await make_call()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            if stats is not None:
+                stats["retries"] = stats.get("retries", 0) + 1
+            await asyncio.sleep(retry_after(e) or backoff_delay(attempt))
@@ -0,0 +1,212 @@
+# Lesson 7 – Helper: Exact-Match Response Cache for chat.completions
+#
+# GOAL
+# - Sending the exact same request twice costs the full model latency (and
+#   tokens) twice. With a cache, the second identical request comes back in
+#   milliseconds at zero token cost.
+#
+# HOW IT WORKS
+# - CachedClient wraps an OpenAI client; use it exactly like the client:
+#     client = CachedClient(OpenAI())
+#     resp = client.chat.completions.create(model=..., messages=..., temperature=0)
+# - The cache key is a SHA-256 hash of the canonical JSON of the whole
+#   request (every argument except transport settings such as timeout and
+#   extra_headers), so requests that differ in any setting (penalties,
+#   logit_bias, user, ...) never share an entry.
+# - By default only DETERMINISTIC requests are cached (temperature=0). With a
+#   higher (or the default) temperature you usually want a fresh answer; pass
+#   cache=True to cache anyway, or cache=False to skip the cache.
+# - Streaming (stream=True) requests are cached too: the chunks are recorded
+#   while you read the stream and replayed on a hit. A stream that is closed
+#   early (e.g. aborted by a validator) is not stored. n > 1 is never cached.
+# - Responses are stored in SQLite (sqlite_cache.py), so they survive restarts;
+#   the least recently used entries are evicted beyond CHAT_CACHE_SIZE
+#   entries (default 2000) or CHAT_CACHE_BYTES of stored JSON (default 64 MB).
+# - Entries expire after CHAT_CACHE_TTL seconds (default 86400, one day), so a
+#   cached answer is asked again once a day even if the model behind the name
+#   changed; pass ttl=None for entries that never expire.
+# - With tracing enabled (tracing.py) every call is an "llm.create" span.
+# - AsyncOpenAI works too: CachedClient(AsyncOpenAI()), then
+#   `await client.chat.completions.create(...)` (streams are not cached there).
+# - client.cache_stats() -> {"hits", "misses", "skipped", "size", "bytes"}
+
+import os, json, hashlib
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from sqlite_cache import SQLiteCache
+import tracing
+
+# Request arguments that do not change the answer; everything else is hashed
+NON_KEY_FIELDS = ("timeout", "extra_headers", "extra_query", "metadata", "store")
+# Seconds a cached response stays fresh
+DEFAULT_TTL = float(os.getenv("CHAT_CACHE_TTL", "86400"))
+
+
+def _plain(value: Any) -> Any:
+    """Turn SDK objects (e.g. a ChatCompletionMessage) into plain JSON data."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Canonical hash of the parts of a request that determine the answer."""
+    parts = {k: _plain(v) for k, v in kwargs.items() if k not in NON_KEY_FIELDS and v is not None}
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(kwargs: Dict[str, Any]) -> bool:
+    return kwargs.get("temperature") == 0
+
+
+def _span_attrs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    attrs = {"model": kwargs.get("model"), "stream": bool(kwargs.get("stream"))}
+    if tracing.enabled():
+        attrs["request_bytes"] = len(json.dumps(_plain(kwargs.get("messages")), ensure_ascii=False))
+    return attrs
+
+
+def _record_response(span, resp) -> None:
+    if not tracing.enabled() or not isinstance(resp, ChatCompletion):
+        return  # streams are timed while they are read (llm.stream)
+    span.set("response_bytes", len(resp.model_dump_json()))
+    if resp.usage is not None:
+        span.set("prompt_tokens", resp.usage.prompt_tokens)
+        span.set("completion_tokens", resp.usage.completion_tokens)
+
+
+class _RecordingStream:
+    """Pass chunks through and store them once the stream has been read to the end."""
+
+    def __init__(self, stream, on_complete: Callable[[List[Dict[str, Any]]], None]) -> None:
+        self._stream = stream
+        self._on_complete = on_complete
+
+    def __iter__(self) -> Iterator[Any]:
+        chunks = []
+        for chunk in self._stream:
+            chunks.append(chunk.model_dump())
+            yield chunk
+        self._on_complete(chunks)
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _ReplayStream:
+    """A cached stream: the recorded chunks, replayed."""
+
+    def __init__(self, chunks: List[Dict[str, Any]]) -> None:
+        self._chunks = chunks
+
+    def __iter__(self) -> Iterator[Any]:
+        for data in self._chunks:
+            yield ChatCompletionChunk.model_validate(data)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class _CachedCompletions:
+    def __init__(self, owner: "CachedClient") -> None:
+        self._owner = owner
+
+    def create(self, *, cache: Optional[bool] = None, **kwargs: Any):
+        return self._owner._create(cache, kwargs)
+
+
+class _CachedChat:
+    def __init__(self, owner: "CachedClient") -> None:
+        self.completions = _CachedCompletions(owner)
+
+
+class CachedClient:
+    """Drop-in wrapper around OpenAI() / AsyncOpenAI() that caches chat.completions.create."""
+
+    def __init__(self, client, cache: Optional[SQLiteCache] = None, ttl: Optional[float] = DEFAULT_TTL) -> None:
+        self._client = client
+        self._cache = cache or SQLiteCache(
+            "chat_completions",
+            max_entries=int(os.getenv("CHAT_CACHE_SIZE", "2000")),
+            max_bytes=int(os.getenv("CHAT_CACHE_BYTES", str(64 * 1024 * 1024))),
+        )
+        self._ttl = ttl
+        self._async = isinstance(client, AsyncOpenAI) or getattr(client, "is_async", False)
+        self._stats = {"hits": 0, "misses": 0, "skipped": 0}
+        self.chat = _CachedChat(self)
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything else (client.models, client.embeddings, ...) goes to the real client
+        return getattr(self._client, name)
+
+    def _lookup(self, cache: Optional[bool], kwargs: Dict[str, Any]):
+        """-> (key or None if the request must not be cached, cached response or None)"""
+        span = tracing.current()
+        use_cache = is_deterministic(kwargs) if cache is None else cache
+        if not use_cache or (kwargs.get("n") or 1) > 1 or (self._async and kwargs.get("stream")):
+            self._stats["skipped"] += 1
+            span.set("cache", "skipped")
+            return None, None
+
+        key = request_key(kwargs)
+        data, _, fresh = self._cache.get(key)
+        if data is not None and fresh:
+            self._stats["hits"] += 1
+            span.set("cache", "hit")
+            if kwargs.get("stream"):
+                return key, _ReplayStream(data)
+            with tracing.span("json.decode", what="cached response"):
+                return key, ChatCompletion.model_validate(data)
+        self._stats["misses"] += 1
+        span.set("cache", "miss")
+        return key, None
+
+    def _store(self, key: Optional[str], kwargs: Dict[str, Any], resp):
+        if key is None:
+            return resp
+        if kwargs.get("stream"):
+            return _RecordingStream(resp, lambda chunks: self._cache.set(key, chunks, ttl=self._ttl))
+        self._cache.set(key, resp.model_dump(), ttl=self._ttl)
+        return resp
+
+    def _create(self, cache: Optional[bool], kwargs: Dict[str, Any]):
+        if self._async:
+            return self._acreate(cache, kwargs)
+        with tracing.span("llm.create", **_span_attrs(kwargs)) as span:
+            key, hit = self._lookup(cache, kwargs)
+            if hit is not None:
+                return hit
+            resp = self._client.chat.completions.create(**kwargs)
+            _record_response(span, resp)
+            return self._store(key, kwargs, resp)
+
+    async def _acreate(self, cache: Optional[bool], kwargs: Dict[str, Any]):
+        with tracing.span("llm.create", **_span_attrs(kwargs)) as span:
+            key, hit = self._lookup(cache, kwargs)
+            if hit is not None:
+                return hit
+            resp = await self._client.chat.completions.create(**kwargs)
+            _record_response(span, resp)
+            return self._store(key, kwargs, resp)
+
+    def cache_stats(self) -> Dict[str, int]:
+        return dict(self._stats, size=len(self._cache), bytes=self._cache.size_bytes())
+
@@ -0,0 +1,226 @@
+# Lesson 7 – Helper: Compact Tool Results Before They Go Back to the Model
+#
+# GOAL
+# - Whatever a tool returns is sent to the model again as a 'role: tool'
+#   message. A long Wikipedia extract or a 30-hit Hacker News list makes the
+#   follow-up chat.completions.create prompt (and its latency and cost) grow.
+# - compact_result() keeps every tool result within a token budget, so the
+#   size of the follow-up prompt is predictable.
+#
+# HOW IT WORKS
+# 1) Tokens are estimated cheaply (about 4 characters per token).
+# 2) Per-tool rules (TOOL_RULES) drop low-value fields, e.g. "author".
+# 3) Lists of records with the same keys are encoded as a table:
+#      {"columns": ["title", "url"], "rows": [["...", "..."], ...]}
+#    which repeats each key once instead of once per record.
+# 4) If the result is still over budget, time series (the hourly forecast)
+#    lose their last values, keeping at least one; then lists lose items from
+#    the end, keeping at least one (ranked results, or forecasts for many
+#    places, marked "truncated"); then long strings are truncated (ending in
+#    "…").
+#
+# USAGE
+#   content = compact_json("wiki_summary", result)      # a JSON string
+#   budget  = TOOL_BUDGETS.get(name, DEFAULT_BUDGET)
+#
+# CHECK
+#   python result_compactor.py     # compacts sample results, checks the budgets
+
+import os, json, random
+from typing import Any, Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+DEFAULT_BUDGET = int(os.getenv("TOOL_RESULT_TOKENS", "400"))
+
+# Per-tool token budgets
+TOOL_BUDGETS: Dict[str, int] = {
+    "wiki_summary": 250,
+    "search_hn": 400,
+    "get_weather": 200,
+    "get_weather_batch": 1200,
+}
+
+# Per-tool rules: fields to drop, the longest any single string may be,
+# series (lists of values) that may be shortened from the end, and whether
+# trailing list items may be dropped
+_WEATHER_RULES = {
+    # "place" already names the location; interval/weathercode add little
+    "drop": ["latitude", "longitude", "interval", "weathercode"],
+    "series": ["hourly_temperature_2m"],
+}
+TOOL_RULES: Dict[str, Dict[str, Any]] = {
+    "search_hn": {"drop": ["author"], "max_str": 200, "drop_items": True},
+    "wiki_summary": {"max_str": 600},
+    "get_weather": _WEATHER_RULES,
+    "get_weather_batch": {**_WEATHER_RULES, "drop_items": True},
+}
+
+
+def _json_default(value: Any) -> Any:
+    # SDK objects (e.g. the ChatCompletionMessage appended in a tool loop)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return str(value)
+
+
+def estimate_tokens(value: Any) -> int:
+    """Rough token count of a value once serialized as compact JSON."""
+    text = value if isinstance(value, str) else json.dumps(
+        value, separators=(",", ":"), ensure_ascii=False, default=_json_default
+    )
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _drop_fields(value: Any, drop: List[str]) -> Any:
+    if isinstance(value, dict):
+        return {k: _drop_fields(v, drop) for k, v in value.items() if k not in drop}
+    if isinstance(value, list):
+        return [_drop_fields(v, drop) for v in value]
+    return value
+
+
+def _truncate_strings(value: Any, limit: int) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[: max(0, limit - 1)].rstrip() + "…"
+    if isinstance(value, dict):
+        return {k: _truncate_strings(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_truncate_strings(v, limit) for v in value]
+    return value
+
+
+def tabulate(records: List[Any]) -> Any:
+    """Encode a list of flat dicts as {"columns", "rows"}; anything else is returned as is."""
+    if len(records) < 2 or not all(isinstance(r, dict) for r in records):
+        return records
+    columns: List[str] = []
+    for r in records:
+        for k in r:
+            if k not in columns:
+                columns.append(k)
+    if any(isinstance(v, (dict, list)) for r in records for v in r.values()):
+        return records
+    return {"columns": columns, "rows": [[r.get(c) for c in columns] for r in records]}
+
+
+def _longest_string(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return max((_longest_string(v) for v in value.values()), default=0)
+    if isinstance(value, list):
+        return max((_longest_string(v) for v in value), default=0)
+    return 0
+
+
+def _longest_series(value: Any, keys: List[str]) -> int:
+    if isinstance(value, dict):
+        return max(
+            (len(v) if k in keys and isinstance(v, list) else _longest_series(v, keys) for k, v in value.items()),
+            default=0,
+        )
+    if isinstance(value, list):
+        return max((_longest_series(v, keys) for v in value), default=0)
+    return 0
+
+
+def _cut_series(value: Any, keys: List[str], length: int) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: v[:length] if k in keys and isinstance(v, list) else _cut_series(v, keys, length)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_cut_series(v, keys, length) for v in value]
+    return value
+
+
+def _shorten_series(value: Any, keys: List[str]) -> Optional[Any]:
+    """Drop the last value of the longest series (e.g. the latest forecast hour)."""
+    longest = _longest_series(value, keys)
+    return _cut_series(value, keys, longest - 1) if longest > 1 else None
+
+
+def _shorten_list(value: Any) -> Optional[Any]:
+    """Drop the last item of the biggest list found (top level or table rows)."""
+    if isinstance(value, dict) and isinstance(value.get("rows"), list) and value["rows"]:
+        return {**value, "rows": value["rows"][:-1], "truncated": True}
+    if isinstance(value, list) and value:
+        if isinstance(value[-1], dict) and value[-1].get("truncated"):
+            # keep the marker record added below, drop the item before it
+            return value[:-2] + value[-1:] if len(value) > 2 else None
+        return value[:-1] + [{"truncated": True, "note": "more results were dropped to save tokens"}]
+    return None
+
+
+def _length(value: Any) -> int:
+    if isinstance(value, dict) and "rows" in value:
+        return len(value["rows"])
+    return len([v for v in value if not (isinstance(v, dict) and v.get("truncated"))])
+
+
+def compact_result(name: str, result: Any, budget: Optional[int] = None) -> Any:
+    """Return a version of `result` that fits the tool's token budget."""
+    budget = budget or TOOL_BUDGETS.get(name, DEFAULT_BUDGET)
+    rules = TOOL_RULES.get(name, {})
+    if rules.get("drop"):
+        result = _drop_fields(result, rules["drop"])
+    if rules.get("max_str"):
+        result = _truncate_strings(result, rules["max_str"])
+    if isinstance(result, list):
+        result = tabulate(result)
+    if isinstance(result, dict) and "error" in result:
+        return result
+
+    # Still too big: shorten time series first, then drop trailing list items
+    # (the lowest-ranked results), then halve the longest strings.
+    limit = _longest_string(result)
+    while estimate_tokens(result) > budget:
+        trimmed = _shorten_series(result, rules["series"]) if rules.get("series") else None
+        if trimmed is not None:
+            result = trimmed
+            continue
+        shorter = _shorten_list(result) if rules.get("drop_items") else None
+        if shorter is not None and _length(shorter) >= 1:
+            result = shorter
+        elif limit > 40:
+            limit //= 2
+            result = _truncate_strings(result, limit)
+        else:
+            break
+    return result
+
+
+def compact_json(name: str, result: Any, budget: Optional[int] = None) -> str:
+    """compact_result() serialized as the content of a 'role: tool' message."""
+    return json.dumps(compact_result(name, result, budget), separators=(",", ":"), ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+
+    def forecast(n: int) -> Dict[str, Any]:
+        return {
+            "name": f"City {n}", "place": f"City {n}, US", "latitude": 40.1 + n, "longitude": -75.2 - n,
+            "timezone": "America/New_York",
+            "current_weather": {"temperature": 21.4, "windspeed": 9.7, "winddirection": 250, "weathercode": 3,
+                                "is_day": 1, "time": "2024-06-01T12:00", "interval": 900},
+            "hourly_temperature_2m": [round(rng.uniform(10, 30), 1) for _ in range(24)],
+        }
+
+    samples = {
+        "get_weather": forecast(0),
+        "get_weather_batch": [forecast(n) for n in range(20)],
+        "search_hn": [{"title": "Show HN: " + "x" * 80, "url": f"https://example.com/{n}", "points": n,
+                       "author": "someone", "comments": n} for n in range(30)],
+    }
+    for name, result in samples.items():
+        budget = TOOL_BUDGETS.get(name, DEFAULT_BUDGET)
+        compacted = compact_result(name, result)
+        after = estimate_tokens(compacted)
+        print(f"{name:<18} {estimate_tokens(result):>6} -> {after:>5} tokens (budget {budget})")
+        assert after <= budget, f"{name} is over its budget"
+    batch = compact_result("get_weather_batch", samples["get_weather_batch"])
+    assert len(batch) == 20 and all(len(r["hourly_temperature_2m"]) >= 1 for r in batch)
+    assert all("latitude" not in r and "weathercode" not in r["current_weather"] for r in batch)
+    print("ok")
@@ -0,0 +1,300 @@
+# Lesson 7 – Helper: Fast and Streaming JSON Schema Validation
+#
+# GOAL
+# - jsonschema.validate(instance=..., schema=...) checks and compiles the schema
+#   again on every call. Compile each schema ONCE and reuse it.
+# - Validate a STREAMED response while it arrives, and stop the stream the
+#   moment it can no longer be valid (e.g. an unexpected key when the schema
+#   says additionalProperties: false). No need to wait for the rest of the
+#   generation before asking the model to fix it.
+#
+# WHAT IT PROVIDES
+# - validate(data, schema): like jsonschema.validate, but the compiled
+#   validator is cached. If fastjsonschema is installed (pip install
+#   fastjsonschema) it is used: it generates Python code for the schema.
+#   Errors are always raised as jsonschema.ValidationError.
+# - IncrementalValidator(schema): feed(text) chunk by chunk; raises
+#   StreamValidationError as soon as the JSON so far breaks the schema:
+#     * a key not allowed by additionalProperties: false
+#     * a value whose type doesn't match (e.g. "[" where a number is expected)
+#     * an object closed before all required keys appeared
+#     * text that is not JSON at all (e.g. prose before the opening "{")
+#   finish() validates the complete document with the compiled validator.
+# - IncrementalValidator(schema, strict=False): only stop the stream for
+#   problems json_repair.py can't fix locally. For prose, single quotes,
+#   trailing commas or a number sent as a string it just stops checking and
+#   lets the answer finish, so the complete text can be repaired.
+#
+# USAGE
+#   checker = IncrementalValidator(schema)
+#   for chunk in stream:
+#       checker.feed(chunk.choices[0].delta.content or "")   # may raise -> stop early
+#   data = checker.finish()
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+from jsonschema import ValidationError
+from jsonschema.validators import validator_for
+
+try:
+    import fastjsonschema
+except ImportError:  # optional speed-up
+    fastjsonschema = None
+
+_compiled: Dict[str, Callable[[Any], None]] = {}
+
+
+def _schema_key(schema: Dict[str, Any]) -> str:
+    return json.dumps(schema, sort_keys=True, separators=(",", ":"))
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], None]:
+    """Return a cached check(data) function that raises ValidationError."""
+    key = _schema_key(schema)
+    check = _compiled.get(key)
+    if check is not None:
+        return check
+    if fastjsonschema is not None:
+        fast = fastjsonschema.compile(schema)
+
+        def check(data: Any) -> None:
+            try:
+                fast(data)
+            except fastjsonschema.JsonSchemaException as e:
+                raise ValidationError(e.message) from e
+    else:
+        cls = validator_for(schema)
+        cls.check_schema(schema)  # once, not on every call
+        validator = cls(schema)
+
+        def check(data: Any) -> None:
+            error = next(iter(validator.iter_errors(data)), None)
+            if error is not None:
+                raise error
+    _compiled[key] = check
+    return check
+
+
+def validate(data: Any, schema: Dict[str, Any]) -> None:
+    compile_schema(schema)(data)
+
+
+class StreamValidationError(ValidationError):
+    """The streamed JSON can no longer match the schema."""
+
+
+_TYPE_STARTS = {
+    "object": "{",
+    "array": "[",
+    "string": '"',
+    "number": "-0123456789",
+    "integer": "-0123456789",
+    "boolean": "tf",
+    "null": "n",
+}
+
+
+class _GiveUp(Exception):
+    """Non-strict mode: the text needs local repair; stop checking it."""
+
+
+class _Frame:
+    def __init__(self, kind: str, schema: Dict[str, Any]) -> None:
+        self.kind = kind          # "object" or "array"
+        self.schema = schema
+        self.state = "start"      # object: start/key/colon/value/comma ; array: start/value/comma
+        self.seen: List[str] = []
+
+
+class IncrementalValidator:
+    """Check streamed JSON text against a schema as it arrives."""
+
+    def __init__(self, schema: Dict[str, Any], strict: bool = True) -> None:
+        self.schema = schema
+        self.strict = strict
+        self.gave_up = False                      # non-strict: stopped checking
+        self._parts: List[str] = []
+        self._length = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[List[str]] = None   # characters of the key being read
+        self._scalar = False                      # inside a number/true/false/null
+        self._fence = False                       # skipping a leading ``` line
+
+    # ---- helpers ----
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._parts)
+
+    def _fail(self, message: str) -> None:
+        raise StreamValidationError(f"{message} (after {self._length} characters)")
+
+    def _repairable(self, message: str) -> None:
+        if self.strict:
+            self._fail(message)
+        raise _GiveUp(message)
+
+    @staticmethod
+    def _types(schema: Dict[str, Any]) -> List[str]:
+        t = schema.get("type")
+        if t is None:
+            return []
+        return t if isinstance(t, list) else [t]
+
+    def _check_start(self, ch: str, schema: Dict[str, Any]) -> None:
+        types = self._types(schema)
+        if ch == "'":
+            self._repairable("single-quoted string")
+        if types and not any(ch in _TYPE_STARTS.get(t, "") for t in types):
+            if ch == '"' and {"number", "integer", "boolean"} & set(types):
+                self._repairable(f"expected {'/'.join(types)} but got a string")
+            self._fail(f"expected {'/'.join(types)} but value starts with {ch!r}")
+
+    def _value_schema(self) -> Dict[str, Any]:
+        frame = self._stack[-1]
+        if frame.kind == "array":
+            items = frame.schema.get("items")
+            return items if isinstance(items, dict) else {}
+        key = frame.seen[-1]
+        props = frame.schema.get("properties", {})
+        if key in props:
+            return props[key]
+        extra = frame.schema.get("additionalProperties")
+        return extra if isinstance(extra, dict) else {}
+
+    def _start_value(self, ch: str, schema: Dict[str, Any]) -> None:
+        self._check_start(ch, schema)
+        if ch == "{":
+            self._stack.append(_Frame("object", schema))
+        elif ch == "[":
+            self._stack.append(_Frame("array", schema))
+        elif ch == '"':
+            self._in_string = True
+        else:
+            self._scalar = True
+
+    def _end_value(self) -> None:
+        if self._stack:
+            self._stack[-1].state = "comma"
+        else:
+            self._done = True
+
+    def _close(self, ch: str) -> None:
+        frame = self._stack[-1]
+        want = "}" if frame.kind == "object" else "]"
+        if ch != want:
+            self._fail(f"unexpected {ch!r}")
+        if frame.kind == "object":
+            missing = [k for k in frame.schema.get("required", []) if k not in frame.seen]
+            if missing:
+                self._fail(f"object closed without required keys {missing}")
+        self._stack.pop()
+        self._end_value()
+
+    # ---- public API ----
+    def feed(self, chunk: str) -> None:
+        self._parts.append(chunk)
+        if self.gave_up:
+            return
+        try:
+            for ch in chunk:
+                self._length += 1
+                self._step(ch)
+        except _GiveUp:
+            self.gave_up = True
+
+    def _step(self, ch: str) -> None:
+        if self._fence:
+            if ch == "\n":
+                self._fence = False
+            return
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._key is not None:
+                    self._finish_key()
+                else:
+                    self._end_value()
+            elif self._key is not None:
+                self._key.append(ch)
+            return
+        if self._scalar:
+            if ch.isalnum() or ch in "+-.":
+                return
+            self._scalar = False
+            self._end_value()
+        if ch.isspace():
+            return
+        if self._done:
+            if ch == "`":
+                return  # closing markdown fence
+            self._repairable(f"unexpected {ch!r} after the end of the JSON value")
+        if not self._started:
+            if ch == "`":
+                self._fence = True  # tolerate a leading ```json line
+                return
+            if not any(ch in _TYPE_STARTS.get(t, "") for t in self._types(self.schema) or ["object", "array"]):
+                self._repairable(f"text before the JSON value ({ch!r})")
+            self._started = True
+            self._start_value(ch, self.schema)
+            return
+        frame = self._stack[-1]
+        if frame.kind == "object":
+            if frame.state in ("start", "key") and ch == '"':
+                self._key = []
+                self._in_string = True
+            elif frame.state == "start" and ch == "}":
+                self._close(ch)
+            elif frame.state == "colon" and ch == ":":
+                frame.state = "value"
+            elif frame.state == "value":
+                frame.state = "in_value"
+                self._start_value(ch, self._value_schema())
+            elif frame.state == "comma" and ch == ",":
+                frame.state = "key"
+            elif frame.state == "comma" and ch in "}]":
+                self._close(ch)
+            else:
+                self._repairable(f"unexpected {ch!r} in object")
+        else:
+            if frame.state == "value" and ch == "]":
+                self._repairable("trailing comma in array")
+            if frame.state in ("start", "value") and not (frame.state == "start" and ch == "]"):
+                frame.state = "in_value"
+                self._start_value(ch, self._value_schema())
+            elif frame.state == "start" and ch == "]":
+                self._close(ch)
+            elif frame.state == "comma" and ch == ",":
+                frame.state = "value"
+            elif frame.state == "comma" and ch in "}]":
+                self._close(ch)
+            else:
+                self._repairable(f"unexpected {ch!r} in array")
+
+    def _finish_key(self) -> None:
+        frame = self._stack[-1]
+        key = "".join(self._key or [])
+        self._key = None
+        props = frame.schema.get("properties", {})
+        if frame.schema.get("additionalProperties") is False and key not in props:
+            self._fail(f"unexpected key {key!r}")
+        frame.seen.append(key)
+        frame.state = "colon"
+
+    def finish(self) -> Any:
+        """The stream ended: parse and fully validate the document."""
+        text = self.text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0]
+        data = json.loads(text)
+        validate(data, self.schema)
+        return data
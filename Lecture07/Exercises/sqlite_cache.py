@@ -0,0 +1,135 @@
+# Lesson 7 – Helper: Persistent SQLite Cache
+#
+# GOAL
+# - Every run of a CLI script is a new process, so an in-memory cache starts
+#   empty each time. This cache lives in a small SQLite file and survives
+#   restarts.
+#
+# HOW IT WORKS
+# - One table per cache: key -> JSON value, optional metadata (e.g. HTTP
+#   ETag / Last-Modified), expiry time and last-access time.
+# - get() returns (value, meta, is_fresh). Expired rows are still returned
+#   (is_fresh=False) so the caller can revalidate them cheaply.
+# - When max_entries (rows) or max_bytes (size of the stored JSON) is set, the
+#   least recently used rows are removed to stay within it.
+#
+# LOCATION
+# - Files go in CACHE_DIR (default ~/.cache/practical_ai).
+#
+# USAGE
+#   cache = SQLiteCache("wiki")
+#   cache.set("seattle", {"title": "Seattle"}, ttl=86400, meta={"etag": '"abc"'})
+#   value, meta, fresh = cache.get("seattle")
+
+import os, json, time, sqlite3, threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+CACHE_DIR = Path(os.getenv("CACHE_DIR", Path.home() / ".cache" / "practical_ai"))
+
+
+class SQLiteCache:
+    """A small key/value cache stored in a SQLite file."""
+
+    def __init__(
+        self,
+        name: str,
+        path: Optional[os.PathLike] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.table = "".join(c if c.isalnum() else "_" for c in name)
+        self.path = Path(path) if path else CACHE_DIR / f"{self.table}.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            " key TEXT PRIMARY KEY, value TEXT, meta TEXT,"
+            " expires_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({self.table})")}
+        if "size" not in columns:  # a cache file from before max_bytes
+            self._conn.execute(f"ALTER TABLE {self.table} ADD COLUMN size INTEGER")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table}(accessed_at)")
+
+    def get(self, key: str) -> Tuple[Optional[Any], Dict[str, Any], bool]:
+        """Return (value, meta, is_fresh); (None, {}, False) when missing."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, meta, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, {}, False
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        value, meta, expires_at = row
+        return json.loads(value), json.loads(meta or "{}"), expires_at is None or expires_at > now
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, meta: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        value_json, meta_json = json.dumps(value), json.dumps(meta or {})
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, meta, expires_at, accessed_at, size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value_json, meta_json, expires_at, now, len(value_json) + len(meta_json)),
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f" SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            if self.max_bytes:
+                self._evict_bytes()
+
+    def _evict_bytes(self) -> None:
+        """Remove least recently used rows until the stored JSON fits in max_bytes."""
+        excess = self._size_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in self._conn.execute(
+            f"SELECT key, COALESCE(size, length(value)) FROM {self.table} ORDER BY accessed_at"
+        ):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+
+    def _size_bytes(self) -> int:
+        return self._conn.execute(
+            f"SELECT COALESCE(SUM(COALESCE(size, length(value))), 0) FROM {self.table}"
+        ).fetchone()[0]
+
+    def size_bytes(self) -> int:
+        """Total size of the stored JSON (values and metadata)."""
+        with self._lock:
+            return self._size_bytes()
+
+    def touch(self, key: str, ttl: Optional[float]) -> None:
+        """Extend an entry's freshness (e.g. after a 304 Not Modified)."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(f"UPDATE {self.table} SET expires_at = ? WHERE key = ?", (expires_at, key))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def close(self) -> None:
+        self._conn.close()
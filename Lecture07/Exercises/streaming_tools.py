@@ -0,0 +1,130 @@
+# Lesson 7 – Helper: Streaming Tool Calls
+#
+# GOAL
+# - Without streaming, chat.completions.create(..., tools=tools) blocks until the
+#   WHOLE tool-call message has been generated; only then can any tool start.
+# - With stream=True the tool calls arrive as small deltas. As soon as one call's
+#   JSON arguments are complete we start that tool (e.g. get_weather(lat, lon))
+#   while the model is still generating the next call.
+#
+# HOW IT WORKS
+# - Each delta carries delta.tool_calls[i] with an index, and the id, name and a
+#   piece of the JSON arguments string.
+# - We append the pieces per index. When the arguments parse as a JSON object
+#   (or the model moves on to the next call) the call is handed to a
+#   ToolExecutor, which runs it in the background.
+# - When the stream ends we wait for the results, which come back in call order.
+#
+# USAGE
+#   stream = client.chat.completions.create(..., tools=tools, stream=True)
+#   turn = stream_tool_calls(stream, registry.call)
+#   if turn.tool_calls:
+#       messages += [turn.assistant_message, *turn.tool_messages]
+#   else:
+#       print(turn.content)
+
+import json, time
+import tracing
+from typing import Any, Callable, Dict, List, Optional
+from tool_executor import DEFAULT_MAX_WORKERS, DEFAULT_TIMEOUT, ToolExecutor, tool_message
+
+
+class _PendingCall:
+    def __init__(self) -> None:
+        self.id = ""
+        self.name = ""
+        self.arguments = ""
+        self.position: Optional[int] = None  # set once submitted to the executor
+
+    def arguments_complete(self) -> bool:
+        """True once the streamed arguments form a full JSON object."""
+        text = self.arguments.rstrip()
+        if not text.endswith("}"):
+            return False
+        try:
+            return isinstance(json.loads(text), dict)
+        except json.JSONDecodeError:
+            return False
+
+
+class StreamedTurn:
+    """Everything one streamed assistant turn produced."""
+
+    def __init__(self, content: str, calls: List[_PendingCall], results: List[Any], finish_reason: Optional[str]):
+        self.content = content
+        self.finish_reason = finish_reason
+        self.tool_calls = [
+            {"id": c.id, "type": "function", "function": {"name": c.name, "arguments": c.arguments}}
+            for c in calls
+        ]
+        self.tool_messages = [tool_message(c.id, c.name, r) for c, r in zip(calls, results)]
+
+    @property
+    def assistant_message(self) -> Dict[str, Any]:
+        """The assistant message to send back before the tool messages."""
+        msg: Dict[str, Any] = {"role": "assistant", "content": self.content or None}
+        if self.tool_calls:
+            msg["tool_calls"] = self.tool_calls
+        return msg
+
+
+def stream_tool_calls(
+    stream,
+    dispatch: Callable[[str, Dict[str, Any]], Any],
+    timeout: float = DEFAULT_TIMEOUT,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> StreamedTurn:
+    """Consume a stream=True completion, starting each tool as soon as its arguments are complete."""
+    calls: Dict[int, _PendingCall] = {}
+    text_parts: List[str] = []
+    finish_reason = None
+    chunks = 0
+
+    with ToolExecutor(dispatch, timeout=timeout, max_workers=max_workers) as executor:
+
+        def submit(call: _PendingCall) -> None:
+            if call.position is None:
+                call.position = executor.submit(call.name, call.arguments)
+
+        with tracing.span("llm.stream") as span:
+            started = time.perf_counter()
+            for chunk in stream:
+                if chunks == 0:
+                    span.set("first_chunk_ms", round((time.perf_counter() - started) * 1000, 1))
+                chunks += 1
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+                if delta is not None and delta.content:
+                    text_parts.append(delta.content)
+                    if on_text:
+                        on_text(delta.content)
+                for d in (delta.tool_calls or []) if delta is not None else []:
+                    if d.index not in calls:
+                        # A new call started: anything earlier is as complete as it will get
+                        for earlier in calls.values():
+                            submit(earlier)
+                        calls[d.index] = _PendingCall()
+                    call = calls[d.index]
+                    if d.id:
+                        call.id = d.id
+                    if d.function is not None:
+                        if d.function.name:
+                            call.name += d.function.name
+                        if d.function.arguments:
+                            call.arguments += d.function.arguments
+                    if call.position is None and call.name and call.arguments_complete():
+                        submit(call)
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+            span.set("chunks", chunks)
+
+        for call in calls.values():
+            submit(call)
+        with tracing.span("tools.wait"):
+            results = executor.results()
+
+    ordered = [calls[i] for i in sorted(calls)]
+    return StreamedTurn("".join(text_parts), ordered, [results[c.position] for c in ordered], finish_reason)
@@ -0,0 +1,266 @@
+# Lesson 7 – Helper: In-Process Tool Cache
+#
+# GOAL
+# - Tools are often asked the same thing again and again (the weather in the
+#   same few cities). Answer repeats from memory instead of calling the API.
+#
+# HOW IT WORKS
+# - TTLCache keeps up to `maxsize` entries; the least recently used entry is
+#   evicted first (LRU).
+# - An entry is FRESH for `ttl` seconds and is returned directly.
+# - After that it is STALE for another `stale_ttl` seconds: the stale value is
+#   returned immediately and ONE background refresh is started
+#   (stale-while-revalidate), so callers never wait on a refresh.
+# - Older entries are loaded synchronously, like a normal miss. Misses go
+#   through SingleFlight (below): concurrent misses for the same key share
+#   ONE load instead of each calling the API.
+# - get_or_load_many(keys, loader) does the same for several keys: fresh and
+#   stale entries are answered as above, and ALL the misses are loaded with
+#   one loader(missing_keys) call (one batched API request). Keys another
+#   caller is already loading are waited for, not loaded twice. Each key
+#   gets (value, None) or (None, error), so one failure does not hide the
+#   keys that did load.
+# - stats() reports hits, stale hits, misses, coalesced misses, refreshes and
+#   evictions.
+#
+# SINGLE-FLIGHT
+# - SingleFlight makes concurrent callers with the same key share ONE call:
+#   the first caller runs it, the others wait and get the same result (or
+#   the same exception). Useful when many users ask about the same topic at
+#   the same moment and the cache is still empty.
+#
+# USAGE
+#   cache = TTLCache(maxsize=256, ttl=900, stale_ttl=3600)
+#   value = cache.get_or_load(key, lambda: fetch(...))
+#   results = cache.get_or_load_many(keys, lambda missing: fetch_many(missing))
+#
+#   flight = SingleFlight()
+#   value = flight.do(key, lambda: fetch(...))
+
+import time, threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class TTLCache:
+    """LRU cache with a freshness TTL and stale-while-revalidate."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 900, stale_ttl: float = 0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._refreshing: set = set()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+    def _age(self, stored_at: float) -> float:
+        return time.monotonic() - stored_at
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh value or None (counts as a hit or miss, never loads)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._age(entry[1]) >= self.ttl:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def is_fresh(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and self._age(entry[1]) < self.ttl
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value however old it is (e.g. as a fallback)."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = self._age(stored_at)
+                if age < self.ttl:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                    return value
+            self._stats["misses"] += 1
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def get_or_load_many(
+        self, keys: Iterable[Hashable], loader: Callable[[List[Hashable]], List[Any]]
+    ) -> Dict[Hashable, Tuple[Any, Optional[BaseException]]]:
+        """{key: (value, None) or (None, error)}; the misses are loaded by ONE loader(missing) call.
+
+        `loader` gets the missing keys and returns their values in the same order.
+        """
+        out: Dict[Hashable, Tuple[Any, Optional[BaseException]]] = {}
+        missing: List[Hashable] = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._data.get(key)
+                age = self._age(entry[1]) if entry is not None else None
+                if age is not None and age < self.ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    out[key] = (entry[0], None)
+                    if age < self.ttl:
+                        self._stats["hits"] += 1
+                        continue
+                    self._stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(
+                            target=self._refresh, args=(key, lambda k=key: loader([k])[0]), daemon=True
+                        ).start()
+                    continue
+                self._stats["misses"] += 1
+                missing.append(key)
+        if missing:
+            out.update(self._flight.do_many(missing, lambda ks: self._load_many(ks, loader)))
+        return out
+
+    def _load_many(self, keys: List[Hashable], loader: Callable[[List[Hashable]], List[Any]]) -> List[Any]:
+        values = list(loader(keys))
+        if len(values) != len(keys):
+            raise ValueError(f"loader returned {len(values)} values for {len(keys)} keys")
+        for key, value in zip(keys, values):
+            self.set(key, value)
+        return values
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        try:
+            self.set(key, loader())
+            with self._lock:
+                self._stats["refreshes"] += 1
+        except Exception:
+            # Keep serving the stale value; the next stale hit will try again.
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats, size=len(self._data))
+        out["coalesced"] = self._flight.stats()["shared"]
+        lookups = out["hits"] + out["stale_hits"] + out["misses"]
+        out["hit_rate"] = round((out["hits"] + out["stale_hits"]) / lookups, 3) if lookups else 0.0
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-flight call."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["calls"] += 1
+            else:
+                self._stats["shared"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def do_many(
+        self, keys: Iterable[Hashable], fn: Callable[[List[Hashable]], List[Any]]
+    ) -> Dict[Hashable, Tuple[Any, Optional[BaseException]]]:
+        """do() for several keys: keys nobody is loading yet go to ONE fn(keys) call.
+
+        Returns {key: (value, None) or (None, error)} instead of raising.
+        """
+        led: Dict[Hashable, _Flight] = {}
+        joined: Dict[Hashable, _Flight] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._flights:
+                    joined[key] = self._flights[key]
+                    self._stats["shared"] += 1
+                else:
+                    led[key] = self._flights[key] = _Flight()
+            if led:
+                self._stats["calls"] += 1
+        fatal: Optional[BaseException] = None
+        if led:
+            try:
+                for flight, value in zip(led.values(), fn(list(led))):
+                    flight.value = value
+            except BaseException as e:
+                for flight in led.values():
+                    flight.error = e
+                if not isinstance(e, Exception):
+                    fatal = e
+            finally:
+                with self._lock:
+                    for key in led:
+                        del self._flights[key]
+                for flight in led.values():
+                    flight.done.set()
+        if fatal is not None:
+            raise fatal
+        out: Dict[Hashable, Tuple[Any, Optional[BaseException]]] = {}
+        for key, flight in {**led, **joined}.items():
+            flight.done.wait()
+            out[key] = (flight.value, flight.error)
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
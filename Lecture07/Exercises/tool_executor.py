@@ -0,0 +1,154 @@
+# Lesson 7 – Helper: Concurrent Tool Execution
+#
+# GOAL
+# - When the model asks for several tools in ONE assistant message
+#   (e.g. get_weather AND wiki_summary), run them at the same time.
+# - A turn then takes as long as the slowest tool, not the sum of all tools.
+#
+# HOW IT WORKS
+# - Each tool call is submitted to a small thread pool (tools are mostly
+#   network I/O, so threads are a good fit).
+# - max_workers caps how many calls run at once.
+# - Every call gets its own timeout; a slow tool returns {"error": "timeout"}
+#   instead of holding up the answer.
+# - Results are returned in the SAME order as msg.tool_calls, so every
+#   tool_call_id lines up with what the follow-up chat.completions.create expects.
+# - Each result is compacted to its tool's token budget before it becomes a
+#   'role: tool' message (see result_compactor.py).
+#
+# USAGE
+#   from tool_executor import run_tool_calls
+#   tool_msgs = run_tool_calls(msg.tool_calls, dispatch, timeout=20, max_workers=4)
+#
+# where dispatch(name, args) -> result is a plain Python function.
+
+import os, json, time
+import contextvars
+import tracing
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List
+from result_compactor import compact_json
+
+DEFAULT_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+DEFAULT_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "4"))
+
+
+def _run_one(dispatch: Callable[[str, Dict[str, Any]], Any], name: str, arguments: str) -> Any:
+    """Parse arguments and call the tool; errors become a structured result."""
+    with tracing.span(f"tool.{name}") as span:
+        try:
+            with tracing.span("json.decode", what="tool arguments", bytes=len(arguments or "")):
+                args = json.loads(arguments or "{}")
+        except json.JSONDecodeError as e:
+            span.set("error", "invalid arguments")
+            return {"error": f"Invalid JSON arguments for {name}: {e}"}
+        try:
+            return dispatch(name, args)
+        except Exception as e:
+            span.set("error", f"{type(e).__name__}: {e}")
+            return {"error": f"{type(e).__name__}: {e}"}
+
+
+def tool_message(call_id: str, name: str, result: Any) -> Dict[str, Any]:
+    """Build the 'role: tool' message for one call (compacted to the tool's token budget)."""
+    with tracing.span("json.encode", what=f"{name} result") as span:
+        content = compact_json(name, result)
+        span.set("bytes", len(content))
+    return {
+        "role": "tool",
+        "tool_call_id": call_id,
+        "name": name,
+        "content": content,
+    }
+
+
+class ToolExecutor:
+    """A bounded thread pool that runs tool calls and returns results in submit order.
+
+    Calls can be submitted one at a time (e.g. while a streamed response is still
+    arriving, see streaming_tools.py); results() waits for all of them.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[str, Dict[str, Any]], Any],
+        timeout: float = DEFAULT_TIMEOUT,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ) -> None:
+        self.dispatch = dispatch
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._names: List[str] = []
+        self._futures: List[Future] = []
+        self._started: Dict[int, float] = {}
+
+    def _job(self, i: int, name: str, arguments: str) -> Any:
+        self._started[i] = time.monotonic()
+        return _run_one(self.dispatch, name, arguments)
+
+    def submit(self, name: str, arguments: str) -> int:
+        """Start one tool call in the background; returns its position."""
+        i = len(self._futures)
+        self._names.append(name)
+        # copy_context(): the worker thread sees the caller's tracing span as parent
+        ctx = contextvars.copy_context()
+        self._futures.append(self._pool.submit(ctx.run, self._job, i, name, arguments))
+        return i
+
+    def results(self) -> List[Any]:
+        """Wait for every submitted call (each within its own timeout)."""
+        results = []
+        for i, (name, fut) in enumerate(zip(self._names, self._futures)):
+            # The timeout clock starts when the call actually starts running,
+            # so calls queued behind max_workers are not penalised.
+            while not fut.done():
+                start = self._started.get(i)
+                if start is None:
+                    wait([fut], timeout=0.05)
+                    continue
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait([fut], timeout=remaining)
+            if fut.done():
+                results.append(fut.result())
+            else:
+                fut.cancel()
+                results.append({"error": f"Tool {name} timed out after {self.timeout:g}s"})
+        return results
+
+    def close(self) -> None:
+        # Don't wait for timed-out threads; they finish in the background.
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "ToolExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def execute_tool_calls(
+    tool_calls,
+    dispatch: Callable[[str, Dict[str, Any]], Any],
+    timeout: float = DEFAULT_TIMEOUT,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> List[Any]:
+    """Run all tool calls concurrently and return their results in call order."""
+    if not tool_calls:
+        return []
+    with ToolExecutor(dispatch, timeout=timeout, max_workers=min(max_workers, len(tool_calls))) as ex:
+        for call in tool_calls:
+            ex.submit(call.function.name, call.function.arguments)
+        return ex.results()
+
+
+def run_tool_calls(
+    tool_calls,
+    dispatch: Callable[[str, Dict[str, Any]], Any],
+    timeout: float = DEFAULT_TIMEOUT,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> List[Dict[str, Any]]:
+    """Run all tool calls concurrently and return 'role: tool' messages in call order."""
+    results = execute_tool_calls(tool_calls, dispatch, timeout=timeout, max_workers=max_workers)
+    return [tool_message(call.id, call.function.name, result) for call, result in zip(tool_calls, results)]
@@ -0,0 +1,233 @@
+# Lesson 7 – Helper: Tool Registry
+#
+# GOAL
+# - Stop hand-writing the `tools` JSON list and the `if name == ... elif` chain
+#   in every script.
+# - Register a Python function once with @tool; its JSON schema is generated
+#   from the type hints and docstring, so it can't drift from the real signature.
+#
+# HOW IT WORKS
+# - @tool builds the function's schema ONCE, at import time.
+# - ToolRegistry collects tools, builds the `tools` payload once and keeps a
+#   pre-serialized JSON copy (tools_json) for anything that needs the raw text.
+# - Dispatch is a dict lookup: registry.call(name, args).
+# - Tool modules (weather_tool, wiki_tool, hn_tool) are imported lazily:
+#   registry.lazy("weather_tool", "get_weather") only imports the module the
+#   first time the payload or the tool is actually needed.
+# - ToolRegistry(breakers=ToolBreakers()) puts every call behind a per-tool
+#   circuit breaker (circuit_breaker.py): during an outage a tool answers at
+#   once with a stale result or {"error": "unavailable"}.
+#
+# USAGE
+#   registry = ToolRegistry()
+#
+#   @registry.tool
+#   def add(a: float, b: float) -> float:
+#       """Add two numbers and return the sum."""
+#       return a + b
+#
+#   registry.lazy("weather_tool", "get_weather")
+#   client.chat.completions.create(..., tools=registry.tools)
+#   result = registry.call("add", {"a": 1, "b": 2})
+#
+# DOCSTRINGS
+# - The first paragraph becomes the tool description.
+# - An "Args:" section (one "name: text" line per parameter) fills in the
+#   parameter descriptions.
+# - Extra JSON-schema keywords can be attached with Annotated, e.g.
+#   hits: Annotated[int, {"minimum": 1, "maximum": 30}] = 5
+# - A TypedDict becomes a nested object schema (see Location in weather_tool.py).
+
+import json, importlib, inspect
+from typing import (
+    Annotated, Any, Callable, Dict, List, Optional, Tuple, Union,
+    get_args, get_origin, get_type_hints, is_typeddict,
+)
+
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    tuple: "array",
+    dict: "object",
+}
+
+
+def _json_type(hint: Any) -> Dict[str, Any]:
+    """Translate one Python type hint into a JSON-schema fragment."""
+    origin = get_origin(hint)
+    if origin is Annotated:
+        base, *extras = get_args(hint)
+        schema = _json_type(base)
+        for extra in extras:
+            if isinstance(extra, dict):
+                schema.update(extra)
+        return schema
+    if origin is Union:
+        # Optional[X] -> X (the model may simply omit the argument)
+        args = [a for a in get_args(hint) if a is not type(None)]
+        return _json_type(args[0]) if len(args) == 1 else {}
+    if origin in (list, tuple):
+        args = get_args(hint)
+        schema = {"type": "array"}
+        if args and args[0] is not Ellipsis:
+            schema["items"] = _json_type(args[0])
+        return schema
+    if origin is dict:
+        return {"type": "object"}
+    if is_typeddict(hint):
+        # TypedDict -> object with one property per key
+        props = {k: _json_type(v) for k, v in get_type_hints(hint, include_extras=True).items()}
+        schema = {"type": "object", "properties": props}
+        if hint.__required_keys__:
+            schema["required"] = [k for k in props if k in hint.__required_keys__]
+        return schema
+    if hint in _JSON_TYPES:
+        return {"type": _JSON_TYPES[hint]}
+    return {}
+
+
+def _parse_docstring(doc: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """Split a docstring into (description, {param: description})."""
+    lines = inspect.cleandoc(doc or "").splitlines()
+    if "Args:" in lines:
+        cut = lines.index("Args:")
+        head, arg_lines = lines[:cut], lines[cut + 1:]
+    else:
+        head, arg_lines = lines, []
+    # Only the first paragraph is used as the tool description
+    first_para = []
+    for line in head:
+        if not line.strip():
+            if first_para:
+                break
+            continue
+        first_para.append(line.strip())
+    params: Dict[str, str] = {}
+    last = None
+    for line in arg_lines:
+        if not line.strip():
+            break
+        pname, sep, text = line.strip().partition(":")
+        if sep and " " not in pname.split("(")[0].strip():
+            last = pname.split("(")[0].strip()
+            params[last] = text.strip()
+        elif last:
+            params[last] += " " + line.strip()
+    return " ".join(first_para), params
+
+
+def schema_for(fn: Callable, name: Optional[str] = None, description: Optional[str] = None) -> Dict[str, Any]:
+    """Build the {"type": "function", ...} schema for fn from its signature."""
+    hints = get_type_hints(fn, include_extras=True)
+    doc_text, doc_params = _parse_docstring(fn.__doc__)
+    properties, required = {}, []
+    for pname, param in inspect.signature(fn).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        prop = _json_type(hints.get(pname, Any))
+        if pname in doc_params:
+            prop["description"] = doc_params[pname]
+        if param.default is inspect.Parameter.empty:
+            required.append(pname)
+        elif param.default is not None:
+            prop["default"] = param.default
+        properties[pname] = prop
+    parameters = {"type": "object", "properties": properties}
+    if required:
+        parameters["required"] = required
+    return {
+        "type": "function",
+        "function": {
+            "name": name or fn.__name__,
+            "description": description or doc_text,
+            "parameters": parameters,
+        },
+    }
+
+
+def tool(fn: Optional[Callable] = None, *, name: Optional[str] = None, description: Optional[str] = None):
+    """Mark fn as a tool and build its schema once (stored on fn.tool_schema)."""
+    def wrap(f: Callable) -> Callable:
+        f.tool_schema = schema_for(f, name=name, description=description)
+        return f
+    return wrap(fn) if fn is not None else wrap
+
+
+class ToolRegistry:
+    """A set of tools: cached `tools` payload plus dict-based dispatch."""
+
+    def __init__(self, breakers=None) -> None:
+        self.breakers = breakers  # optional circuit_breaker.ToolBreakers
+        self._funcs: Dict[str, Callable] = {}
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, str] = {}  # tool name -> module to import
+        self._tools: Optional[List[Dict[str, Any]]] = None
+        self._tools_json: Optional[str] = None
+
+    # ---- registration ----
+    def add(self, fn: Callable, name: Optional[str] = None) -> Callable:
+        schema = getattr(fn, "tool_schema", None) or schema_for(fn, name=name)
+        tool_name = name or schema["function"]["name"]
+        self._funcs[tool_name] = fn
+        self._schemas[tool_name] = schema
+        self._pending.pop(tool_name, None)
+        self._tools = self._tools_json = None
+        return fn
+
+    def tool(self, fn: Optional[Callable] = None, *, name: Optional[str] = None, description: Optional[str] = None):
+        """Decorator: @registry.tool or @registry.tool(name=..., description=...)."""
+        def wrap(f: Callable) -> Callable:
+            tool(f, name=name, description=description)
+            return self.add(f)
+        return wrap(fn) if fn is not None else wrap
+
+    def lazy(self, module: str, *names: str) -> "ToolRegistry":
+        """Register tools that live in `module` without importing it yet."""
+        for n in names:
+            self._pending[n] = module
+        self._tools = self._tools_json = None
+        return self
+
+    def _resolve(self, name: str) -> Optional[Callable]:
+        if name not in self._funcs and name in self._pending:
+            mod = importlib.import_module(self._pending[name])
+            self.add(getattr(mod, name), name=name)
+        return self._funcs.get(name)
+
+    # ---- payload ----
+    @property
+    def names(self) -> List[str]:
+        return list(self._funcs) + [n for n in self._pending if n not in self._funcs]
+
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        """The `tools=` payload for chat.completions.create (built once)."""
+        if self._tools is None:
+            for n in list(self._pending):
+                self._resolve(n)
+            self._tools = [self._schemas[n] for n in self._funcs]
+        return self._tools
+
+    @property
+    def tools_json(self) -> str:
+        """The same payload, serialized once."""
+        if self._tools_json is None:
+            self._tools_json = json.dumps(self.tools, separators=(",", ":"))
+        return self._tools_json
+
+    # ---- dispatch ----
+    def call(self, name: str, args: Dict[str, Any]) -> Any:
+        fn = self._resolve(name)
+        if fn is None:
+            return {"error": f"Unknown tool: {name}"}
+        if self.breakers is not None:
+            return self.breakers.call(name, fn, args)
+        return fn(**args)
+
+    __call__ = call
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._funcs or name in self._pending
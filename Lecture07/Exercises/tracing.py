@@ -0,0 +1,253 @@
+# Lesson 7 – Helper: Tracing Spans for the Tool-Calling Flow
+#
+# GOAL
+# - An answer took 6 seconds: was it the first model call, one of the tool
+#   HTTP requests, or the final model call? Tracing answers that. Each phase
+#   is wrapped in a SPAN that records its duration, payload sizes and retries;
+#   spans nest, so the slow part is easy to find.
+#
+# WHAT IS TRACED (once tracing.enable() was called)
+# - llm.create      each chat.completions.create (response_cache.CachedClient):
+#                   model, cache hit/miss, request/response bytes, tokens, retries
+# - llm.stream      reading a streamed response (streaming_tools.py), incl.
+#                   time to first chunk
+# - tool.<name>     each tool execution (tool_executor.py)
+# - http.get        each tool HTTP request (http_pool.py): host, status, bytes, retries
+# - json.decode / json.encode   tool arguments, API bodies, tool results
+# Scripts add their own phases, e.g. with tracing.span("phase.tools"): ...
+#
+# Disabled (the default), span() returns a shared no-op object, so the
+# instrumentation costs next to nothing.
+#
+# OUTPUT
+# - print_profile(): per-phase breakdown (span tree + totals per span name)
+# - export_jsonl(path): one JSON object per span
+# - export_otlp(path): OpenTelemetry OTLP/JSON ("resourceSpans"), which the
+#   OpenTelemetry Collector (file receiver) and tools like Jaeger can import
+#
+# USAGE
+#   import tracing
+#   tracing.enable()
+#   with tracing.span("answer", question=q):
+#       ...
+#   tracing.print_profile()
+#   tracing.export_jsonl("trace.jsonl")
+
+import sys, json, time, logging, secrets, threading
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+_enabled = False
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_finished: List["Span"] = []
+_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "thread")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class _NullSpan:
+    """What span() yields while tracing is disabled."""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class _SpanContext:
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]) -> None:
+        self._span = Span(name, _current.get(), attrs)
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        span = self._span
+        span.end_ns = time.time_ns()
+        if exc_type is not None:
+            span.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        with _lock:
+            _finished.append(span)
+
+
+def span(name: str, **attrs: Any):
+    """Context manager timing one phase; yields the span (set()/add() attributes)."""
+    if not _enabled:
+        return _NULL
+    return _SpanContext(name, attrs)
+
+
+def current() -> Any:
+    """The innermost open span (a no-op object when there is none)."""
+    return _current.get() or _NULL
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+# ---- retries made inside the OpenAI SDK (it logs them) ----
+class _RetryCounter(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        if isinstance(record.msg, str) and record.msg.startswith("Retrying request"):
+            current().add("retries")
+
+
+_retry_counter = _RetryCounter(logging.INFO)
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+    sdk_log = logging.getLogger("openai._base_client")
+    if _retry_counter not in sdk_log.handlers:
+        sdk_log.addHandler(_retry_counter)
+    if sdk_log.getEffectiveLevel() > logging.INFO:
+        sdk_log.setLevel(logging.INFO)
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def spans() -> List[Span]:
+    with _lock:
+        return list(_finished)
+
+
+def clear() -> None:
+    with _lock:
+        _finished.clear()
+
+
+# ---- output ----
+def export_jsonl(path: str, finished: Optional[List[Span]] = None) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for s in finished if finished is not None else spans():
+            f.write(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": value if isinstance(value, str) else json.dumps(value, default=str)}
+
+
+def export_otlp(path: str, finished: Optional[List[Span]] = None, service: str = "practical-ai") -> None:
+    """Write the spans as one OTLP/JSON document (ExportTraceServiceRequest)."""
+    otlp_spans = []
+    for s in finished if finished is not None else spans():
+        item = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+            "status": {"code": 2, "message": s.attrs["error"]} if "error" in s.attrs else {},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        otlp_spans.append(item)
+    doc = {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{"scope": {"name": "tracing.py"}, "spans": otlp_spans}],
+    }]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f)
+
+
+def _describe(s: Span) -> str:
+    keep = {k: v for k, v in s.attrs.items() if not isinstance(v, (dict, list))}
+    return " ".join(f"{k}={v}" for k, v in keep.items())
+
+
+def print_profile(finished: Optional[List[Span]] = None, file=sys.stderr, tree: bool = True) -> None:
+    """Per-phase breakdown: the span tree (if `tree`), then totals per span name."""
+    finished = finished if finished is not None else spans()
+    if not finished:
+        print("(no spans recorded)", file=file)
+        return
+    children: Dict[Optional[str], List[Span]] = {}
+    ids = {s.span_id for s in finished}
+    for s in sorted(finished, key=lambda s: s.start_ns):
+        parent = s.parent_id if s.parent_id in ids else None
+        children.setdefault(parent, []).append(s)
+
+    def walk(parent: Optional[str], depth: int) -> None:
+        for s in children.get(parent, []):
+            print(f"{'  ' * depth}{s.name:<{32 - 2 * depth}} {s.duration_ms:9.1f} ms  {_describe(s)}", file=file)
+            walk(s.span_id, depth + 1)
+
+    if tree:
+        print("\n=== Trace ===", file=file)
+        walk(None, 0)
+
+    totals: Dict[str, List[float]] = {}
+    for s in finished:
+        totals.setdefault(s.name, []).append(s.duration_ms)
+    roots = children.get(None, [])
+    wall = (max(s.end_ns or s.start_ns for s in roots) - min(s.start_ns for s in roots)) / 1e6
+    print("\n=== Time per phase ===", file=file)
+    print(f"{'span':<32} {'count':>5} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'% wall':>7}", file=file)
+    for name, ds in sorted(totals.items(), key=lambda kv: -sum(kv[1])):
+        share = 100 * sum(ds) / wall if wall else 0
+        print(f"{name:<32} {len(ds):>5} {sum(ds):10.1f} {sum(ds) / len(ds):9.1f} {max(ds):9.1f} {share:6.1f}%", file=file)
+    print("(spans overlap when work runs in parallel, so % can add up to more than 100)", file=file)
+
@@ -0,0 +1,425 @@
+# Lesson 7 – Helper: Token Usage and Throughput Accounting
+#
+# GOAL
+# - Every response carries `usage` (prompt, cached prompt and completion
+#   tokens), but nothing looked at it. Which feature spends the tokens: the
+#   24-message chat windows, the note summaries, the tool follow-up calls?
+#   And how fast do streamed answers actually arrive?
+#
+# WHAT IS RECORDED (per chat.completions.create that reaches the API)
+# - model, feature, session, prompt / cached / completion tokens, number of
+#   messages sent, latency and an estimated cost (PRICES)
+# - streams: time to first token (TTFT) and output tokens/sec
+# - calls whose prompt is larger than PROMPT_TOKEN_BUDGET (default 4000
+#   tokens) are flagged "over budget"
+#
+# HOW IT WORKS
+# - MeteredClient wraps OpenAI() / AsyncOpenAI(); use it exactly like the client.
+#   Put it INSIDE the response cache, so cache hits (free) are not counted:
+#     client = CachedClient(MeteredClient(OpenAI()))
+# - Streamed calls are sent with stream_options={"include_usage": True}; the
+#   API then reports usage in a last chunk, which is hidden from the caller
+#   (unless it asked for it). A stream closed early has no usage chunk; its
+#   tokens are estimated (~4 characters per token) and marked "estimated".
+# - Feature and session come from the innermost
+#     with usage_context(feature="note_summary", session=sid): ...
+#   or else from the wrapper (default: the script name and one id per process).
+#
+# OUTPUT
+# - meter.report(): totals by model, feature and session
+# - usage_panel(meter, session): the same as a Streamlit sidebar panel
+# - USAGE_LOG=usage.jsonl appends one JSON line per call; report over many
+#   runs and scripts with:  python usage_meter.py usage.jsonl
+# - USAGE_REPORT=1 prints the report of default_meter when the script exits
+
+import os, sys, json, time, uuid, atexit, argparse, threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Any, Deque, Dict, List, Optional
+from openai import AsyncOpenAI
+from result_compactor import estimate_tokens
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+SESSION_ID = uuid.uuid4().hex[:8]
+
+# USD per 1M tokens: (input, cached input, output). List prices when this was
+# written; check the current pricing page before trusting the totals.
+PRICES: Dict[str, tuple] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+}
+
+_labels: ContextVar[Dict[str, str]] = ContextVar("usage_labels", default={})
+
+
+@contextmanager
+def usage_context(**labels: Optional[str]):
+    """Attribute the calls made inside the block to a feature and/or session."""
+    token = _labels.set({**_labels.get(), **{k: v for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def estimate_cost(model: str, prompt: int, cached: int, completion: int) -> Optional[float]:
+    # Longest matching prefix, so "gpt-4o-mini-2024-07-18" is priced as gpt-4o-mini
+    name = max((n for n in PRICES if model.startswith(n)), key=len, default=None)
+    if name is None:
+        return None
+    p_in, p_cached, p_out = PRICES[name]
+    return ((prompt - cached) * p_in + cached * p_cached + completion * p_out) / 1e6
+
+
+@dataclass
+class CallRecord:
+    model: str
+    feature: str
+    session: str
+    messages: int
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    latency_s: float = 0.0
+    stream: bool = False
+    ttft_s: Optional[float] = None
+    output_tps: Optional[float] = None
+    cost: Optional[float] = None
+    over_budget: bool = False
+    estimated: bool = False
+    error: Optional[str] = None
+    time: float = 0.0
+
+
+_TOTAL_FIELDS = ("calls", "errors", "prompt_tokens", "cached_tokens", "completion_tokens", "cost",
+                 "latency_s", "streams", "ttft_s", "stream_tokens", "stream_gen_s", "over_budget", "max_prompt")
+
+
+class UsageMeter:
+    """Collects CallRecords and keeps running totals per (model, feature, session)."""
+
+    def __init__(self, prompt_budget: int = PROMPT_TOKEN_BUDGET, log_path: Optional[str] = None,
+                 keep: int = 1000) -> None:
+        self.prompt_budget = prompt_budget
+        self.log_path = log_path
+        self.recent: Deque[CallRecord] = deque(maxlen=keep)
+        self._totals: Dict[tuple, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: CallRecord, log: bool = True) -> None:
+        record.over_budget = record.prompt_tokens > self.prompt_budget
+        with self._lock:
+            self.recent.append(record)
+            t = self._totals.setdefault((record.model, record.feature, record.session),
+                                        dict.fromkeys(_TOTAL_FIELDS, 0))
+            t["calls"] += 1
+            t["errors"] += record.error is not None
+            t["prompt_tokens"] += record.prompt_tokens
+            t["cached_tokens"] += record.cached_tokens
+            t["completion_tokens"] += record.completion_tokens
+            t["cost"] += record.cost or 0
+            t["latency_s"] += record.latency_s
+            t["over_budget"] += record.over_budget
+            t["max_prompt"] = max(t["max_prompt"], record.prompt_tokens)
+            if record.ttft_s is not None:
+                t["streams"] += 1
+                t["ttft_s"] += record.ttft_s
+                t["stream_tokens"] += record.completion_tokens
+                t["stream_gen_s"] += record.latency_s - record.ttft_s
+            if log and self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(record)) + "\n")
+
+    def load(self, path: str) -> "UsageMeter":
+        """Add the records of a USAGE_LOG file (e.g. written by several scripts)."""
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.add(CallRecord(**json.loads(line)), log=False)
+        return self
+
+    def summary(self, by: str = "feature", session: Optional[str] = None) -> List[Dict[str, Any]]:
+        """One row per model / feature / session (`by`), most expensive first."""
+        index = {"model": 0, "feature": 1, "session": 2}[by]
+        groups: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for key, t in self._totals.items():
+                if session is not None and key[2] != session:
+                    continue
+                g = groups.setdefault(key[index], dict.fromkeys(_TOTAL_FIELDS, 0))
+                for name in _TOTAL_FIELDS:
+                    g[name] = max(g[name], t[name]) if name == "max_prompt" else g[name] + t[name]
+        rows = []
+        for name, g in groups.items():
+            rows.append({
+                by: name,
+                "calls": int(g["calls"]),
+                "prompt": int(g["prompt_tokens"]),
+                "cached": int(g["cached_tokens"]),
+                "completion": int(g["completion_tokens"]),
+                "cost_usd": round(g["cost"], 4),
+                "avg_latency_s": round(g["latency_s"] / g["calls"], 2),
+                "avg_ttft_s": round(g["ttft_s"] / g["streams"], 2) if g["streams"] else None,
+                "output_tok_s": round(g["stream_tokens"] / g["stream_gen_s"], 1) if g["stream_gen_s"] > 0 else None,
+                "max_prompt": int(g["max_prompt"]),
+                "over_budget": int(g["over_budget"]),
+                "errors": int(g["errors"]),
+            })
+        return sorted(rows, key=lambda r: (-r["cost_usd"], -r["prompt"]))
+
+    def over_budget(self, session: Optional[str] = None) -> List[CallRecord]:
+        """Recent calls whose prompt exceeded the budget."""
+        with self._lock:
+            return [r for r in self.recent if r.over_budget and (session is None or r.session == session)]
+
+    def report(self, file=sys.stderr, session: Optional[str] = None) -> None:
+        for by in ("model", "feature", "session"):
+            rows = self.summary(by, session)
+            if not rows:
+                print("(no model calls recorded)", file=file)
+                return
+            print(f"\n=== Usage by {by} ===", file=file)
+            print(f"{by:<24} {'calls':>5} {'prompt':>9} {'cached':>8} {'compl.':>8} {'cost $':>9} "
+                  f"{'latency':>8} {'ttft':>6} {'tok/s':>6} {'>budget':>7}", file=file)
+            for r in rows:
+                ttft = f"{r['avg_ttft_s']:.2f}" if r["avg_ttft_s"] is not None else "-"
+                tps = f"{r['output_tok_s']:.0f}" if r["output_tok_s"] is not None else "-"
+                print(f"{str(r[by])[:24]:<24} {r['calls']:>5} {r['prompt']:>9} {r['cached']:>8} {r['completion']:>8} "
+                      f"{r['cost_usd']:>9.4f} {r['avg_latency_s']:>7.2f}s {ttft:>6} {tps:>6} {r['over_budget']:>7}",
+                      file=file)
+        flagged = self.over_budget(session)
+        if flagged:
+            worst = max(flagged, key=lambda r: r.prompt_tokens)
+            print(f"\n{len(flagged)} call(s) over the {self.prompt_budget}-token prompt budget; largest: "
+                  f"{worst.prompt_tokens} tokens, {worst.messages} messages ({worst.feature})", file=file)
+
+
+default_meter = UsageMeter(log_path=os.getenv("USAGE_LOG"))
+if os.getenv("USAGE_REPORT"):
+    atexit.register(default_meter.report)
+
+
+# ---- the client wrapper ----
+class _Call:
+    """Measures one create() call and turns it into a CallRecord."""
+
+    def __init__(self, owner: "MeteredClient", kwargs: Dict[str, Any]) -> None:
+        labels = _labels.get()
+        self.meter = owner.meter
+        self.kwargs = kwargs
+        self.stream = bool(kwargs.get("stream"))
+        # Ask for the usage chunk, and hide it again if the caller did not
+        self.hide_usage = self.stream and "stream_options" not in kwargs
+        if self.hide_usage:
+            self.kwargs = dict(kwargs, stream_options={"include_usage": True})
+        self.record = CallRecord(
+            model=str(kwargs.get("model")),
+            feature=labels.get("feature", owner.feature),
+            session=labels.get("session", owner.session),
+            messages=len(kwargs.get("messages") or []),
+            stream=self.stream,
+            time=time.time(),
+        )
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.usage = None
+        self.streamed_chars = 0
+        self.done = False
+
+    def on_chunk(self, chunk) -> bool:
+        """Track a streamed chunk; False if it is the hidden usage chunk."""
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return not self.hide_usage
+        delta = chunk.choices[0].delta
+        text = (delta.content or "") + "".join((c.function.arguments or "") if c.function else ""
+                                               for c in delta.tool_calls or [])
+        if text and self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.streamed_chars += len(text)
+        return True
+
+    def finish(self, usage=None, error: Optional[BaseException] = None) -> None:
+        if self.done:
+            return
+        self.done = True
+        r = self.record
+        r.latency_s = round(time.perf_counter() - self.started, 4)
+        usage = usage or self.usage
+        if error is not None:
+            r.error = f"{type(error).__name__}: {error}"
+        elif usage is not None:
+            r.prompt_tokens = usage.prompt_tokens or 0
+            r.completion_tokens = usage.completion_tokens or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            r.cached_tokens = (details.cached_tokens or 0) if details is not None else 0
+        else:
+            # Stream closed before the usage chunk: estimate
+            r.estimated = True
+            r.prompt_tokens = estimate_tokens(self.kwargs.get("messages") or [])
+            r.completion_tokens = self.streamed_chars // 4
+        if self.first_token is not None:
+            r.ttft_s = round(self.first_token - self.started, 4)
+            generating = time.perf_counter() - self.first_token
+            if generating > 0 and r.completion_tokens:
+                r.output_tps = round(r.completion_tokens / generating, 1)
+        r.cost = estimate_cost(r.model, r.prompt_tokens, r.cached_tokens, r.completion_tokens)
+        self.meter.add(r)
+
+
+class _MeteredStream:
+    def __init__(self, stream, call: _Call) -> None:
+        self._stream = stream
+        self._call = call
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if self._call.on_chunk(chunk):
+                    yield chunk
+        except Exception as e:
+            self._call.finish(error=e)
+            raise
+        finally:
+            self._call.finish()  # also when the caller stops reading early
+
+    def close(self) -> None:
+        self._stream.close()
+        self._call.finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _AsyncMeteredStream:
+    def __init__(self, stream, call: _Call) -> None:
+        self._stream = stream
+        self._call = call
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                if self._call.on_chunk(chunk):
+                    yield chunk
+        except Exception as e:
+            self._call.finish(error=e)
+            raise
+        finally:
+            self._call.finish()  # also when the caller stops reading early
+
+    async def close(self) -> None:
+        await self._stream.close()
+        self._call.finish()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+class _MeteredCompletions:
+    def __init__(self, owner: "MeteredClient") -> None:
+        self._owner = owner
+
+    def create(self, **kwargs: Any):
+        return self._owner._create(kwargs)
+
+
+class _MeteredChat:
+    def __init__(self, owner: "MeteredClient") -> None:
+        self.completions = _MeteredCompletions(owner)
+
+
+class MeteredClient:
+    """Drop-in wrapper around OpenAI() / AsyncOpenAI() that records the usage of chat.completions.create."""
+
+    def __init__(self, client, meter: Optional[UsageMeter] = None, feature: Optional[str] = None,
+                 session: Optional[str] = None) -> None:
+        self._client = client
+        self.meter = meter or default_meter
+        self.feature = feature or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+        self.session = session or SESSION_ID
+        self.is_async = isinstance(client, AsyncOpenAI)
+        self.chat = _MeteredChat(self)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def _create(self, kwargs: Dict[str, Any]):
+        if self.is_async:
+            return self._acreate(kwargs)
+        call = _Call(self, kwargs)
+        try:
+            resp = self._client.chat.completions.create(**call.kwargs)
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        if call.stream:
+            return _MeteredStream(resp, call)
+        call.finish(resp.usage)
+        return resp
+
+    async def _acreate(self, kwargs: Dict[str, Any]):
+        call = _Call(self, kwargs)
+        try:
+            resp = await self._client.chat.completions.create(**call.kwargs)
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        if call.stream:
+            return _AsyncMeteredStream(resp, call)
+        call.finish(resp.usage)
+        return resp
+
+
+# ---- Streamlit ----
+def usage_panel(meter: UsageMeter, session: Optional[str] = None, title: str = "Usage") -> None:
+    """Sidebar panel: this session's tokens, cost and speed per feature, plus all sessions.
+
+    Call it at the END of the app script, so it includes the calls of this run.
+    """
+    import streamlit as st
+
+    rows = meter.summary("feature", session)
+    with st.sidebar:
+        st.divider()
+        st.subheader(title)
+        if not rows:
+            st.caption("No model calls yet.")
+            return
+        calls = sum(r["calls"] for r in rows)
+        cols = st.columns(3)
+        cols[0].metric("Calls", calls)
+        cols[1].metric("Tokens", f"{sum(r['prompt'] + r['completion'] for r in rows):,}")
+        cols[2].metric("Cost", f"${sum(r['cost_usd'] for r in rows):.4f}")
+        ttfts = [r["avg_ttft_s"] for r in rows if r["avg_ttft_s"] is not None]
+        if ttfts:
+            st.caption(f"Avg. time to first token: {sum(ttfts) / len(ttfts):.2f}s")
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        flagged = meter.over_budget(session)
+        if flagged:
+            worst = max(flagged, key=lambda r: r.prompt_tokens)
+            st.warning(f"{len(flagged)} call(s) over the {meter.prompt_budget}-token prompt budget "
+                       f"(largest: {worst.prompt_tokens} tokens, {worst.messages} messages, {worst.feature}).")
+        if session is not None:
+            with st.expander("All sessions"):
+                st.dataframe(meter.summary("session"), hide_index=True, use_container_width=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Usage report from one or more USAGE_LOG files.")
+    parser.add_argument("logs", nargs="+", help="JSONL files written with USAGE_LOG=...")
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET, help="prompt token budget")
+    args = parser.parse_args()
+    meter = UsageMeter(prompt_budget=args.budget)
+    for path in args.logs:
+        meter.load(path)
+    meter.report(file=sys.stdout)
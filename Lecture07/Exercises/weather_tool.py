@@ -0,0 +1,194 @@
+# Lesson 7 – Shared Tool: get_weather (Open-Meteo, no API key)
+#
+# Used by 02_weather_tool_open_meteo.py and 05_cli_tools_assistant.py.
+# Register it in a script with:
+#   registry.lazy("weather_tool", "get_weather")
+#
+# CACHING
+# - The model asks about the same few cities all day, each time with slightly
+#   different coordinates (47.6062 vs 47.61). Coordinates are snapped to a grid
+#   (WEATHER_GRID degrees, default 0.05 ≈ 5 km) and each grid cell is cached.
+# - Entries are fresh for WEATHER_CACHE_TTL seconds (default 900 = Open-Meteo's
+#   15-minute refresh of current conditions). For WEATHER_STALE_TTL more seconds
+#   (default 300, at most 900) the old value is served while a background
+#   refresh runs. The window is kept short because the hourly forecast starts
+#   at the hour it was fetched: an hour-old entry would be off by an hour.
+# - Concurrent misses for the same cell share one Open-Meteo request.
+# - weather_cache.stats() reports hits/misses.
+#
+# PROJECTION
+# - The tool only ever returns the next MAX_HOURS hourly temperatures, so we ask
+#   Open-Meteo for exactly that (forecast_hours, HOURLY_FIELDS) instead of
+#   downloading several days of hourly data and throwing most of it away.
+#
+# SEVERAL CITIES AT ONCE
+# - get_weather_batch(locations) answers "weather in Seattle, Austin and Boston"
+#   with ONE Open-Meteo request (comma-separated latitude/longitude lists)
+#   instead of one get_weather call per city. It uses the same per-cell cache
+#   as get_weather (weather_cache.get_or_load_many): fresh and stale cells are
+#   answered from it, and the missing cells share that one request with any
+#   get_weather call already loading them.
+# - If the request fails, each place is reported on its own: a cell with an
+#   older cached forecast gets it, marked "stale": true; the others get an
+#   {"error": ...}. Only when no place got any weather is the error raised
+#   (so the circuit breaker sees the outage).
+#
+# PLACE NAMES
+# - Both tools take a city name instead of coordinates ("Portland, ME"),
+#   resolved offline by the gazetteer (gazetteer.py) in microseconds, so the
+#   model never has to guess lat/lon. Results carry a "place" label; for a
+#   coordinate it is the nearest known city (KD-tree reverse lookup).
+
+import os
+import http_pool
+import gazetteer
+from typing import Annotated, List, Optional, Tuple, TypedDict
+from tool_registry import tool
+from tool_cache import TTLCache
+
+# OPEN_METEO_BASE_URL points the tool at another server, e.g. fake_services.py
+FORECAST_URL = os.getenv("OPEN_METEO_BASE_URL", "https://api.open-meteo.com").rstrip("/") + "/v1/forecast"
+GRID = float(os.getenv("WEATHER_GRID", "0.05"))
+# Projection: what this tool needs from upstream
+MAX_HOURS = 24
+HOURLY_FIELDS = ["temperature_2m"]
+# A coordinate this close to a known city is labelled with the city's name
+NEAR_KM = 30
+# Longest a stale forecast may still be served (see CACHING)
+MAX_STALE_TTL = 900
+
+weather_cache = TTLCache(
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "900")),
+    stale_ttl=min(float(os.getenv("WEATHER_STALE_TTL", "300")), MAX_STALE_TTL),
+)
+
+
+def snap(lat: float, lon: float, grid: float = GRID) -> Tuple[float, float]:
+    """Snap a coordinate to the cache grid (the cache key)."""
+    if grid <= 0:
+        return (round(lat, 4), round(lon, 4))
+    return (round(round(lat / grid) * grid, 4), round(round(lon / grid) * grid, 4))
+
+
+class Location(TypedDict, total=False):
+    name: str
+    lat: float
+    lon: float
+
+
+def locate(lat: Optional[float], lon: Optional[float], place: Optional[str]) -> dict:
+    """-> {"lat", "lon", "place"} from a coordinate or a place name, or {"error": ...}."""
+    if lat is not None and lon is not None:
+        near = gazetteer.default().nearest(lat, lon)
+        if near and near[0]["distance_km"] <= NEAR_KM:
+            label = gazetteer.label(near[0])
+        elif near:
+            label = f"{near[0]['distance_km']:.0f} km from {gazetteer.label(near[0])}"
+        else:
+            label = f"{lat:.2f}, {lon:.2f}"
+        return {"lat": lat, "lon": lon, "place": label}
+    if not place:
+        return {"error": "Give either a place name or lat and lon"}
+    found = gazetteer.resolve(place)
+    if found is None:
+        where = " in that state or country" if "," in place else ""
+        return {"error": f"Unknown place: {place} (no known city of that name{where}); pass lat and lon instead"}
+    return {"lat": found["lat"], "lon": found["lon"], "place": gazetteer.label(found)}
+
+
+def _compact(data: dict) -> dict:
+    # Keep only what we need so cached entries stay small
+    return {
+        "latitude": data.get("latitude"),
+        "longitude": data.get("longitude"),
+        "timezone": data.get("timezone"),
+        "current_weather": data.get("current_weather", {}),
+        "hourly_temperature_2m": data.get("hourly", {}).get("temperature_2m", [])[:MAX_HOURS],
+    }
+
+
+def _fetch_many(coords: List[Tuple[float, float]]) -> List[dict]:
+    """One forecast request for one or more coordinates."""
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in coords),
+        "longitude": ",".join(str(lon) for _, lon in coords),
+        "current_weather": "true",
+        "hourly": ",".join(HOURLY_FIELDS),
+        "forecast_hours": MAX_HOURS,
+    }
+    r = http_pool.get(FORECAST_URL, params=params)
+    r.raise_for_status()
+    data = http_pool.read_json(r)
+    # Open-Meteo returns one object for one location, a list for several
+    items = data if isinstance(data, list) else [data]
+    return [_compact(d) for d in items]
+
+
+def _fetch(lat: float, lon: float) -> dict:
+    return _fetch_many([(lat, lon)])[0]
+
+
+@tool
+def get_weather(
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    hours: Annotated[int, {"minimum": 1, "maximum": MAX_HOURS}] = 6,
+    place: Optional[str] = None,
+) -> dict:
+    """Get current weather and short forecast for a city name or a coordinate.
+
+    Args:
+        lat: Latitude (not needed when place is given)
+        lon: Longitude (not needed when place is given)
+        hours: How many upcoming hourly temperatures to include
+        place: City name, optionally with state or country, e.g. "Portland, ME"; looked up offline
+    """
+    where = locate(lat, lon, place)
+    if "error" in where:
+        return where
+    key = snap(where["lat"], where["lon"])
+    data = weather_cache.get_or_load(key, lambda: _fetch(*key))
+    # Return only what we need to keep the tool's response compact
+    return {"place": where["place"], **data, "hourly_temperature_2m": data["hourly_temperature_2m"][:hours]}
+
+
+@tool
+def get_weather_batch(
+    locations: Annotated[List[Location], {"minItems": 1, "maxItems": 20}],
+    hours: Annotated[int, {"minimum": 1, "maximum": MAX_HOURS}] = 6,
+) -> list:
+    """Get current weather and short forecast for several places in one request.
+
+    Args:
+        locations: Places to look up, each {"name": "Austin, TX"} (looked up offline) or {"lat": ..., "lon": ..., "name": optional label}
+        hours: How many upcoming hourly temperatures to include per place
+    """
+    wheres = [locate(loc.get("lat"), loc.get("lon"), loc.get("name")) for loc in locations]
+    keys = [snap(w["lat"], w["lon"]) if "error" not in w else None for w in wheres]
+    loaded = weather_cache.get_or_load_many([k for k in keys if k is not None], _fetch_many)
+    results, served, first_error = [], 0, None
+    for loc, where, k in zip(locations, wheres, keys):
+        if k is None:
+            results.append({"name": loc.get("name"), **where})
+            continue
+        data, error = loaded[k]
+        stale = False
+        if error is not None:
+            first_error = first_error or error
+            data = weather_cache.peek(k)  # an expired forecast beats none
+            if data is None:
+                item = {"place": where["place"], "error": f"Weather unavailable: {type(error).__name__}: {error}"}
+                results.append({"name": loc["name"], **item} if loc.get("name") else item)
+                continue
+            stale = True
+        served += 1
+        item = {"place": where["place"], **data, "hourly_temperature_2m": data["hourly_temperature_2m"][:hours]}
+        if stale:
+            item["stale"] = True
+        if loc.get("name"):
+            item = {"name": loc["name"], **item}
+        results.append(item)
+    if first_error is not None and not served:
+        raise first_error
+    return results
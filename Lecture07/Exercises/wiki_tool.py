@@ -0,0 +1,85 @@
+# Lesson 7 – Shared Tool: wiki_summary (Wikipedia REST API, no API key)
+#
+# Used by 05_cli_tools_assistant.py and 06_homework_wikipedia_template.py.
+# Register it in a script with:
+#   registry.lazy("wiki_tool", "wiki_summary")
+#
+# Docs: https://en.wikipedia.org/api/rest_v1/#/Page%20content/get_page_summary__title_
+#
+# CACHING
+# - Results are kept in a SQLite file (see sqlite_cache.py), so they survive
+#   between runs of the CLI scripts. The key is the normalized title
+#   ("  seattle " and "Seattle" share one entry).
+# - We store the compact {title, summary, url} result plus the ETag /
+#   Last-Modified headers. After WIKI_CACHE_TTL seconds (default 1 day) the
+#   entry is revalidated with If-None-Match / If-Modified-Since; a
+#   "304 Not Modified" answer costs no download.
+# - 404s are cached too, for a shorter WIKI_NOT_FOUND_TTL (default 1 hour).
+
+import os
+from urllib.parse import quote
+import http_pool
+from tool_registry import tool
+from sqlite_cache import SQLiteCache
+
+# WIKIPEDIA_BASE_URL points the tool at another server, e.g. fake_services.py
+SUMMARY_URL = os.getenv("WIKIPEDIA_BASE_URL", "https://en.wikipedia.org").rstrip("/") + "/api/rest_v1/page/summary/"
+CACHE_TTL = float(os.getenv("WIKI_CACHE_TTL", "86400"))
+NOT_FOUND_TTL = float(os.getenv("WIKI_NOT_FOUND_TTL", "3600"))
+
+wiki_cache = SQLiteCache("wiki_summary", max_entries=int(os.getenv("WIKI_CACHE_SIZE", "5000")))
+wiki_stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+
+def normalize_title(title: str) -> str:
+    """Wikipedia-style title: single underscores, first letter upper-case."""
+    t = "_".join(title.replace("_", " ").split())
+    return t[:1].upper() + t[1:]
+
+
+@tool
+def wiki_summary(title: str) -> dict:
+    """Get a concise encyclopedia summary for a topic title.
+
+    Args:
+        title: Wikipedia article title, e.g. "Seattle"
+    """
+    key = normalize_title(title)
+    cached, meta, fresh = wiki_cache.get(key)
+    if cached is not None and fresh:
+        wiki_stats["hits"] += 1
+        return cached
+
+    headers = {"accept": "application/json"}
+    if cached is not None:
+        # Stale entry: ask the server whether it changed
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = http_pool.get(SUMMARY_URL + quote(key, safe=""), headers=headers)
+    if r.status_code == 304 and cached is not None:
+        wiki_stats["revalidated"] += 1
+        wiki_cache.touch(key, CACHE_TTL)
+        return cached
+
+    wiki_stats["misses"] += 1
+    if r.status_code == 404:
+        result = {"title": title, "summary": None, "url": None}
+        wiki_cache.set(key, result, ttl=NOT_FOUND_TTL)
+        return result
+    r.raise_for_status()
+    d = http_pool.read_json(r)
+    result = {
+        "title": d.get("title"),
+        "summary": d.get("extract"),
+        "url": d.get("content_urls", {}).get("desktop", {}).get("page")
+    }
+    meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    wiki_cache.set(key, result, ttl=CACHE_TTL, meta=meta)
+    # Redirects ("new york city" -> "New York City"): also cache the canonical title
+    canonical = normalize_title(result["title"] or "")
+    if canonical and canonical != key:
+        wiki_cache.set(canonical, result, ttl=CACHE_TTL, meta=meta)
+    return result
@@ -4,6 +4,7 @@
 # Run with: streamlit run 04_chat_history_session_state.py
 
 import streamlit as st
+from chat_history import render_history
 
 st.set_page_config(page_title="Exercise 4 — Chat History", page_icon="💬", layout="wide")
 st.title("Exercise 4 — Chat History with session_state")
@@ -12,12 +13,9 @@ st.title("Exercise 4 — Chat History with session_state")
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "assistant", "content": "Hi! Ask me anything about your studies."}]
 
-# Render chat history
-for m in st.session_state.messages:
-    if m["role"] == "user":
-        st.chat_message("user").write(m["content"])
-    else:
-        st.chat_message("assistant").write(m["content"])
+# Render chat history: the newest messages, older ones behind "Load earlier"
+# (a plain loop over all messages gets slow once the chat is long)
+render_history(st.session_state.messages)
 
 # Chat input (bottom)
 if prompt := st.chat_input("Type your message"):
@@ -10,10 +10,24 @@
 #    Windows (PowerShell): setx OPENAI_API_KEY "sk-..."
 #
 # Security note: **Never** hardcode secrets into code or commit them.
+#
+# The answer is streamed (stream=True): it is typed out as it arrives instead of
+# appearing all at once after the full generation (see chat_stream.py).
+# The prompt is kept within a token budget (see context_window.py).
 
 import os
+import sys
+import uuid
+from pathlib import Path
 import streamlit as st
 from openai import OpenAI
+from chat_stream import stream_answer
+from context_window import ContextWindow
+from chat_history import render_history
+
+# Reuse the helpers built in Lesson 7 (token usage meter, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Lecture07" / "Exercises"))
+from usage_meter import MeteredClient, default_meter, usage_panel
 
 st.set_page_config(page_title="Exercise 5 — ChatGPT Integration", page_icon="🔌", layout="wide")
 st.title("Exercise 5 — ChatGPT Integration (Chat Completions)")
@@ -30,45 +44,52 @@ if os.getenv("OPENAI_API_KEY"):
 else:
     st.sidebar.error("OPENAI_API_KEY not set. See comments at the top of this file.")
 
-# Initialize OpenAI client (reads key from env var)
-client = OpenAI()
+# One id per browser session, so the usage panel can show "this session"
+if "usage_session" not in st.session_state:
+    st.session_state.usage_session = uuid.uuid4().hex[:8]
+
+# Initialize OpenAI client (reads key from env var); every call's tokens are recorded
+client = MeteredClient(OpenAI(), feature="chat", session=st.session_state.usage_session)
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "system", "content": "You are a helpful study assistant for high school students."}]
+# System prompt + summary of older turns + the newest turns, within a token budget
+if "context" not in st.session_state:
+    st.session_state.context = ContextWindow()
 
-# Render chat history (skip system)
-for m in st.session_state.messages:
-    if m["role"] == "user":
-        st.chat_message("user").write(m["content"])
-    elif m["role"] == "assistant":
-        st.chat_message("assistant").write(m["content"])
+# Render chat history (skip system; newest page only, older messages on demand)
+render_history(st.session_state.messages)
 
 # Chat input
 if user_input := st.chat_input("Ask a study question"):
     st.session_state.messages.append({"role": "user", "content": user_input})
     st.chat_message("user").write(user_input)
 
-    try:
-        # Call the Chat Completions API
-        # Reference: https://platform.openai.com/docs/api-reference/chat
-        resp = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            messages=[
-                # Only send the last ~20 messages to keep context small/cost low
-                *st.session_state.messages[-20:]
-            ],
-        )
-        assistant_text = resp.choices[0].message.content
-    except Exception as e:
-        assistant_text = f"API error: {e}"
-
-    st.session_state.messages.append({"role": "assistant", "content": assistant_text})
-    st.chat_message("assistant").write(assistant_text)
+    with st.chat_message("assistant"):
+        try:
+            # Call the Chat Completions API and stream the answer into this message;
+            # stream_answer() appends it to the history when it is complete
+            # Reference: https://platform.openai.com/docs/api-reference/chat
+            stream_answer(
+                client,
+                st.session_state.messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                # Only send what fits the token budget to keep context small/cost low
+                messages=st.session_state.context.build(st.session_state.messages, client),
+            )
+        except Exception as e:
+            assistant_text = f"API error: {e}"
+            st.session_state.messages.append({"role": "assistant", "content": assistant_text})
+            st.write(assistant_text)
 
 # Clear chat
 if st.button("Clear chat"):
     st.session_state.messages = [{"role": "system", "content": "You are a helpful study assistant."}]
+    st.session_state.context.reset()
     st.rerun()
+
+# Tokens, cost and speed of the calls so far (last, so it includes this run's call)
+usage_panel(default_meter, st.session_state.usage_session)
@@ -2,11 +2,26 @@
 # -----------------------------------------------------
 # Goal: Build a study Q&A assistant with sidebar settings, chat history, and helpful prompts.
 # Run with: streamlit run 06_study_assistant_app.py
+# Answers are streamed into the chat as they are generated (chat_stream.py);
+# sending a new question while one is streaming stops the old answer.
+# Each request stays within a token budget: system prompt, a running summary of
+# older turns and the newest turns (context_window.py).
 
 import os
+import sys
+import uuid
 from datetime import datetime
+from pathlib import Path
 import streamlit as st
 from openai import OpenAI
+from near_duplicate_cache import NearDuplicateCache, context_key
+from chat_stream import stream_answer
+from context_window import ContextWindow
+from chat_history import render_history
+
+# Reuse the helpers built in Lesson 7 (token usage meter, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Lecture07" / "Exercises"))
+from usage_meter import MeteredClient, default_meter, usage_panel
 
 # ---- Page & Sidebar ----
 st.set_page_config(page_title="Study Assistant — Lesson 8", page_icon="📚", layout="wide")
@@ -28,6 +43,8 @@ with st.sidebar:
         height=100,
     )
     show_timestamps = st.checkbox("Show timestamps", True)
+    use_answer_cache = st.checkbox("Reuse answers to similar questions", False)
+    similarity_threshold = st.slider("Similarity needed to reuse an answer", 0.5, 1.0, 0.85, 0.05)
     st.divider()
     st.caption("API key must be set in the environment variable OPENAI_API_KEY.")
     if os.getenv("OPENAI_API_KEY"):
@@ -35,55 +52,76 @@ with st.sidebar:
     else:
         st.error("OPENAI_API_KEY not set")
 
-client = OpenAI()
+# One id per browser session, so the usage panel can show "this session"
+if "usage_session" not in st.session_state:
+    st.session_state.usage_session = uuid.uuid4().hex[:8]
+
+# Every call's tokens and latency are recorded (see the "Usage" sidebar panel)
+client = MeteredClient(OpenAI(), feature="chat_window", session=st.session_state.usage_session)
+
+# Shared by all sessions: re-worded versions of a question reuse the earlier answer
+@st.cache_resource
+def get_answer_cache():
+    return NearDuplicateCache(max_entries=5000)
+
+answer_cache = get_answer_cache()
 
 # ---- Session State ----
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "system", "content": system_prompt}]
+if "context" not in st.session_state:
+    st.session_state.context = ContextWindow()
 
 # Update system message dynamically if changed in the sidebar
 # (Replace the first system message content to keep history stable)
 if st.session_state.messages and st.session_state.messages[0]["role"] == "system":
     st.session_state.messages[0]["content"] = system_prompt
 
-# ---- Helper: render chat history (skip system) ----
-def render_history():
-    for m in st.session_state.messages[1:]:
-        if m["role"] == "user":
-            st.chat_message("user").write(m["content"])
-        elif m["role"] == "assistant":
-            if show_timestamps and "timestamp" in m:
-                st.chat_message("assistant").write(f"{m['content']}\n\n_{m['timestamp']}_")
-            else:
-                st.chat_message("assistant").write(m["content"])
+# ---- Helper: how a message is shown in the history ----
+def message_text(m):
+    if show_timestamps and m["role"] == "assistant" and "timestamp" in m:
+        return f"{m['content']}\n\n_{m['timestamp']}_"
+    return m["content"]
 
-render_history()
+# Only the newest page of messages is drawn on each rerun (chat_history.py)
+render_history(st.session_state.messages, text=message_text)
 
 # ---- Chat Input ----
 if prompt := st.chat_input("Ask a study question (math, science, programming, etc.)"):
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
 
-    try:
-        # Send only the recent window to control latency/cost
-        window = st.session_state.messages[-24:]
-        resp = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            messages=window,
-        )
-        answer = resp.choices[0].message.content
-    except Exception as e:
-        answer = f"API error: {e}"
-
     # Add metadata like a timestamp to the assistant message
-    st.session_state.messages.append({
-        "role": "assistant",
-        "content": answer,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    })
-    st.chat_message("assistant").write(answer)
+    meta = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+
+    # Answers are reused only for the same model and system prompt; a follow-up
+    # such as "another example" also needs the same last exchange, so it never
+    # gets an answer written for someone else's chat (near_duplicate_cache.py)
+    scope = (model, system_prompt, context_key(prompt, st.session_state.messages[:-1]))
+    hit = answer_cache.lookup(prompt, scope=scope, threshold=similarity_threshold) if use_answer_cache else None
+    with st.chat_message("assistant"):
+        if hit is not None:
+            st.session_state.messages.append({"role": "assistant", "content": hit.answer, **meta})
+            st.write(hit.answer)
+        else:
+            try:
+                # Send only what fits the token budget to control latency/cost; the answer
+                # is streamed into this message and appended to the history when complete
+                window = st.session_state.context.build(st.session_state.messages, client)
+                answer = stream_answer(
+                    client,
+                    st.session_state.messages,
+                    extra=meta,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    messages=window,
+                )
+                answer_cache.add(prompt, answer, scope=scope)
+            except Exception as e:
+                answer = f"API error: {e}"
+                st.session_state.messages.append({"role": "assistant", "content": answer, **meta})
+                st.write(answer)
 
 # ---- Tools/Shortcuts under the chat ----
 with st.expander("Helpful prompts for students"):
@@ -101,6 +139,7 @@ with st.expander("Helpful prompts for students"):
 cols = st.columns(3)
 if cols[0].button("Clear chat"):
     st.session_state.messages = [{"role": "system", "content": system_prompt}]
+    st.session_state.context.reset()
     st.rerun()
 if cols[1].button("Insert example question"):
     example = "Explain the difference between precision and recall with a tiny example."
@@ -109,3 +148,6 @@ if cols[1].button("Insert example question"):
 if cols[2].button("Copy latest answer to clipboard"):
     # Streamlit can't write to the OS clipboard directly; show instructions instead.
     st.toast("Select the answer text and press Ctrl/Cmd+C to copy.")
+
+# Tokens, cost and speed of the calls so far (last, so it includes this run's call)
+usage_panel(default_meter, st.session_state.usage_session)
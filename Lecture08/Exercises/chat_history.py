@@ -0,0 +1,75 @@
+# Lesson 8 – Helper: Paginated Chat History
+# -----------------------------------------
+# Goal: Streamlit runs the whole script again on every interaction (a slider
+# move, a submitted message), and a plain `for m in messages:` loop draws
+# every message again each time. After a few hundred messages each rerun is
+# visibly slow. render_history() keeps that cost flat:
+#
+# 1) Only the newest `page_size` messages are drawn. Older ones sit behind a
+#    "Load earlier messages" button that shows one more page per click.
+# 2) The history is a fragment (st.fragment, Streamlit >= 1.37;
+#    st.experimental_fragment before that): clicking "Load earlier" reruns
+#    just the history, not the whole app.
+# 3) When a new message arrives, the view goes back to the newest page.
+#
+# Usage:
+#   render_history(st.session_state.messages)                  # skips system messages
+#   render_history(msgs, text=lambda m: f"{m['content']}\n\n_{m['timestamp']}_")
+
+from typing import Any, Callable, Dict, List, Optional
+import streamlit as st
+
+PAGE_SIZE = 30
+
+# Fall back to a plain function call on Streamlit versions without fragments
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+
+def _show_more(key: str, page_size: int) -> None:
+    st.session_state[key] += page_size
+
+
+@_fragment
+def _history(
+    messages: List[Dict[str, Any]],
+    page_size: int,
+    key: str,
+    text: Optional[Callable[[Dict[str, Any]], str]],
+) -> None:
+    shown_key, seen_key = f"{key}_shown", f"{key}_seen"
+    # Back to the newest page when the conversation grew or was cleared
+    if st.session_state.get(seen_key) != len(messages):
+        st.session_state[seen_key] = len(messages)
+        st.session_state[shown_key] = page_size
+
+    # Walk back from the newest message; only the visible ones are drawn
+    visible: List[Dict[str, Any]] = []
+    hidden = 0
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i]["role"] not in ("user", "assistant"):
+            continue
+        if len(visible) < st.session_state[shown_key]:
+            visible.append(messages[i])
+        else:
+            hidden = sum(1 for m in messages[: i + 1] if m["role"] in ("user", "assistant"))
+            break
+
+    if hidden:
+        st.button(
+            f"Load earlier messages ({hidden} more)",
+            key=f"{key}_more",
+            on_click=_show_more,
+            args=(shown_key, page_size),
+        )
+    for m in reversed(visible):
+        st.chat_message(m["role"]).write(text(m) if text else m["content"])
+
+
+def render_history(
+    messages: List[Dict[str, Any]],
+    page_size: int = PAGE_SIZE,
+    key: str = "history",
+    text: Optional[Callable[[Dict[str, Any]], str]] = None,
+) -> None:
+    """Draw the newest `page_size` user/assistant messages; older ones behind "Load earlier"."""
+    _history(messages, page_size, key, text)
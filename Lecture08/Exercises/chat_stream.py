@@ -0,0 +1,87 @@
+# Lesson 8 – Helper: Streaming Answers into the Chat
+# -------------------------------------------------
+# Goal: Without streaming, the user looks at a spinner until the whole answer
+# (up to max_tokens) has been generated. With stream=True the first words show
+# up after the time-to-first-token and the rest is typed out as it arrives.
+#
+# How it works:
+# 1) chat.completions.create(stream=True) returns the answer in chunks.
+# 2) TextStream turns the chunks into text pieces (and remembers them).
+# 3) st.write_stream() renders the pieces into the current container, e.g.
+#    inside `with st.chat_message("assistant"):`, and returns the full text.
+# 4) The assistant message is appended to the history once, when the stream
+#    has finished.
+#
+# Cancellation: when the user sends a new message (or presses a button) while
+# an answer is streaming, Streamlit stops the running script and reruns it.
+# stream_answer() then closes the HTTP stream, so the model stops generating
+# (and billing) right away, and keeps the part that already arrived in the
+# history, marked as stopped, so the conversation still reads in order.
+#
+# Usage:
+#   with st.chat_message("assistant"):
+#       answer = stream_answer(client, st.session_state.messages,
+#                              model=model, messages=window)
+
+from typing import Any, Dict, Iterator, List, Optional
+import streamlit as st
+
+try:
+    from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+except ImportError:  # Streamlit < 1.38
+    from streamlit.runtime.scriptrunner import RerunException, StopException
+
+# Appended to an answer that was cut off by a rerun
+STOPPED_MARK = " … _(stopped)_"
+# How Streamlit (or Ctrl+C) ends a running script; none of them is an Exception
+STOPPED = (StopException, RerunException, KeyboardInterrupt, GeneratorExit)
+
+
+class TextStream:
+    """The text pieces of a streamed chat completion; `.text` is what arrived so far."""
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._parts: List[str] = []
+        self.finished = False
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self._stream:
+            # the usage-only chunk at the end has no choices
+            piece = chunk.choices[0].delta.content if chunk.choices else None
+            if piece:
+                self._parts.append(piece)
+                yield piece
+        self.finished = True
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+def stream_answer(
+    client,
+    history: List[Dict[str, Any]],
+    extra: Optional[Dict[str, Any]] = None,
+    **request: Any,
+) -> str:
+    """Stream a chat completion into the current container and append it to `history`.
+
+    `extra` fields (e.g. a timestamp) are added to the assistant message. API
+    errors are raised to the caller; a rerun keeps the partial answer.
+    """
+    reply = TextStream(client.chat.completions.create(stream=True, **request))
+    try:
+        text = st.write_stream(reply)
+    except STOPPED:
+        # Streamlit stopped this run (new input, a button, the Stop button)
+        if reply.text:
+            history.append({"role": "assistant", "content": reply.text + STOPPED_MARK, **(extra or {})})
+        raise
+    finally:
+        reply.close()
+    history.append({"role": "assistant", "content": text, **(extra or {})})
+    return text
@@ -0,0 +1,225 @@
+# Lesson 8 – Helper: Token-Aware Context Window with a Running Summary
+# --------------------------------------------------------------------
+# Goal: The apps used to send "the last 20 messages". That is not a size: one
+# uploaded 12,000-character note is ~3,000 tokens, twenty long answers are
+# more, and the slice could even cut off the system prompt. ContextWindow
+# sends at most `budget` tokens, however long the conversation gets, so the
+# latency and cost of each call stay flat.
+#
+# How it works:
+# 1) Each message's tokens are estimated once (about 4 characters per token,
+#    like result_compactor.estimate_tokens) and cached in the ContextWindow,
+#    keyed by the content string; the app's message dicts are not touched.
+# 2) The leading system prompt is always sent.
+# 3) The rest of the budget is filled with the newest messages first.
+# 4) Older messages that no longer fit are not just dropped: they are folded
+#    into a running summary (one small model call that updates the previous
+#    summary with the evicted turns). The summary is sent as a second system
+#    message.
+# 5) Turns are folded in batches: when the budget overflows, enough old turns
+#    are summarized to bring the recent part down to `low_water` of the
+#    budget, so the next few questions need no summary call.
+# 6) A single message larger than the whole budget (the newest one, e.g. big
+#    notes) is truncated.
+# 7) The newest message always keeps at least NEWEST_MIN_SHARE of the budget:
+#    if the system prompt and the summary leave less than that, the summary
+#    is shortened (its oldest part goes first) for this request, and a system
+#    prompt that is too big by itself makes the request go over budget
+#    rather than cut the question down to nothing.
+#
+# Usage:
+#   if "context" not in st.session_state:
+#       st.session_state.context = ContextWindow(budget=3000)
+#   window = st.session_state.context.build(st.session_state.messages, client)
+#   client.chat.completions.create(model=model, messages=window, ...)
+#   st.session_state.context.reset()   # when the chat is cleared
+
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Lecture07" / "Exercises"))
+from result_compactor import CHARS_PER_TOKEN, estimate_tokens
+from usage_meter import PROMPT_TOKEN_BUDGET, usage_context
+
+# Per-message framing the API adds around role and content
+MESSAGE_OVERHEAD = 4
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+# Only these keys are sent; app metadata such as "timestamp" stays local
+API_KEYS = ("role", "content", "name", "tool_calls", "tool_call_id")
+# How much of one evicted message the summarizer gets to see
+SUMMARIZE_CHARS_PER_MESSAGE = 4000
+# Share of the budget the newest message can always use
+NEWEST_MIN_SHARE = 0.25
+SUMMARY_HEADING = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a conversation between a student and a study assistant. "
+    "Merge the new turns into the summary. Keep the topics, facts, the student's goals and "
+    "open questions; drop greetings and repetition. At most {words} words, plain text."
+)
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Estimated tokens of one message."""
+    tokens = estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD
+    if message.get("tool_calls"):
+        tokens += estimate_tokens(message["tool_calls"])
+    return tokens
+
+
+def _for_api(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: message[k] for k in API_KEYS if k in message}
+
+
+def _truncate(message: Dict[str, Any], tokens: int) -> Dict[str, Any]:
+    limit = max(0, tokens - MESSAGE_OVERHEAD) * CHARS_PER_TOKEN
+    content = message.get("content") or ""
+    if not isinstance(content, str) or len(content) <= limit:
+        return _for_api(message)
+    return {**_for_api(message), "content": content[: max(0, limit - 16)].rstrip() + " …(truncated)"}
+
+
+class ContextWindow:
+    """Pinned system prompt + running summary + as many recent messages as fit in `budget` tokens."""
+
+    def __init__(
+        self,
+        budget: int = PROMPT_TOKEN_BUDGET,
+        summary_tokens: int = 300,
+        low_water: float = 0.6,
+        summary_model: str = SUMMARY_MODEL,
+    ) -> None:
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.low_water = low_water
+        self.summary_model = summary_model
+        # id(content) -> (content, tokens); holding the content keeps the id valid
+        self._token_cache: Dict[int, Tuple[Any, int]] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.summary = ""
+        self.folded = 0  # messages[:folded] are in the system prompt or the summary
+        self.summarized = 0
+        self.summary_calls = 0
+        self.last_tokens = 0
+        self._token_cache = {}
+
+    def _tokens(self, message: Dict[str, Any]) -> int:
+        """message_tokens(), computed once per content string."""
+        content = message.get("content") or ""
+        if message.get("tool_calls"):
+            return message_tokens(message)
+        cached = self._token_cache.get(id(content))
+        if cached is not None and cached[0] is content:
+            return cached[1]
+        tokens = message_tokens(message)
+        self._token_cache[id(content)] = (content, tokens)
+        return tokens
+
+    def _forget_old_tokens(self, messages: List[Dict[str, Any]]) -> None:
+        if len(self._token_cache) > 2 * len(messages) + 16:
+            live = {id(m.get("content") or "") for m in messages}
+            self._token_cache = {k: v for k, v in self._token_cache.items() if k in live}
+
+    def _summary_message(self, room: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The running summary as a system message, cut to `room` tokens (oldest part first)."""
+        if not self.summary:
+            return []
+        text = self.summary
+        if room is not None:
+            limit = (room - MESSAGE_OVERHEAD) * CHARS_PER_TOKEN - len(SUMMARY_HEADING)
+            if limit < 80:  # not worth sending a few words of it
+                return []
+            if len(text) > limit:
+                text = "…" + text[-(limit - 1):]
+        return [{"role": "system", "content": SUMMARY_HEADING + text}]
+
+    def _room(self, system_tokens: int) -> Tuple[List[Dict[str, Any]], int]:
+        """(summary message, tokens left for the conversation); at least NEWEST_MIN_SHARE of the budget."""
+        floor = int(self.budget * NEWEST_MIN_SHARE)
+        summary = self._summary_message(self.budget - system_tokens - floor)
+        available = self.budget - system_tokens - sum(message_tokens(m) for m in summary)
+        return summary, max(available, floor)
+
+    def _fold(self, turns: List[Dict[str, Any]], client) -> None:
+        """Update the running summary with the turns that leave the window."""
+        transcript = "\n".join(
+            f"{m['role']}: {str(m.get('content') or '')[:SUMMARIZE_CHARS_PER_MESSAGE]}" for m in turns
+        )
+        try:
+            with usage_context(feature="context_summary"):
+                resp = client.chat.completions.create(
+                    model=self.summary_model,
+                    temperature=0,
+                    max_tokens=self.summary_tokens,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT.format(words=int(self.summary_tokens * 0.6))},
+                        {"role": "user", "content": f"Summary so far:\n{self.summary or '(empty)'}\n\nNew turns:\n{transcript}"},
+                    ],
+                )
+            self.summary = (resp.choices[0].message.content or "").strip()
+            self.summary_calls += 1
+        except Exception:
+            # No summary this time: keep the first line of each turn instead
+            lines = [f"- {m['role']}: {str(m.get('content') or '').splitlines()[0][:160]}" for m in turns if m.get("content")]
+            self.summary = "\n".join(([self.summary] if self.summary else []) + lines)
+        self.summarized += len(turns)
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        if len(self.summary) > limit:
+            self.summary = "…" + self.summary[-limit:]
+
+    def build(self, messages: List[Dict[str, Any]], client=None) -> List[Dict[str, Any]]:
+        """The messages to send: at most `budget` tokens (estimated).
+
+        `client` is used to summarize evicted turns; without one they are dropped.
+        """
+        pinned = 0
+        while pinned < len(messages) and messages[pinned]["role"] == "system":
+            pinned += 1
+        if self.folded > len(messages):  # the history was replaced (e.g. cleared)
+            self.reset()
+        start = max(self.folded, pinned)
+        self._forget_old_tokens(messages)
+        system_tokens = sum(self._tokens(m) for m in messages[:pinned])
+        summary, available = self._room(system_tokens)
+
+        if sum(self._tokens(m) for m in messages[start:]) > available and start < len(messages) - 1:
+            # Keep the newest messages up to low_water of the budget; fold the rest
+            keep_from, used = len(messages) - 1, self._tokens(messages[-1])
+            while keep_from - 1 > start and used + self._tokens(messages[keep_from - 1]) <= available * self.low_water:
+                keep_from -= 1
+                used += self._tokens(messages[keep_from])
+            if client is not None:
+                self._fold(messages[start:keep_from], client)
+            else:
+                self.summarized += keep_from - start
+            start = self.folded = keep_from
+            summary, available = self._room(system_tokens)
+
+        # Fill newest-first; the newest message is always sent (truncated if needed)
+        recent: List[Dict[str, Any]] = []
+        used = 0
+        for m in reversed(messages[start:]):
+            tokens = self._tokens(m)
+            if used + tokens > available:
+                if not recent:
+                    recent.append(_truncate(m, available))
+                    used = available
+                break
+            recent.append(_for_api(m))
+            used += tokens
+        window = [_for_api(m) for m in messages[:pinned]] + summary + recent[::-1]
+        self.last_tokens = system_tokens + sum(message_tokens(m) for m in summary) + used
+        return window
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": self.last_tokens,
+            "budget": self.budget,
+            "summarized_messages": self.summarized,
+            "summary_calls": self.summary_calls,
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+        }
@@ -0,0 +1,228 @@
+# Lesson 8 – Helper: Near-Duplicate Answer Cache
+# ----------------------------------------------
+# Goal: Students ask the same question in slightly different words
+# ("explain newton's laws" / "Explain Newtons laws please"). An exact-match
+# cache misses these; this cache finds them and reuses the earlier answer.
+#
+# How it works:
+# 1) Normalize the prompt (lower case, no punctuation, no filler words like "please").
+# 2) Split it into character n-grams — the same char_ngrams() / jaccard() used by
+#    the Lesson 9 plagiarism checker (Lecture09/Exercises/text_similarity.py).
+# 3) Summarize the n-gram set as a MinHash signature (num_perm small hashes).
+# 4) An LSH index (bands of the signature) finds candidate prompts without
+#    comparing against every stored prompt.
+# 5) Candidates are checked with the exact Jaccard similarity; the best one at or
+#    above `threshold` is a hit ...
+# 6) ... but only if the KEY TOKENS match: the numbers, operators and names of
+#    both prompts. "What is 2+3?" and "What is 2+5?" are 0.71 similar, and
+#    "capital of Austria" / "capital of Australia" 0.78; similarity alone
+#    would hand out the wrong answer. Names are capitalized words (not at the
+#    start of a sentence); a name must appear among the other prompt's words.
+#
+# Entries are scoped: an answer written for one model, system prompt or
+# context is never reused for another. Pass everything the answer depends on
+# as the scope. How much of the conversation belongs in it is a tradeoff:
+# - Scoping every question by the whole history means a hit only on the first
+#   turn of a chat, which throws away most of the repeats.
+# - Scoping none by history hands a follow-up such as "give another example"
+#   an answer about someone else's topic.
+# context_key(prompt, history) sits in between: a standalone question
+# ("explain newton's laws") gets "" and is shared across conversations; a
+# question that leans on the context (pronouns like "it"/"that", "another",
+# "more", "why?", very short prompts) gets a hash of the last CONTEXT_TURNS
+# messages, so it only hits after the same exchange. The check is a word
+# list, so a follow-up without any of those words is treated as standalone;
+# that is the price of the higher hit rate, and one reason the study app
+# leaves reuse off by default.
+# The store is bounded to `max_entries`; the least recently used entry is
+# evicted first.
+#
+# Usage:
+#   cache = NearDuplicateCache(threshold=0.85)
+#   scope = (model, system_prompt, context_key(prompt, earlier_messages))
+#   hit = cache.lookup(prompt, scope=scope)
+#   if hit is None:
+#       answer = ...call the API...
+#       cache.add(prompt, answer, scope=scope)
+
+import re
+import sys
+import zlib
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Lecture09" / "Exercises"))
+from text_similarity import char_ngrams, jaccard
+
+FILLER_WORDS = {"please", "pls", "plz", "thanks", "thank", "kindly", "hey", "hi"}
+# Numbers and operators; a hyphen inside a word ("well-known") is not a minus
+_SYMBOL = re.compile(r"\d+(?:[.,]\d+)?|[+*/^=<>%]|(?<![A-Za-z])-(?![A-Za-z])")
+# A capitalized word that does not start a sentence
+_NAME = re.compile(r"(?<![.!?:]\s)(?<!^)\b[A-Z][\w'’]*")
+_MERSENNE = (1 << 61) - 1
+# Words that point back at the conversation ("explain it again", "another one")
+CONTEXT_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "him", "her",
+    "another", "again", "more", "other", "same", "previous", "above", "earlier", "last",
+    "continue", "also", "instead", "why", "elaborate", "shorter", "longer", "simpler",
+}
+# A prompt with fewer words than this ("and mars?") is read as a follow-up
+MIN_STANDALONE_WORDS = 3
+# Messages of history that scope a follow-up question
+CONTEXT_TURNS = 2
+
+
+def normalize_prompt(text: str) -> str:
+    text = text.lower().replace("'", "").replace("’", "")
+    words = re.findall(r"[a-z0-9]+", text)
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+
+def key_tokens(prompt: str) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+    """(numbers and operators in order, names) of a prompt; a hit needs the same ones."""
+    symbols = tuple(_SYMBOL.findall(prompt))
+    names = frozenset(normalize_prompt(n) for n in _NAME.findall(prompt.strip()) if n != "I")
+    return symbols, names - {""}
+
+
+def history_key(messages: List[Dict[str, Any]], last: Optional[int] = None) -> str:
+    """A short hash of the conversation so far (or of its `last` user/assistant messages)."""
+    turns = [m for m in messages if m.get("role") in ("user", "assistant")]
+    h = hashlib.sha256()
+    for m in turns[-last:] if last else turns:
+        h.update(f"{m['role']}\x00{m.get('content') or ''}\x00".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def depends_on_context(prompt: str) -> bool:
+    """Does the prompt lean on earlier turns ("why?", "give another example")?"""
+    words = normalize_prompt(prompt).split()
+    return len(words) < MIN_STANDALONE_WORDS or not CONTEXT_WORDS.isdisjoint(words)
+
+
+def context_key(prompt: str, history: List[Dict[str, Any]], turns: int = CONTEXT_TURNS) -> str:
+    """The history part of a scope: "" for a standalone question, else the last `turns` messages."""
+    if not depends_on_context(prompt):
+        return ""
+    return history_key(history, last=turns)
+
+
+class CacheHit:
+    def __init__(self, prompt: str, answer: str, similarity: float):
+        self.prompt = prompt
+        self.answer = answer
+        self.similarity = similarity
+
+
+class _Entry:
+    __slots__ = ("scope", "prompt", "answer", "shingles", "bands", "symbols", "names", "words")
+
+    def __init__(self, scope, prompt, answer, shingles, bands):
+        self.scope = scope
+        self.prompt = prompt
+        self.answer = answer
+        self.shingles = shingles
+        self.bands = bands
+        self.symbols, self.names = key_tokens(prompt)
+        self.words = frozenset(normalize_prompt(prompt).split())
+
+
+class NearDuplicateCache:
+    """MinHash + LSH cache of answers keyed by (scope, prompt similarity)."""
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        ngram: int = 3,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_entries: int = 2000,
+        seed: int = 7,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[Hashable, int, Tuple[int, ...]], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "key_token_rejects": 0}
+
+    # ---- signatures ----
+    def _shingles(self, prompt: str) -> Set[str]:
+        return char_ngrams(normalize_prompt(prompt), self.ngram)
+
+    def _band_keys(self, shingles: Set[str]) -> List[Tuple[int, ...]]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles] or [0]
+        signature = [min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms]
+        return [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    @staticmethod
+    def _same_key_tokens(symbols, names, words, entry: _Entry) -> bool:
+        return symbols == entry.symbols and names <= entry.words and entry.names <= words
+
+    # ---- public API ----
+    def lookup(self, prompt: str, scope: Hashable = None, threshold: Optional[float] = None) -> Optional[CacheHit]:
+        shingles = self._shingles(prompt)
+        bands = self._band_keys(shingles)
+        symbols, names = key_tokens(prompt)
+        words = frozenset(normalize_prompt(prompt).split())
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            candidates: Set[int] = set()
+            for i, band in enumerate(bands):
+                candidates |= self._buckets.get((scope, i, band), set())
+            best, best_sim, rejected = None, 0.0, False
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                sim = jaccard(shingles, entry.shingles)
+                if sim < threshold or sim <= best_sim:
+                    continue
+                if not self._same_key_tokens(symbols, names, words, entry):
+                    rejected = True
+                    continue
+                best, best_sim = entry_id, sim
+            if best is None:
+                self.stats["misses"] += 1
+                self.stats["key_token_rejects"] += rejected
+                return None
+            self._entries.move_to_end(best)
+            self.stats["hits"] += 1
+            entry = self._entries[best]
+            return CacheHit(entry.prompt, entry.answer, best_sim)
+
+    def add(self, prompt: str, answer: str, scope: Hashable = None) -> None:
+        shingles = self._shingles(prompt)
+        bands = self._band_keys(shingles)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(scope, prompt, answer, frozenset(shingles), bands)
+            for i, band in enumerate(bands):
+                self._buckets.setdefault((scope, i, band), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        entry_id, entry = self._entries.popitem(last=False)
+        for i, band in enumerate(entry.bands):
+            key = (entry.scope, i, band)
+            ids = self._buckets.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._buckets[key]
+        self.stats["evictions"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
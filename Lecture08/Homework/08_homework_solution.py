@@ -5,6 +5,9 @@
 # - Add a "study topic" dropdown for preset prompts
 # - Include an option to summarize notes (upload text file)
 # - Optional: Deployment tips in the sidebar
+# - Answers are streamed into the conversation as they are generated
+# - Prompts stay within a token budget (older turns are summarized), so large
+#   uploaded notes do not push the system prompt out
 #
 # Run: streamlit run 07_homework_solution.py
 #
@@ -13,9 +16,22 @@
 #   export OPENAI_API_KEY="sk-..."
 
 import os
+import sys
+import uuid
+from pathlib import Path
 import streamlit as st
 from openai import OpenAI
 
+# Reuse the helpers built in Lesson 7 (response cache, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Lecture07" / "Exercises"))
+from response_cache import CachedClient
+from usage_meter import MeteredClient, default_meter, usage_context, usage_panel
+# ... and the Lesson 8 streaming helper
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Exercises"))
+from chat_stream import stream_answer
+from context_window import ContextWindow
+from chat_history import render_history
+
 # ---------- Page Setup ----------
 st.set_page_config(page_title="Homework — Study Assistant Enhancements", page_icon="🧰", layout="wide")
 st.title("🧰 Homework Solution — Study Assistant Enhancements")
@@ -27,6 +43,8 @@ with st.sidebar:
     model = st.selectbox("Model", ["gpt-4o-mini", "gpt-4o", "gpt-5-nano"], index=0)
     temperature = st.slider("Creativity (temperature)", 0.0, 2.0, 0.7, 0.1)
     max_tokens = st.slider("Max tokens", 64, 1200, 400, 16)
+    # temperature=0 answers are always cached; this also reuses answers at other temperatures
+    reuse_answers = st.checkbox("Reuse cached answers for repeated prompts", False)
 
     st.divider()
     st.subheader("Deployment tips")
@@ -47,14 +65,26 @@ with st.sidebar:
     else:
         st.warning("Set OPENAI_API_KEY in your environment before calling the API.")
 
-# Initialize OpenAI
-client = OpenAI()
+# Initialize OpenAI (wrapped so identical requests, e.g. the presets, come from the cache;
+# the calls that do reach the API are metered per feature and session)
+@st.cache_resource
+def get_client():
+    return CachedClient(MeteredClient(OpenAI()))
+
+client = get_client()
 
 # ---------- Session State (Chat History) ----------
+if "usage_session" not in st.session_state:
+    st.session_state.usage_session = uuid.uuid4().hex[:8]
 if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "system", "content": "You are a concise, kind study assistant for middle and high school students."}
     ]
+if "context" not in st.session_state:
+    st.session_state.context = ContextWindow()
+
+# Set by the buttons below: the answer is streamed at the end of the conversation
+pending_feature = None
 
 # ---------- Study Topic Presets ----------
 st.subheader("🎯 Study Topic Presets")
@@ -75,25 +105,13 @@ custom_prompt = st.text_area("Prompt (editable)", value=preset_prompt, height=14
 cols = st.columns(2)
 with cols[0]:
     if st.button("Generate Study Guide"):
-        # Add user message
+        # Add user message; the answer is streamed into the conversation below
         st.session_state.messages.append({"role": "user", "content": custom_prompt})
-        with st.spinner("Generating..."):
-            try:
-                resp = client.chat.completions.create(
-                    model=model,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    messages=st.session_state.messages[-24:],
-                )
-                answer = resp.choices[0].message.content
-            except Exception as e:
-                answer = f"API error: {e}"
-
-        st.session_state.messages.append({"role": "assistant", "content": answer})
-        st.success("Response generated below.")
+        pending_feature = "study_guide"
 with cols[1]:
     if st.button("Clear Chat"):
         st.session_state.messages = st.session_state.messages[:1]  # keep system prompt
+        st.session_state.context.reset()
         st.toast("Chat cleared.")
 
 # ---------- Notes Summarizer (Upload) ----------
@@ -118,26 +136,32 @@ if uploaded and st.button("Summarize Notes"):
     else:
         prompt = f"{summary_request}\n\n---\nNotes:\n{text[:12000]}"  # safety: limit size
         st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.spinner("Summarizing..."):
-            try:
-                resp = client.chat.completions.create(
-                    model=model,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    messages=st.session_state.messages[-24:],
-                )
-                summary = resp.choices[0].message.content
-            except Exception as e:
-                summary = f"API error: {e}"
-        st.session_state.messages.append({"role": "assistant", "content": summary})
-        st.success("Summary generated below.")
+        pending_feature = "note_summary"
 
 # ---------- Render Chat History ----------
 st.subheader("💬 Conversation")
-for m in st.session_state.messages[1:]:  # skip system
-    if m["role"] == "user":
-        st.chat_message("user").write(m["content"])
-    else:
-        st.chat_message("assistant").write(m["content"])
+render_history(st.session_state.messages)  # skips system; older messages behind "Load earlier"
+
+# Stream the requested answer as the last message (the first words show up
+# after the time-to-first-token instead of after the whole answer)
+if pending_feature:
+    with st.chat_message("assistant"), usage_context(feature=pending_feature, session=st.session_state.usage_session):
+        try:
+            stream_answer(
+                client,
+                st.session_state.messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                messages=st.session_state.context.build(st.session_state.messages, client),
+                cache=True if reuse_answers else None,
+            )
+        except Exception as e:
+            answer = f"API error: {e}"
+            st.session_state.messages.append({"role": "assistant", "content": answer})
+            st.write(answer)
 
 st.caption("Tip: Keep prompts short and focused. Upload notes in .txt or .md for best results.")
+
+# Which feature (study guides, note summaries) uses the tokens
+usage_panel(default_meter, st.session_state.usage_session)
@@ -15,6 +15,7 @@ What to submit:
 """
 
 from difflib import SequenceMatcher
+from text_similarity import char_ngrams, jaccard  # also used by the Lesson 8 answer cache
 
 # Demo texts (you can replace these during grading)
 student_essay = """
@@ -33,15 +34,6 @@ Responsible AI emphasizes principles such as fairness to avoid bias, transparenc
 and accountability so that humans remain responsible for outcomes.
 """
 
-def char_ngrams(s: str, n: int = 5) -> set:
-    s = "".join(c.lower() for c in s if not c.isspace())
-    return {s[i:i+n] for i in range(max(0, len(s)-n+1))}
-
-def jaccard(a: set, b: set) -> float:
-    if not a and not b:
-        return 0.0
-    return len(a & b) / len(a | b)
-
 def compare(a: str, b: str):
     ngram_sim = jaccard(char_ngrams(a), char_ngrams(b))
     seq_ratio = SequenceMatcher(None, a, b).ratio()
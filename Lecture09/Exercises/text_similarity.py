@@ -0,0 +1,19 @@
+"""
+Lesson 9 – Ethics, Safety, and Responsible AI
+Helper: Character n-gram similarity
+
+Shared by:
+- 09_4_plagiarism_checker.py (compare an essay with sources)
+- Lecture08/Exercises/near_duplicate_cache.py (spot re-worded study questions)
+"""
+
+
+def char_ngrams(s: str, n: int = 5) -> set:
+    s = "".join(c.lower() for c in s if not c.isspace())
+    return {s[i:i+n] for i in range(max(0, len(s)-n+1))}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)